@@ -0,0 +1,29 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Catalog benchmarks.
+
+``build_site`` (in ``opencore.benchmark.sitegen``) fills a database with
+a synthetic site of a given size; ``run_queries`` (in
+``opencore.benchmark.report``) times the catalog queries the views issue
+against it (``opencore.benchmark.queries``) and returns a report which
+can be saved as JSON and compared with the report of another commit.
+The ``catalog_benchmark`` script does all three.
+"""
@@ -0,0 +1,158 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""The catalog queries of the views, as benchmarks.
+
+Each query is a function taking a ``Sample`` and returning the number
+of results it found, and calls the same helper as the view it stands
+for, so it keeps up with changes to the views' queries.
+"""
+
+import random
+from urllib import urlencode
+
+from simplejson import loads
+
+from repoze.bfg.request import Request
+from repoze.bfg.traversal import find_model
+
+from opencore.models.interfaces import ICatalogSearch
+from opencore.models.interfaces import IProfile
+from opencore.utils import find_catalog
+from opencore.utils import find_tags
+from opencore.views.community import get_recent_items_batch
+from opencore.views.forum import latest_object
+from opencore.views.members import _member_profile_batch
+from opencore.views.search import get_batch
+from opencore.views.search import jquery_livesearch_view
+
+class Sample(object):
+    """ The community, user and search terms the queries use.
+    """
+    def __init__(self, site, community, userid, tag, word, prefix):
+        self.site = site
+        self.community = community
+        self.userid = userid
+        self.tag = tag
+        self.word = word
+        self.prefix = prefix
+
+    def request(self, **params):
+        return Request.blank('/?%s' % urlencode(params))
+
+    def info(self):
+        return {
+            'community': self.community.__name__,
+            'userid': self.userid,
+            'tag': self.tag,
+            'word': self.word,
+            'prefix': self.prefix,
+            }
+
+def choose_sample(site, seed=0):
+    """ Choose a Sample from ``site`` (a site made by ``build_site``).
+
+    The community and user are picked at random; the tag is the most
+    used one, the word is taken from one of the community's blog entries
+    and the prefix from a member's name, so that each query finds
+    something.
+    """
+    r = random.Random(seed)
+    communities = site.communities()
+    community = communities[r.choice(sorted(communities.keys()))]
+    userid = r.choice(sorted(community.member_names))
+    tags = find_tags(site)
+    frequencies = tags.getFrequency() # least used first
+    tag = frequencies and frequencies[-1][0] or None
+    blog = community['blog']
+    entry = blog[r.choice(sorted(blog.keys()))]
+    word = r.choice(entry.title.split()).lower()
+    profile = site['profiles'][userid]
+    prefix = profile.lastname[:2].lower()
+    return Sample(site, community, userid, tag, word, prefix)
+
+def recent_items(sample):
+    """ The community overview's recent activity.
+    """
+    batch = get_recent_items_batch(sample.community, sample.request())
+    return batch['total']
+
+def member_batch(sample):
+    """ The first page of the community members listing.
+    """
+    batch = _member_profile_batch(sample.community, sample.request())
+    return batch['total']
+
+def forum_latest(sample):
+    """ The latest post in a forum, as the forums listing shows.
+    """
+    forum = sample.community['forums']['general']
+    return int(latest_object(forum, sample.request()) is not None)
+
+def tag_page(sample):
+    """ The lookups of the tag page (showtag_view), without rendering.
+    """
+    site = sample.site
+    tags = find_tags(site)
+    document_map = find_catalog(site).document_map
+    tags.getRelatedTags(sample.tag)
+    count = 0
+    for docid in tags.getItems(tags=(sample.tag,)):
+        address = document_map.address_for_docid(int(docid))
+        find_model(site, address)
+        tags.getUsers(tags=(sample.tag,), items=(docid,))
+        count += 1
+    return count
+
+def text_search(sample):
+    """ The first page of the search results for a word.
+    """
+    batch, terms = get_batch(sample.site, sample.request(body=sample.word))
+    return batch['total']
+
+def livesearch(sample):
+    """ The livesearch dropdown for a prefix.
+    """
+    response = jquery_livesearch_view(
+        sample.site, sample.request(val=sample.prefix))
+    return len([record for record in loads(response.body)
+                if record['rowclass'] == 'result'])
+
+def member_autocomplete(sample):
+    """ The people autocomplete (profile_json_list) for a prefix.
+    """
+    searcher = ICatalogSearch(sample.site)
+    total, docids, resolver = searcher(
+        interfaces=[IProfile],
+        member_name=sample.prefix,
+        sort_index='member_name',
+        limit=20,
+        )
+    return len(filter(None, map(resolver, docids)))
+
+QUERIES = (
+    ('recent_items', recent_items),
+    ('member_batch', member_batch),
+    ('forum_latest', forum_latest),
+    ('tag_page', tag_page),
+    ('text_search', text_search),
+    ('livesearch', livesearch),
+    ('member_autocomplete', member_autocomplete),
+    )
@@ -0,0 +1,129 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Time benchmark queries and report on them."""
+
+import datetime
+import platform
+import time
+
+import transaction
+
+from opencore.benchmark.queries import QUERIES
+
+def summarize(timings):
+    """ Summarize a list of timings (in seconds) in milliseconds.
+    """
+    timings = sorted(timings)
+    n = len(timings)
+    if n % 2:
+        median = timings[n // 2]
+    else:
+        median = (timings[n // 2 - 1] + timings[n // 2]) / 2.0
+    return {
+        'runs': n,
+        'min': timings[0] * 1000,
+        'median': median * 1000,
+        'mean': sum(timings) / n * 1000,
+        'max': timings[-1] * 1000,
+        }
+
+def time_query(query, sample, repeat=20, warmup=1, timer=time.time):
+    """ Run ``query`` ``warmup`` times, then time ``repeat`` runs.
+
+    Returns a summary of the timings (see ``summarize``), with the number
+    of results of the last run as 'results'.
+    """
+    for i in range(warmup):
+        query(sample)
+        transaction.abort()
+    timings = []
+    for i in range(repeat):
+        start = timer()
+        results = query(sample)
+        timings.append(timer() - start)
+        # drop any changes (the queries shouldn't make any)
+        transaction.abort()
+    summary = summarize(timings)
+    summary['results'] = results
+    return summary
+
+def run_queries(sample, queries=QUERIES, repeat=20, warmup=1,
+                timer=time.time):
+    """ Time each of ``queries`` (a sequence of (name, query)) against
+    ``sample`` and return a {name: summary} dict.
+    """
+    results = {}
+    for name, query in queries:
+        results[name] = time_query(query, sample, repeat, warmup, timer)
+    return results
+
+def make_report(results, sizes, sample=None, label=None, now=None):
+    """ Return a report of benchmark results, to be saved as JSON.
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    return {
+        'label': label,
+        'date': now.isoformat(),
+        'python': platform.python_version(),
+        'sizes': sizes,
+        'sample': sample and sample.info() or None,
+        'queries': results,
+        }
+
+def compare_reports(old, new, statistic='median'):
+    """ Compare the queries of two reports.
+
+    Returns a list of (name, old time, new time, new / old) for the
+    queries in both reports, the time being ``statistic`` of the timings.
+    """
+    rows = []
+    for name in sorted(new['queries']):
+        if name not in old['queries']:
+            continue
+        before = old['queries'][name][statistic]
+        after = new['queries'][name][statistic]
+        if before:
+            ratio = after / before
+        else:
+            ratio = None
+        rows.append((name, before, after, ratio))
+    return rows
+
+def format_results(results):
+    lines = ['%-20s %10s %10s %10s %8s' % (
+        'query', 'median ms', 'min ms', 'max ms', 'results')]
+    for name in sorted(results):
+        summary = results[name]
+        lines.append('%-20s %10.2f %10.2f %10.2f %8s' % (
+            name, summary['median'], summary['min'], summary['max'],
+            summary['results']))
+    return lines
+
+def format_comparison(rows):
+    lines = ['%-20s %10s %10s %8s' % ('query', 'old ms', 'new ms', 'ratio')]
+    for name, before, after, ratio in rows:
+        if ratio is None:
+            ratio = '-'
+        else:
+            ratio = '%.2f' % ratio
+        lines.append('%-20s %10.2f %10.2f %8s' % (name, before, after, ratio))
+    return lines
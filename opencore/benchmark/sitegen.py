@@ -0,0 +1,265 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Build a synthetic site for benchmarking.
+
+The content is generated from a seeded random number generator, so the
+same sizes and seed always produce the same site.
+"""
+
+import datetime
+import random
+from bisect import bisect_left
+from StringIO import StringIO
+
+import transaction
+
+from repoze.lemonade.content import create_content
+
+from opencore.bootstrap.bootstrap import populate
+from opencore.models.blog import blog_tool_factory
+from opencore.models.files import files_tool_factory
+from opencore.models.forum import forums_tool_factory
+from opencore.models.interfaces import IBlogEntry
+from opencore.models.interfaces import IComment
+from opencore.models.interfaces import ICommunity
+from opencore.models.interfaces import ICommunityFile
+from opencore.models.interfaces import IForum
+from opencore.models.interfaces import IForumTopic
+from opencore.models.interfaces import IProfile
+from opencore.security.policy import to_profile_active
+from opencore.utils import find_tags
+
+DEFAULT_SIZES = {
+    'profiles': 500,
+    'communities': 20,
+    'members': 50,          # per community
+    'entries': 20,          # blog entries per community
+    'topics': 10,           # forum topics per community
+    'comments': 3,          # per blog entry and forum topic
+    'files': 10,            # per community
+    'tags': 200,            # distinct tags
+    'tags_per_item': 3,
+    }
+
+_SYLLABLES = ('ba', 'da', 'fe', 'go', 'hu', 'ji', 'ka', 'lo', 'mi', 'ne',
+              'pa', 'ru', 'sa', 'ti', 'vo', 'ze')
+
+class TextGenerator(object):
+    """ Pseudo-random words and text.
+
+    Words are drawn from a fixed vocabulary with Zipfian frequencies, as
+    in real text, so that some words match many documents and most match
+    only a few.
+    """
+    def __init__(self, seed=0, vocabulary=2000):
+        self.random = random.Random(seed)
+        words = set()
+        while len(words) < vocabulary:
+            length = self.random.randint(2, 4)
+            words.add(''.join([self.random.choice(_SYLLABLES)
+                               for i in range(length)]))
+        self.words = sorted(words)
+        self.random.shuffle(self.words)
+        self._weights = []
+        total = 0.0
+        for rank in range(1, vocabulary + 1):
+            total += 1.0 / rank
+            self._weights.append(total)
+
+    def word(self, vocabulary=None):
+        """ A word from the first ``vocabulary`` words (all by default).
+        """
+        weights = self._weights
+        if vocabulary is not None:
+            weights = weights[:vocabulary]
+        i = bisect_left(weights, self.random.random() * weights[-1])
+        return self.words[i]
+
+    def name(self):
+        return self.word().capitalize()
+
+    def text(self, words):
+        return ' '.join([self.word() for i in range(words)])
+
+    def title(self, words=4):
+        return self.text(words).capitalize()
+
+def build_site(root, sizes=None, seed=0, commit_every=1000,
+               transaction=transaction):
+    """ Add a site named 'site' to ``root`` with content of ``sizes`` (see
+    DEFAULT_SIZES) and return it.
+
+    Commits after about every ``commit_every`` objects added.
+    """
+    all_sizes = DEFAULT_SIZES.copy()
+    if sizes:
+        all_sizes.update(sizes)
+    builder = _SiteBuilder(root, all_sizes, seed, commit_every, transaction)
+    return builder()
+
+class _SiteBuilder(object):
+
+    def __init__(self, root, sizes, seed, commit_every, transaction):
+        self.root = root
+        self.sizes = sizes
+        self.gen = TextGenerator(seed)
+        self.random = self.gen.random
+        self.commit_every = commit_every
+        self.transaction = transaction
+        self.now = datetime.datetime.now()
+        self.added = 0
+
+    def __call__(self):
+        sizes = self.sizes
+        populate(self.root, do_transaction_begin=False)
+        site = self.site = self.root['site']
+        self.tags = find_tags(site)
+        self.transaction.commit()
+
+        community_names = ['community-%d' % i
+                           for i in range(sizes['communities'])]
+        userids = ['user%d' % i for i in range(sizes['profiles'])]
+        groups = dict([(userid, []) for userid in userids])
+        members = {}
+        for name in community_names:
+            chosen = self.random.sample(
+                userids, min(sizes['members'], len(userids)))
+            members[name] = chosen
+            group = 'group.community:%s:members' % name
+            for userid in chosen:
+                groups[userid].append(group)
+
+        for userid in userids:
+            self.add_profile(userid, groups[userid])
+        for name in community_names:
+            self.add_community(name, members[name] or ['admin'])
+        self.transaction.commit()
+        return site
+
+    def added_object(self):
+        self.added += 1
+        if self.added % self.commit_every == 0:
+            self.transaction.commit()
+
+    def dated(self, obj, after=None):
+        """ Give ``obj`` a creation date in the past year (after
+        ``after``, if given), since the subscribers would give everything
+        the same date.
+        """
+        if after is None:
+            after = self.now - datetime.timedelta(365)
+        delta = self.now - after
+        seconds = max(delta.days * 86400 + delta.seconds, 0)
+        when = after + datetime.timedelta(
+            seconds=self.random.randint(0, seconds))
+        obj.created = obj.modified = when
+        return obj
+
+    def tag(self, obj, userid):
+        sizes = self.sizes
+        names = set([self.gen.word(sizes['tags'])
+                     for i in range(sizes['tags_per_item'])])
+        self.tags.update(item=obj.docid, user=userid, tags=names)
+
+    def add_profile(self, userid, groups):
+        gen = self.gen
+        site = self.site
+        site.users.add(userid, userid, userid, groups)
+        profile = create_content(IProfile,
+                                 firstname=gen.name(),
+                                 lastname=gen.name(),
+                                 email='%s@example.com' % userid,
+                                 )
+        site['profiles'][userid] = self.dated(profile)
+        to_profile_active(profile)
+        self.added_object()
+
+    def add_community(self, name, members):
+        gen = self.gen
+        sizes = self.sizes
+        community = create_content(ICommunity,
+                                   gen.title(),
+                                   gen.text(20),
+                                   gen.text(100),
+                                   members[0],
+                                   )
+        for factory in (blog_tool_factory, files_tool_factory,
+                        forums_tool_factory):
+            factory.add(community, None)
+        self.site.communities()[name] = self.dated(community)
+        self.added_object()
+
+        for i in range(sizes['entries']):
+            creator = self.random.choice(members)
+            entry = create_content(IBlogEntry,
+                                   gen.title(),
+                                   gen.text(200),
+                                   gen.text(20),
+                                   creator,
+                                   )
+            self.add_commented(community['blog'], 'entry-%d' % i, entry,
+                               creator, members)
+
+        forum = create_content(IForum, gen.title(), gen.text(20), members[0])
+        community['forums']['general'] = self.dated(forum)
+        self.added_object()
+        for i in range(sizes['topics']):
+            creator = self.random.choice(members)
+            topic = create_content(IForumTopic,
+                                   gen.title(),
+                                   gen.text(100),
+                                   creator,
+                                   )
+            self.add_commented(forum, 'topic-%d' % i, topic, creator,
+                               members)
+
+        for i in range(sizes['files']):
+            creator = self.random.choice(members)
+            filename = 'file-%d.txt' % i
+            f = create_content(ICommunityFile,
+                               gen.title(),
+                               StringIO(gen.text(300)),
+                               'text/plain',
+                               filename,
+                               creator,
+                               )
+            community['files'][filename] = self.dated(f)
+            self.tag(f, creator)
+            self.added_object()
+
+    def add_commented(self, container, name, obj, creator, members):
+        """ Add ``obj`` (a blog entry or forum topic) with comments.
+        """
+        gen = self.gen
+        container[name] = self.dated(obj)
+        self.tag(obj, creator)
+        self.added_object()
+        for i in range(self.sizes['comments']):
+            commenter = self.random.choice(members)
+            comment = create_content(IComment,
+                                     'Re: %s' % obj.title,
+                                     gen.text(50),
+                                     u'',
+                                     commenter,
+                                     )
+            obj['comments']['comment-%d' % i] = self.dated(
+                comment, obj.created)
+            self.added_object()
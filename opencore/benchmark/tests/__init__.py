@@ -0,0 +1 @@
+# A package
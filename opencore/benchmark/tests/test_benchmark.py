@@ -0,0 +1,137 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+import unittest
+
+class TestSummarize(unittest.TestCase):
+
+    def _callFUT(self, timings):
+        from opencore.benchmark.report import summarize
+        return summarize(timings)
+
+    def test_odd(self):
+        summary = self._callFUT([0.003, 0.001, 0.002])
+        self.assertEqual(summary['runs'], 3)
+        self.assertAlmostEqual(summary['min'], 1.0)
+        self.assertAlmostEqual(summary['median'], 2.0)
+        self.assertAlmostEqual(summary['mean'], 2.0)
+        self.assertAlmostEqual(summary['max'], 3.0)
+
+    def test_even(self):
+        summary = self._callFUT([0.004, 0.001, 0.002, 0.003])
+        self.assertAlmostEqual(summary['median'], 2.5)
+
+class TestRunQueries(unittest.TestCase):
+
+    def _callFUT(self, queries, **kw):
+        from opencore.benchmark.report import run_queries
+        return run_queries('sample', queries, timer=DummyTimer(), **kw)
+
+    def test_it(self):
+        calls = []
+        def query(sample):
+            calls.append(sample)
+            return 7
+        results = self._callFUT([('q', query)], repeat=3, warmup=2)
+        self.assertEqual(calls, ['sample'] * 5)
+        summary = results['q']
+        self.assertEqual(summary['runs'], 3)
+        self.assertEqual(summary['results'], 7)
+        self.assertAlmostEqual(summary['median'], 500.0)
+
+class TestMakeReport(unittest.TestCase):
+
+    def _callFUT(self, *arg, **kw):
+        from opencore.benchmark.report import make_report
+        return make_report(*arg, **kw)
+
+    def test_it(self):
+        import datetime
+        now = datetime.datetime(2010, 1, 2, 3, 4, 5)
+        report = self._callFUT({'q': {}}, {'profiles': 1}, DummySample(),
+                               'abc123', now=now)
+        self.assertEqual(report['label'], 'abc123')
+        self.assertEqual(report['date'], '2010-01-02T03:04:05')
+        self.assertEqual(report['sizes'], {'profiles': 1})
+        self.assertEqual(report['sample'], {'userid': 'a'})
+        self.assertEqual(report['queries'], {'q': {}})
+
+class TestCompareReports(unittest.TestCase):
+
+    def _callFUT(self, old, new):
+        from opencore.benchmark.report import compare_reports
+        return compare_reports(old, new)
+
+    def test_it(self):
+        old = {'queries': {'a': {'median': 2.0},
+                           'b': {'median': 0.0},
+                           'gone': {'median': 1.0}}}
+        new = {'queries': {'a': {'median': 1.0},
+                           'b': {'median': 1.0},
+                           'added': {'median': 1.0}}}
+        self.assertEqual(self._callFUT(old, new),
+                         [('a', 2.0, 1.0, 0.5), ('b', 0.0, 1.0, None)])
+
+    def test_format_comparison(self):
+        from opencore.benchmark.report import format_comparison
+        lines = format_comparison([('a', 2.0, 1.0, 0.5),
+                                   ('b', 0.0, 1.0, None)])
+        self.assertEqual(len(lines), 3)
+        self.failUnless(lines[1].endswith('0.50'))
+        self.failUnless(lines[2].endswith('-'))
+
+class TestTextGenerator(unittest.TestCase):
+
+    def _makeOne(self, seed=0, vocabulary=100):
+        from opencore.benchmark.sitegen import TextGenerator
+        return TextGenerator(seed, vocabulary)
+
+    def test_same_seed_same_text(self):
+        one = self._makeOne()
+        two = self._makeOne()
+        self.assertEqual(one.text(50), two.text(50))
+        self.assertEqual(len(one.text(50).split()), 50)
+
+    def test_vocabulary(self):
+        gen = self._makeOne()
+        self.assertEqual(len(set(gen.words)), 100)
+        common = set(gen.words[:5])
+        for i in range(100):
+            self.failUnless(gen.word(5) in common)
+
+    def test_frequencies_are_skewed(self):
+        gen = self._makeOne()
+        counts = {}
+        for i in range(2000):
+            word = gen.word()
+            counts[word] = counts.get(word, 0) + 1
+        self.failUnless(counts.get(gen.words[0], 0) >
+                        counts.get(gen.words[-1], 0))
+
+class DummyTimer:
+    def __init__(self):
+        self.now = 0
+    def __call__(self):
+        self.now += 0.5
+        return self.now
+
+class DummySample:
+    def info(self):
+        return {'userid': 'a'}
@@ -0,0 +1,159 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+
+from repoze.bfg import testing
+
+class TestEvolve1(unittest.TestCase):
+    def _callFUT(self, context):
+        from opencore.evolve.evolve1 import evolve
+        return evolve(context)
+
+    def test_it(self):
+        site = DummySite()
+        self._callFUT(site)
+        self.failUnless(site.updated)
+
+class TestEvolve2(unittest.TestCase):
+    def _callFUT(self, context):
+        from opencore.evolve.evolve2 import evolve
+        return evolve(context)
+
+    def test_it(self):
+        site = DummySite()
+        self._callFUT(site)
+        self.failUnless(site.updated)
+
+class TestEvolve3(unittest.TestCase):
+    def setUp(self):
+        from opencore.evolve import evolve3
+        self.calls = []
+        def reindex_catalog(context, **kw):
+            self.calls.append((context, kw))
+        self._saved = evolve3.reindex_catalog
+        evolve3.reindex_catalog = reindex_catalog
+
+    def tearDown(self):
+        from opencore.evolve import evolve3
+        evolve3.reindex_catalog = self._saved
+
+    def _callFUT(self, context):
+        from opencore.evolve.evolve3 import evolve
+        return evolve(context)
+
+    def test_it(self):
+        site = DummySite()
+        self._callFUT(site)
+        self.assertEqual(self.calls, [
+            (site, {'indexes': ['member_name', 'titlestartswith']})])
+
+class TestEvolve4(unittest.TestCase):
+    def setUp(self):
+        from opencore.evolve import evolve4
+        self.calls = []
+        def reindex_catalog(context, **kw):
+            self.calls.append((context, kw))
+        self._saved = evolve4.reindex_catalog
+        evolve4.reindex_catalog = reindex_catalog
+
+    def tearDown(self):
+        from opencore.evolve import evolve4
+        evolve4.reindex_catalog = self._saved
+
+    def _callFUT(self, context):
+        from opencore.evolve.evolve4 import evolve
+        return evolve(context)
+
+    def test_it(self):
+        site = DummySite()
+        self._callFUT(site)
+        self.assertEqual(self.calls, [(site, {'indexes': ['parent']})])
+
+class TestEvolve5(unittest.TestCase):
+    def _callFUT(self, context):
+        from opencore.evolve.evolve5 import evolve
+        return evolve(context)
+
+    def test_it(self):
+        site = DummySite()
+        site.tags = DummyTags()
+        self._callFUT(site)
+        self.failUnless(site.tags.updated)
+
+    def test_no_tags(self):
+        site = DummySite()
+        self._callFUT(site)
+        self.failIf(site.updated)
+
+class TestEvolve6(unittest.TestCase):
+    def _callFUT(self, context):
+        from opencore.evolve.evolve6 import evolve
+        return evolve(context)
+
+    def test_it(self):
+        site = DummySite()
+        site.tags = DummyTags()
+        self._callFUT(site)
+        self.failUnless(site.tags.updated)
+
+class TestEvolve7(unittest.TestCase):
+    def _callFUT(self, context):
+        from opencore.evolve.evolve7 import evolve
+        return evolve(context)
+
+    def test_it(self):
+        site = DummySite()
+        site.tags = DummyTags()
+        self._callFUT(site)
+        self.failUnless(site.tags.updated)
+
+class TestEvolve8(unittest.TestCase):
+    def _callFUT(self, context):
+        from opencore.evolve.evolve8 import evolve
+        return evolve(context)
+
+    def test_it(self):
+        site = DummySite()
+        site.tags = DummyTags()
+        self._callFUT(site)
+        self.failUnless(site.tags.updated)
+
+class TestEvolve9(unittest.TestCase):
+    def _callFUT(self, context):
+        from opencore.evolve.evolve9 import evolve
+        return evolve(context)
+
+    def test_it(self):
+        site = DummySite()
+        site.tags = DummyTags()
+        self._callFUT(site)
+        self.failUnless(site.tags.updated)
+
+class DummySite(testing.DummyModel):
+    updated = False
+
+    def update_indexes(self):
+        self.updated = True
+
+class DummyTags(object):
+    updated = False
+
+    def update_indexes(self):
+        self.updated = True
@@ -17,8 +17,11 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
 
+import datetime
+import heapq
 import warnings
 
+import BTrees
 from ZODB.POSException import POSKeyError
 
 from repoze.bfg.interfaces import ILogger
@@ -28,11 +31,15 @@ from repoze.bfg.traversal import find_model
 from repoze.bfg.traversal import model_path
 from repoze.bfg.traversal import find_interface
 from repoze.bfg.url import model_url
+from repoze.catalog.indexes.keyword import CatalogKeywordIndex
 from repoze.lemonade.listitem import get_listitems
 from zope.component import queryUtility
 from zope.interface import implements
 
 from opencore.consts import countries
+from opencore.models.indexqueue import find_indexing_queue
+from opencore.models.indexqueue import process_indexing_queue
+from opencore.models.indexqueue import queued_docids
 from opencore.models.interfaces import ICatalogSearch
 from opencore.models.interfaces import IComment
 from opencore.models.interfaces import ICommunity
@@ -43,6 +50,7 @@ from opencore.models.interfaces import IToolFactory
 from opencore.models.interfaces import ITextIndexData
 from opencore.models.interfaces import IProfileDict
 from opencore.models.profile import social_category
+from opencore.models.snapshot import address_lookup
 from opencore.utils import find_catalog
 from opencore.utils import find_profiles
 from opencore.utils import find_tags
@@ -57,6 +65,55 @@ from opencore.utilities.converters.stripogram import html2text
 import logging
 log = logging.getLogger(__name__)
 
+# search arguments which don't change the set of matching documents
+FACET_IGNORED = ('sort_index', 'reverse', 'limit', 'sort_type', 'offset',
+                 'index_query_order')
+
+# date indexes, whose facets count documents by year
+YEAR_FACETS = ('creation_date', 'modified_date', 'content_modified',
+               'start_date', 'end_date', 'publication_date')
+
+_marker = object()
+
+def _year(value):
+    # dates are indexed by coarse_datetime_repr
+    return datetime.datetime.utcfromtimestamp(value * 100).year
+
+def facet_counts(index, docids, bucket=None):
+    """ Count the documents in ``docids`` by their value in ``index``.
+
+    Returns a ``{value: count}`` dict, with values mapped through
+    ``bucket`` if it is given.  Indexes may count for themselves by
+    providing a ``facet_counts(docids)`` method.
+    """
+    if hasattr(index, 'facet_counts'):
+        return index.facet_counts(docids)
+    family = getattr(index, 'family', BTrees.family32)
+    counts = {}
+    fwd = index._fwd_index
+    if len(fwd) < len(docids):
+        # fewer values than documents: intersect each value's postings
+        for value, postings in fwd.items():
+            num = len(family.IF.intersection(postings, docids))
+            if num:
+                if bucket is not None:
+                    value = bucket(value)
+                counts[value] = counts.get(value, 0) + num
+        return counts
+    rev = index._rev_index
+    multi = isinstance(index, CatalogKeywordIndex)
+    for docid in docids:
+        values = rev.get(docid, _marker)
+        if values is _marker:
+            continue
+        if not multi:
+            values = (values,)
+        for value in values:
+            if bucket is not None:
+                value = bucket(value)
+            counts[value] = counts.get(value, 0) + 1
+    return counts
+
 
 class CatalogSearch(object):
     """ Centralize policies about searching """
@@ -66,13 +123,25 @@ class CatalogSearch(object):
         #     compatability.  Should be phased out.
         self.context = context
         self.catalog = find_catalog(self.context)
+        # models found by resolve_many, by path
+        self._models = {}
         if request is not None:
             warnings.warn('Creating CatalogSearch with request is deprecated.',
                           DeprecationWarning, stacklevel=2)
 
-    def __call__(self, **kw):
+    def __call__(self, consistent=False, **kw):
+        """ Search the catalog and return ``(num, docids, resolver)``.
+
+        With deferred indexing, ``consistent`` first applies the catalog
+        operations queued by the current transaction, so the search sees
+        this request's own changes.  Operations queued by other
+        transactions, including an earlier request which redirected to
+        this one, are left to the indexer and may not be visible yet.
+        """
+        if consistent:
+            self._process_queue()
         num, docids = self.catalog.search(**kw)
-        address = self.catalog.document_map.address_for_docid
+        address = address_lookup(self.catalog)
         logger = queryUtility(ILogger, 'repoze.bfg.debug')
         def resolver(docid):
             path = address(docid)
@@ -85,6 +154,86 @@ class CatalogSearch(object):
                 return None
         return num, docids, resolver
 
+    def resolve_many(self, docids, prefetch=False):
+        """ Return the models for ``docids``, in order, with None for
+        any which can't be found.
+
+        Each path is resolved from the root with ``find_model``, so the
+        registered traverser is honoured, and the models found are
+        remembered for the life of the adapter.  With ``prefetch``, the
+        models' records are loaded in bulk where the database supports
+        it.
+        """
+        address = address_lookup(self.catalog)
+        models = []
+        logger = queryUtility(ILogger, 'repoze.bfg.debug')
+        for docid in docids:
+            path = address(docid)
+            model = None
+            if path is not None:
+                try:
+                    model = self._traverse(path)
+                except KeyError:
+                    logger and logger.warn('Model missing: %s' % path)
+            models.append(model)
+        if prefetch:
+            _prefetch(filter(None, models))
+        return models
+
+    def _traverse(self, path):
+        models = self._models
+        model = models.get(path)
+        if model is None:
+            model = models[path] = find_model(self.context, path)
+        return model
+
+    def facets(self, facets, consistent=False, **kw):
+        """ Search once and count the matching documents by value for
+        each index named in ``facets``.
+
+        Returns ``(num, counts)``, where ``counts`` maps each facet to a
+        ``{value: count}`` dict.  Date facets count documents by year.
+        Sorting and batching arguments are ignored.  ``consistent`` is
+        as for ``__call__``.
+        """
+        if consistent:
+            self._process_queue()
+        for name in FACET_IGNORED:
+            kw.pop(name, None)
+        num, docids = self.catalog.search(**kw)
+        IF = BTrees.family32.IF
+        if not isinstance(docids, (IF.Set, IF.TreeSet)):
+            docids = IF.TreeSet(docids)
+        counts = {}
+        for name in facets:
+            bucket = name in YEAR_FACETS and _year or None
+            counts[name] = facet_counts(self.catalog[name], docids, bucket)
+        return num, counts
+
+    def _process_queue(self):
+        # With deferred indexing, a consistent search first applies the
+        # catalog operations this transaction has queued, so it sees its
+        # own changes.  Other transactions' operations are left to the
+        # indexer: draining the whole queue here would make the request
+        # pay for the site's entire indexing backlog.
+        if find_indexing_queue(self.context):
+            docids = queued_docids()
+            process_indexing_queue(self.context, docids=docids)
+            docids.clear()
+
+
+def _prefetch(models):
+    # ZODB connections which can load several records in one round trip
+    # have a ``prefetch`` method (ZODB >= 5).
+    by_jar = {}
+    for model in models:
+        jar = getattr(model, '_p_jar', None)
+        if jar is not None:
+            by_jar.setdefault(jar, []).append(model)
+    for jar, objects in by_jar.items():
+        prefetch = getattr(jar, 'prefetch', None)
+        if prefetch is not None:
+            prefetch(objects)
 
 
 class GridEntryInfo(object):
@@ -348,7 +497,7 @@ class CommunityInfo(object):
 
         raw = self.tags.getFrequency(community=self.context.__name__)
         result = []
-        for tag, count in sorted(raw, key=lambda x: x[1], reverse=True)[:5]:
+        for tag, count in heapq.nlargest(5, raw, key=lambda x: x[1]):
             result.append({'tag': tag, 'count': count})
         return result
 
@@ -21,6 +21,10 @@ import os
 import sys
 import time
 import cPickle
+from array import array
+from functools import partial
+from itertools import islice
+from operator import itemgetter
 
 import transaction
 
@@ -30,59 +34,126 @@ from zope.component import queryUtility
 
 from repoze.bfg.traversal import find_model
 from repoze.catalog.catalog import Catalog
+from repoze.catalog.indexes.common import CatalogIndex
+from repoze.catalog.indexes.field import CatalogFieldIndex
+from repoze.catalog.indexes.keyword import CatalogKeywordIndex
+from repoze.catalog.indexes.text import CatalogTextIndex
 from repoze.catalog.interfaces import ICatalog
 from repoze.lru import LRUCache
 
+from opencore.models.indexes import CatalogAllowedIndex
+from opencore.models.indexes import CatalogPrefixIndex
+from opencore.models.indexes import CatalogRankedTextIndex
 from opencore.models.interfaces import ICatalogQueryEvent
 from opencore.models.interfaces import ICatalogSearchCache
+from opencore.models.profiler import profile_query
+from opencore.models.snapshot import snapshots
 from opencore.utils import find_site
 
 from BTrees.Length import Length
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+from ZODB.broken import Broken
+from ZODB.POSException import ConflictError
 
 LARGE_RESULT_SET = 500
+MAX_CACHED_RESULT_SET = 50000
+ESTIMATE_REFRESH = 100
+
+# search parameters which don't affect the number of results
+COUNT_IGNORED = ('sort_index', 'reverse', 'limit', 'sort_type', 'offset',
+                 'index_query_order')
+
+_marker = object()
 
 class CachingCatalog(Catalog):
     implements(ICatalog)
 
     os = os # for unit tests
+    snapshots = snapshots # for unit tests
+    profiler = profile_query # for unit tests
     generation = None # b/c
+    generations = None # b/c
+    _v_term_counts = None
+    _v_profile = None
+    _v_snapshot = None
+    _v_ranked = None
+    _v_cache_miss = False
 
     def __init__(self):
         super(CachingCatalog, self).__init__()
         self.generation = Length(0)
+        self.generations = OOBTree()
 
     def clear(self):
         self.invalidate()
         super(CachingCatalog, self).clear()
 
-    def index_doc(self, *arg, **kw):
-        self.invalidate()
-        super(CachingCatalog, self).index_doc(*arg, **kw)
-
-    def unindex_doc(self, *arg, **kw):
-        self.invalidate()
-        super(CachingCatalog, self).unindex_doc(*arg, **kw)
-
-    def reindex_doc(self, *arg, **kw):
-        self.invalidate()
-        super(CachingCatalog, self).reindex_doc(*arg, **kw)
-
-    def __setitem__(self, *arg, **kw):
-        self.invalidate()
-        super(CachingCatalog, self).__setitem__(*arg, **kw)
+    def index_doc(self, docid, obj):
+        self._tracked(super(CachingCatalog, self).index_doc, docid, obj)
+
+    def index_docs(self, docs):
+        """ Index an iterable of (docid, obj) in one go.
+
+        Each index is updated in docid order, so that consecutive writes
+        land in the same BTree buckets, and the indexes which changed are
+        invalidated once at the end.
+        """
+        docs = sorted(docs, key=itemgetter(0))
+        changed = []
+        for name, index in self.items():
+            for docid, obj in docs:
+                if name in changed:
+                    index.index_doc(docid, obj)
+                    continue
+                before = _fingerprint(index, docid)
+                index.index_doc(docid, obj)
+                if _fingerprint(index, docid) != before:
+                    changed.append(name)
+        if changed:
+            self.invalidate(changed)
+
+    def unindex_doc(self, docid):
+        self._tracked(super(CachingCatalog, self).unindex_doc, docid)
+
+    def reindex_doc(self, docid, obj):
+        self._tracked(super(CachingCatalog, self).reindex_doc, docid, obj)
+
+    def __setitem__(self, name, index):
+        super(CachingCatalog, self).__setitem__(name, index)
+        generations = self.generations
+        if generations is not None and name not in generations:
+            generations[name] = Length(0)
+        self.invalidate([name])
+
+    def _tracked(self, method, docid, *arg):
+        # Only invalidate the indexes whose entry for docid was changed,
+        # so cached queries against unrelated indexes stay valid.
+        before = [(name, _fingerprint(index, docid))
+                  for name, index in self.items()]
+        method(docid, *arg)
+        changed = [name for name, value in before
+                   if _fingerprint(self[name], docid) != value]
+        self.invalidate(changed)
 
     def search(self, *arg, **kw):
+        """ Search as ``Catalog.search`` does, returning ``(num, docids)``.
+
+        With an ``offset``, only the sorted docids from ``offset`` to
+        ``offset + limit`` are returned, and ``num`` counts the whole
+        result set, for batching.  Without one, ``num`` is at most
+        ``limit``, as with ``Catalog.search``, whether the results are
+        sorted by a sort index or ranked by relevance.
+        """
         use_cache = True
 
         if 'use_cache' in kw:
             use_cache = kw.pop('use_cache')
 
-        if 'NO_CATALOG_CACHE' in self.os.environ:
-            use_cache = False
+        if kw.pop('count_only', False):
+            return self._count(arg, kw, use_cache), ()
 
-        if 'tags' in kw:
-            # The tags index changes without invalidating the catalog,
-            # so don't cache any query involving the tags index.
+        if 'NO_CATALOG_CACHE' in self.os.environ:
             use_cache = False
 
         if not use_cache:
@@ -93,85 +164,587 @@ class CachingCatalog(Catalog):
         if cache is None:
             return self._search(*arg, **kw)
 
+        start = time.time()
         key = cPickle.dumps((arg, kw))
 
-        generation = self.generation
-
-        if generation is None:
-            generation = Length(0)
-
-        genval = generation.value
-
-        if (genval == 0) or (genval > cache.generation):
-            # an update in another process requires that the local cache be
-            # invalidated
-            cache.clear()
-            cache.generation = genval
-
-        if cache.get(key) is None:
+        # A cache entry records the generation of each index the query
+        # uses; it is stale as soon as any one of them has moved on,
+        # whichever process made the change.
+        generations, uncommitted = self._query_generations(arg, kw)
+
+        entry = cache.get(key)
+
+        if entry is not None and entry[0] == generations:
+            num, prefix, complete = entry[1:]
+            if complete:
+                result = num, prefix
+            else:
+                def continuation():
+                    num, docids = self._search(*arg, **kw)
+                    return islice(docids, len(prefix), None)
+                result = num, CachedResultSet(prefix, continuation)
+            notify(CatalogQueryEvent(self, kw, time.time() - start, result,
+                                     cached=True))
+            return result
+
+        self._v_cache_miss = True
+        try:
             num, docids = self._search(*arg, **kw)
-
-            # We don't cache large result sets because the time it takes to
-            # unroll the result set turns out to be far more time than it
-            # takes to run the search. In a particular instance using OSI's
-            # catalog a search that took 0.015s but returned nearly 35,295
-            # results took over 50s to unroll the result set for caching,
-            # significantly slowing search performance.
-            if num > LARGE_RESULT_SET:
+        finally:
+            self._v_cache_miss = False
+
+        if uncommitted:
+            # This transaction has written to an index the query uses but
+            # not yet committed; if it aborts, another transaction may
+            # commit different data under the same generations.
+            return num, docids
+
+        # Unrolling a sorted result set means running the whole sort: in a
+        # particular instance using OSI's catalog a search that took 0.015s
+        # but returned nearly 35,295 results took over 50s to unroll for
+        # caching.  So large sorted results are cached as their first
+        # LARGE_RESULT_SET docids only, which covers the pages people
+        # actually look at; reading beyond the prefix runs the search
+        # again.  Unsorted results are intersected IFSets, which are cheap
+        # to unroll.
+        if kw.get('sort_index') is None:
+            if num > MAX_CACHED_RESULT_SET:
                 return num, docids
+            prefix = array('i', docids)
+            complete = True
+        else:
+            docids = iter(docids)
+            prefix = array('i', islice(docids, LARGE_RESULT_SET))
+            complete = len(prefix) < LARGE_RESULT_SET
+
+        # we need to unroll here; a btree-based structure may have
+        # a reference to its connection
+        cache.put(key, (generations, num, prefix, complete))
+
+        if complete:
+            return num, prefix
+        return num, CachedResultSet(prefix, lambda: docids)
+
+    def _count(self, arg, kw, use_cache):
+        """ Return the number of documents matching a query.
+
+        Sorting and paging don't change the count, so they are dropped
+        from the query: the count is the length of the intersected docid
+        sets.  Counts are cached apart from docid results and only depend
+        on the generations of the indexes searched, not the sort index.
+        """
+        query = dict(kw)
+        for name in COUNT_IGNORED:
+            query.pop(name, None)
 
-            # we need to unroll here; a btree-based structure may have
-            # a reference to its connection
-            docids = list(docids)
-            cache.put(key, (num, docids))
+        if 'NO_CATALOG_CACHE' in self.os.environ:
+            use_cache = False
 
-        return cache.get(key)
+        # an empty cache is falsy, so test it against None
+        cache = None
+        if use_cache:
+            cache = queryUtility(ICatalogSearchCache)
+        if cache is None:
+            return self._search(*arg, **query)[0]
+
+        key = cPickle.dumps(('count', arg, query))
+        generations, uncommitted = self._query_generations(arg, query)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == generations:
+            return entry[1]
+
+        num = self._search(*arg, **query)[0]
+        if not uncommitted:
+            cache.put(key, (generations, num))
+        return num
+
+    def _query_generations(self, arg, kw):
+        """ Return the generations of the indexes used by a query and a
+        flag telling whether any of them was changed in this transaction.
+
+        Indexes which keep their data outside the catalog (the tags and
+        topics indexes) are also versioned by the ``generation`` of their
+        source.
+        """
+        if arg:
+            # not a keyword query; assume it may use every index
+            names = self.keys()
+        else:
+            names = set([name for name in kw if name in self])
+            sort_index = kw.get('sort_index')
+            if sort_index is not None:
+                names.add(sort_index)
+        generations = self.generations or {}
+        result = []
+        uncommitted = False
+        for name in sorted(names):
+            length = generations.get(name)
+            if length is None:
+                entry = (name, 0)
+            else:
+                entry = (name, length.value)
+                uncommitted = uncommitted or self._uncommitted(length)
+            index = super(CachingCatalog, self).__getitem__(name)
+            source = getattr(index, 'generation', None)
+            if source is not None:
+                entry += (source.value,)
+                uncommitted = uncommitted or self._uncommitted(source)
+            result.append(entry)
+        return tuple(result), uncommitted
+
+    def _uncommitted(self, length):
+        """ Return whether the generation ``length`` was changed in the
+        current transaction.
+        """
+        if length._p_jar is None:
+            # Created in this transaction (by invalidate, on a catalog
+            # older than the generations, or with a new tagging engine),
+            # so not marked as changed; but other processes don't know
+            # its value.  In a catalog which isn't stored itself, nothing
+            # is.
+            return self._p_jar is not None
+        return bool(length._p_changed)
 
     def _search(self, *arg, **kw):
         start = time.time()
-        res = super(CachingCatalog, self).search(*arg, **kw)
+        if self._v_cache_miss:
+            cached = False
+        else:
+            cached = None
+        self._v_cache_miss = False
+        query = kw
+        plan = None
+        if not arg and 'index_query_order' not in kw:
+            plan = self._plan(kw)
+            if plan is not None:
+                query = dict(kw)
+                query['index_query_order'] = [name for name, _ in plan]
+        # __getitem__ times the indexes the search uses while a profile is
+        # set, and answers from the snapshot where it is current
+        profile = None
+        if self.profiler.is_enabled():
+            profile = _QueryProfile()
+        self._v_profile = profile
+        self._v_snapshot = self.snapshots.get(self)
+        try:
+            if 'offset' in query:
+                res = self._search_page(**query)
+            elif query.get('limit') and self._ranked(
+                query.get('sort_index'), query.get('reverse'), query):
+                num, docids = self._search_page(**query)
+                res = min(num, query['limit']), docids
+            else:
+                res = super(CachingCatalog, self).search(*arg, **query)
+        finally:
+            self._v_profile = None
+            self._v_snapshot = None
         duration = time.time() - start
-        notify(CatalogQueryEvent(self, kw, duration, res))
+        if profile is None:
+            timings, sort_time = (), None
+        else:
+            timings, sort_time = profile.timings, profile.sort_time
+        notify(CatalogQueryEvent(self, kw, duration, res, plan,
+                                 timings=timings, sort_time=sort_time,
+                                 cached=cached))
         return res
 
-    def invalidate(self):
-        # Increment the generation; this tells *another process* that
-        # its catalog cache needs to be cleared
+    def __getitem__(self, name):
+        index = super(CachingCatalog, self).__getitem__(name)
+        snapshot = self._v_snapshot
+        if snapshot is not None:
+            index = snapshot.wrap(self, name, index)
+        if name == self._v_ranked:
+            index = _CandidatesIndex(index)
+        profile = self._v_profile
+        if profile is None:
+            return index
+        return _TimedIndex(name, index, profile)
+
+    def _plan(self, kw):
+        """ Choose the order in which to apply the indexes of a query.
+
+        Return a list of (index name, estimated result size) in the order
+        the indexes should be applied, or None if there is nothing to
+        choose.  The first index is applied on its own and every later one
+        is intersected with the result so far, so the most selective index
+        goes first.  Indexes which cannot estimate their result size (path,
+        text and tag queries) are usually selective and go right after any
+        index expected to match nothing.
+        """
+        names = [name for name in kw if name in self]
+        if len(names) < 2:
+            return None
+        plan = [(name, self._estimate(name, kw[name])) for name in names]
+        def key(step):
+            name, estimate = step
+            return (estimate != 0, estimate is not None, estimate, name)
+        plan.sort(key=key)
+        return plan
+
+    def _estimate(self, name, query):
+        """ Estimate the number of docids ``query`` matches in the index
+        called ``name`` from the index's forward index (or its
+        ``term_count`` method), or return None if the index can't tell
+        cheaply.
+        """
+        index = self[name]
+        if (getattr(index, '_fwd_index', None) is None and
+            getattr(index, 'term_count', None) is None):
+            return None
+        if isinstance(index, (CatalogKeywordIndex, CatalogAllowedIndex)):
+            operator = 'and'
+        else:
+            operator = 'or'
+        if isinstance(query, dict):
+            if 'range' in query or 'query' not in query:
+                return index.documentCount()
+            operator = query.get('operator', operator)
+            query = query['query']
+        if not isinstance(query, (list, tuple)):
+            query = [query]
+        if operator not in ('and', 'or'):
+            return index.documentCount()
+        counts = [self._term_count(name, index, term) for term in query]
+        if not counts:
+            return 0
+        if operator == 'and':
+            return min(counts)
+        return min(sum(counts), index.documentCount())
+
+    def _term_count(self, name, index, term):
+        # Counting a large docid set loads all of its buckets, so counts
+        # are remembered until the index has seen ESTIMATE_REFRESH more
+        # writes: the planner only needs the order of magnitude.
+        counts = self._v_term_counts
+        if counts is None:
+            counts = self._v_term_counts = LRUCache(10000)
+        length = (self.generations or {}).get(name)
+        generation = length is not None and length.value or 0
+        try:
+            cached = counts.get((name, term))
+        except TypeError: # unhashable term
+            return _count_term(index, term)
+        if cached is not None:
+            cached_generation, count = cached
+            if 0 <= generation - cached_generation < ESTIMATE_REFRESH:
+                return count
+        count = _count_term(index, term)
+        counts.put((name, term), (generation, count))
+        return count
+
+    def _search_page(self, offset=0, limit=None, sort_index=None,
+                     reverse=False, **kw):
+        """ Return the ``limit`` docids starting at ``offset``.
+
+        The total is that of the whole result set, but only the first
+        ``offset + limit`` docids are sorted: the sort index gets the
+        ``limit`` so it can pick a partial sort strategy instead of
+        sorting every result and skipping up to ``offset``.
+        """
+        self._v_ranked = self._ranked(sort_index, reverse, kw)
+        try:
+            num, docids = super(CachingCatalog, self).search(**kw)
+        finally:
+            self._v_ranked = None
+        if limit is None:
+            stop = None
+        else:
+            stop = offset + limit
+        if sort_index is not None and num:
+            docids = self._sort(docids, sort_index, reverse, stop, kw)
+        return num, islice(docids, offset, stop)
+
+    def _ranked(self, sort_index, reverse, kw):
+        """ Return the name of the text index to rank a search by, if it
+        asks for the matches most relevant to its text query first.
+        """
+        if sort_index is None or reverse or sort_index not in kw:
+            return None
+        if sort_index not in self:
+            return None
+        index = super(CachingCatalog, self).__getitem__(sort_index)
+        if getattr(index, 'rank', None) is None:
+            return None
+        return sort_index
+
+    def _sort(self, docids, sort_index, reverse, limit, kw):
+        if self._ranked(sort_index, reverse, kw) is not None:
+            # only the best ``limit`` matches are scored
+            return self[sort_index].rank(kw[sort_index], docids,
+                                         limit=limit)
+        # The children of a single container can be read in order from a
+        # children index which keeps them sorted by ``sort_index``,
+        # instead of looking up every docid in the sort index.
+        for name, query in kw.items():
+            if not isinstance(query, basestring) or name not in self:
+                continue
+            index = self[name]
+            if sort_index not in getattr(index, 'sort_names', ()):
+                continue
+            # Reading the children finds ``limit`` results after about
+            # limit * children / rlen of them (all of them in reverse);
+            # sorting costs a sort index lookup per result.
+            children = index.child_count(query)
+            rlen = len(docids)
+            if reverse:
+                scanned = children
+            else:
+                scanned = (limit or rlen) * float(children) / rlen
+            if scanned <= rlen:
+                return index.sorted_children(query, sort_index, docids,
+                                             reverse=reverse, limit=limit)
+            break
+        return self[sort_index].sort(docids, reverse=reverse, limit=limit)
+
+    def invalidate(self, names=None):
+        """ Record a change to the indexes called ``names`` (by default,
+        every index); cached searches using any of them become stale.
+        """
+        if names is None:
+            names = self.keys()
+
+        # The catalog-wide generation tells *another process* that
+        # something in this catalog has changed.
         generation = self.generation
 
         if generation is None:
             generation = self.generation = Length(0)
 
-        if generation.value >= sys.maxint:
-            # don't keep growing the generation integer; wrap at sys.maxint
-            self.generation.set(0)
-        else:
-            self.generation.change(1)
-
-        # Clear the cache for *this process*
-        cache = queryUtility(ICatalogSearchCache)
-        if cache is not None:
-            cache.clear()
-            cache.generation = self.generation.value
+        _increment(generation)
+
+        generations = self.generations
+
+        if generations is None:
+            generations = self.generations = OOBTree()
+
+        for name in names:
+            length = generations.get(name)
+            if length is None:
+                generations[name] = Length(1)
+            else:
+                _increment(length)
+
+class CachedResultSet(object):
+    """ The docids of a cached sorted search whose cache entry only holds
+    the first few of them.
+
+    The leading docids come from ``prefix``; the rest are read on demand
+    from the iterator returned by ``continuation``, and remembered so the
+    result can be iterated more than once.
+    """
+    def __init__(self, prefix, continuation):
+        self.prefix = prefix
+        self._continuation = continuation
+        self._rest = None
+        self._tail = []
+
+    def __iter__(self):
+        for docid in self.prefix:
+            yield docid
+        tail = self._tail
+        i = 0
+        while True:
+            if i < len(tail):
+                yield tail[i]
+                i += 1
+                continue
+            if self._continuation is None:
+                return
+            if self._rest is None:
+                self._rest = iter(self._continuation())
+            try:
+                tail.append(self._rest.next())
+            except StopIteration:
+                self._continuation = self._rest = None
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if (i.start or 0) >= 0 and 0 <= i.stop <= len(self.prefix):
+                return list(self.prefix[i])
+            return list(self)[i]
+        if 0 <= i < len(self.prefix):
+            return self.prefix[i]
+        return list(self)[i]
+
+def _count_term(index, term):
+    # indexes without a forward index (the allowed index) count for
+    # themselves
+    term_count = getattr(index, 'term_count', None)
+    if term_count is not None:
+        return term_count(term)
+    return len(index._fwd_index.get(term, ()))
+
+def _increment(length):
+    if length.value >= sys.maxint:
+        # don't keep growing the generation integer; wrap at sys.maxint
+        length.set(0)
+    else:
+        length.change(1)
+
+def _fingerprint(index, docid):
+    """ Return a value which changes whenever the entry for ``docid`` in
+    ``index`` changes.
+
+    Indexes we don't know how to inspect get a new object every time, so
+    any write to the catalog counts as a change to them.
+    """
+    if hasattr(index, 'docid_to_path'):
+        # CatalogPathIndex2
+        attrs = getattr(index, 'docid_to_attr', {})
+        return (index.docid_to_path.get(docid), attrs.get(docid))
+    text = getattr(index, 'index', None)
+    if hasattr(text, '_docwords'):
+        # CatalogTextIndex
+        return text._docwords.get(docid)
+    rev_index = getattr(index, '_rev_index', None)
+    if rev_index is not None:
+        # CatalogFieldIndex, CatalogKeywordIndex
+        value = rev_index.get(docid)
+        if hasattr(value, 'keys'):
+            return tuple(value.keys())
+        return value
+    return object()
 
 # the ICatalogSearchCache component (wired in via ZCML)
 cache = LRUCache(1000)
-cache.generation = 0
 
 
+class _QueryProfile(object):
+    def __init__(self):
+        self.timings = []
+        self.sort_time = None
+
+class _TimedIndex(object):
+    """ Stands in for an index during a search, recording how long each
+    ``apply`` or ``apply_intersect`` takes and how many docids it returns,
+    and how long the sort takes.
+    """
+    def __init__(self, name, index, profile):
+        self._name = name
+        self._index = index
+        self._profile = profile
+
+    def apply(self, query):
+        start = time.time()
+        result = self._index.apply(query)
+        self._record(start, result)
+        return result
+
+    def apply_intersect(self, query, docids):
+        # The catalog applies every index after the first this way.
+        start = time.time()
+        result = self._index.apply_intersect(query, docids)
+        self._record(start, result)
+        return result
+
+    def _record(self, start, result):
+        duration = time.time() - start
+        if result is None:
+            num = 0
+        else:
+            num = len(result)
+        self._profile.timings.append((self._name, duration, num))
+
+    def sort(self, *arg, **kw):
+        return self._sorted(self._index.sort, *arg, **kw)
+
+    def rank(self, *arg, **kw):
+        return self._sorted(self._index.rank, *arg, **kw)
+
+    def sorted_children(self, *arg, **kw):
+        return self._sorted(self._index.sorted_children, *arg, **kw)
+
+    def _sorted(self, method, *arg, **kw):
+        # Sort indexes return a generator; with a limit, unroll it here
+        # (the caller reads it all anyway) so that the time is the sort's.
+        start = time.time()
+        result = method(*arg, **kw)
+        if kw.get('limit') is not None:
+            result = list(result)
+        self._profile.sort_time = time.time() - start
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+class _CandidatesIndex(object):
+    """ Stands in for a text index during a search ranked by it: applying
+    the index finds the matching docids without scoring them, and the
+    catalog ranks the final result with ``rank``.
+    """
+    def __init__(self, index):
+        self._index = index
+
+    def apply(self, query):
+        return self._index.candidates(query)
+
+    def apply_intersect(self, query, docids):
+        result = self.apply(query)
+        if docids is None:
+            return result
+        return self._index.family.IF.weightedIntersection(result, docids)[1]
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
 class CatalogQueryEvent(object):
     implements(ICatalogQueryEvent)
-    def __init__(self, catalog, query, duration, result):
+    def __init__(self, catalog, query, duration, result, plan=None,
+                 timings=(), sort_time=None, cached=None):
         self.catalog = catalog
         self.query = query
         self.duration = duration
         self.result = result
+        self.plan = plan
+        self.timings = timings
+        self.sort_time = sort_time
+        self.cached = cached
 
 
 ##TODO: move to utilities?
-def reindex_catalog(context, path_re=None, commit_interval=200, dry_run=False,
-                    output=None, transaction=transaction, indexes=None):
+def prepare_reindex(context, dry_run=False, output=None,
+                    transaction=transaction):
+    """ Bring the site's indexes up to date before a reindex.
 
+    Also creates the tree holding reindex checkpoints: worker processes
+    must not write to the catalog itself, or every commit would conflict.
+    """
+    site = find_site(context)
+    catalog = site.catalog
+
+    output and output('updating indexes')
+    site.update_indexes()
+    if getattr(catalog, 'reindex_checkpoints', None) is None:
+        catalog.reindex_checkpoints = OOBTree()
+    if dry_run:
+        output and output('*** aborting ***')
+        transaction.abort()
+    else:
+        output and output('*** committing ***')
+        transaction.commit()
+
+def reindex_catalog(context, path_re=None, commit_interval=200, dry_run=False,
+                    output=None, transaction=transaction, indexes=None,
+                    worker=0, workers=1, update_indexes=True, restart=False,
+                    imap=None, retries=5):
+    """ Reindex the documents in the site catalog.
+
+    Documents are reindexed in batches of ``commit_interval``, in path
+    order.  After each batch a checkpoint is committed along with it, so a
+    run that is interrupted resumes after the last committed batch when
+    started again with the same arguments (unless ``restart`` is true).
+
+    To share the work between processes, give each one a different
+    ``worker`` number out of ``workers``: it reindexes only the docids
+    equal to ``worker`` modulo ``workers``.  Run ``prepare_reindex`` once
+    beforehand and pass ``update_indexes=False`` to the workers.  Batches
+    which fail to commit because of a conflict are retried.
+
+    If ``imap`` is passed, the values of ``indexes`` are computed by
+    ``imap(batches)``, which must return the ``compute_index_values``
+    result for each batch of (path, docid) pairs, in order, typically from
+    a pool of processes.  Only the index writes happen in this process.
+    """
     def commit_or_abort():
         if dry_run:
             output and output('*** aborting ***')
@@ -183,30 +756,168 @@ def reindex_catalog(context, path_re=None, commit_interval=200, dry_run=False,
     site = find_site(context)
     catalog = site.catalog
 
-    output and output('updating indexes')
-    site.update_indexes()
-    commit_or_abort()
+    if update_indexes:
+        prepare_reindex(context, dry_run, output, transaction)
 
     if indexes is not None:
         output and output('reindexing only indexes %s' % str(indexes))
 
-    i = 1
-    for path, docid in catalog.document_map.address_to_docid.items():
+    if imap is not None:
+        if indexes is None:
+            raise ValueError('computing index values requires indexes')
+        for name in indexes:
+            if not isinstance(catalog[name], PRECOMPUTABLE_INDEXES):
+                raise ValueError("can't precompute values for index %s" %
+                                 name)
+
+    checkpoints = getattr(catalog, 'reindex_checkpoints', None)
+    key = (worker, workers)
+    signature = (indexes and tuple(indexes), path_re and path_re.pattern,
+                 imap is not None)
+    start = None
+    if checkpoints is not None and not restart:
+        checkpoint = checkpoints.get(key)
+        if checkpoint is not None and checkpoint[0] == signature:
+            start = checkpoint[1]
+            output and output('resuming after %s' % start)
+
+    def reindex_docs(batch):
+        for path, docid in batch:
+            output and output('reindexing %s' % path)
+            try:
+                model = find_model(context, path)
+            except KeyError:
+                output and output('error: %s not found' % path)
+                continue
+
+            if indexes is None:
+                catalog.reindex_doc(docid, model)
+            else:
+                for index in indexes:
+                    catalog[index].reindex_doc(docid, model)
+                catalog.invalidate(indexes)
+
+    def commit(write, last_path):
+        # Commit a batch along with the checkpoint after it; a last_path
+        # of None means the run is complete.
+        tries = 0
+        while True:
+            try:
+                write()
+                if checkpoints is not None:
+                    if last_path is not None:
+                        checkpoints[key] = (signature, last_path)
+                    elif key in checkpoints:
+                        del checkpoints[key]
+                commit_or_abort()
+                return
+            except ConflictError:
+                transaction.abort()
+                tries += 1
+                if tries >= retries:
+                    raise
+                output and output('*** conflict, retrying ***')
+
+    address_to_docid = catalog.document_map.address_to_docid
+    if start is None:
+        items = address_to_docid.items()
+    else:
+        items = address_to_docid.items(min=start, excludemin=True)
+    batches = _batches(items, path_re, worker, workers, commit_interval)
+
+    if imap is None:
+        work = ((partial(reindex_docs, batch), batch[-1][0])
+                for batch in batches)
+    else:
+        work = ((partial(apply_index_values, catalog, values, indexes,
+                         output), values[-1][0])
+                for values in imap(batches))
+
+    # The last batch is committed together with removing the checkpoint.
+    pending = None
+    for item in work:
+        if pending is not None:
+            commit(*pending)
+        pending = item
+    if pending is None:
+        commit(lambda: None, None)
+    else:
+        commit(pending[0], None)
+
+def _batches(items, path_re, worker, workers, size):
+    batch = []
+    for path, docid in items:
+        if docid % workers != worker:
+            continue
         if path_re is not None and path_re.match(path) is None:
             continue
-        output and output('reindexing %s' % path)
+        batch.append((path, docid))
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# indexes which store exactly what their discriminator returns
+PRECOMPUTABLE_INDEXES = (CatalogFieldIndex, CatalogKeywordIndex,
+                         CatalogTextIndex, CatalogAllowedIndex,
+                         CatalogPrefixIndex)
+
+def compute_index_values(context, batch, indexes):
+    """ Compute the values of ``indexes`` for a batch of (path, docid).
+
+    Returns a list of (path, docid, values) where values maps each index
+    name to the value its discriminator returns for the document, leaving
+    out the indexes which have no value for it, or is None if there is no
+    document at path.  The result can be pickled and applied in another
+    process with ``apply_index_values``.
+    """
+    catalog = find_site(context).catalog
+    result = []
+    for path, docid in batch:
         try:
             model = find_model(context, path)
         except KeyError:
+            result.append((path, docid, None))
+            continue
+        values = {}
+        for name in indexes:
+            discriminator = catalog[name].discriminator
+            if callable(discriminator):
+                value = discriminator(model, _marker)
+            else:
+                value = getattr(model, discriminator, _marker)
+            if value is not _marker:
+                values[name] = value
+        result.append((path, docid, values))
+    return result
+
+def apply_index_values(catalog, values, indexes, output=None):
+    """ Write values computed by ``compute_index_values`` to ``indexes``.
+    """
+    for path, docid, docvalues in values:
+        if docvalues is None:
             output and output('error: %s not found' % path)
             continue
-
-        if indexes is None:
-            catalog.reindex_doc(docid, model)
-        else:
-            for index in indexes:
-                catalog[index].reindex_doc(docid, model)
-        if i % commit_interval == 0:
-            commit_or_abort()
-        i+=1
-    commit_or_abort()
+        output and output('reindexing %s' % path)
+        for name in indexes:
+            _index_value(catalog[name], docid, docvalues.get(name, _marker))
+    catalog.invalidate(indexes)
+
+def _index_value(index, docid, value):
+    # What CatalogIndex.index_doc does once the discriminator has returned
+    # value; _marker means the document has no value for the index.
+    if value is _marker:
+        index.unindex_doc(docid)
+        index._not_indexed.add(docid)
+        return
+    if isinstance(value, Persistent):
+        raise ValueError('Catalog cannot index persistent object %s' % value)
+    if isinstance(value, Broken):
+        raise ValueError('Catalog cannot index broken object %s' % value)
+    if docid in index._not_indexed:
+        index._not_indexed.remove(docid)
+    super(CatalogIndex, index).index_doc(docid, value)
+    if isinstance(index, CatalogRankedTextIndex):
+        # what CatalogRankedTextIndex.index_doc adds
+        index._raise_bounds(docid)
@@ -0,0 +1,1007 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""Catalog indexes specific to opencore"""
+
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+import heapq
+import re
+
+import BTrees
+from BTrees.Length import Length
+from persistent import Persistent
+from zope.index.field import FieldIndex
+from zope.index.text.baseindex import inverse_doc_frequency
+from zope.index.text.queryparser import QueryParser
+from zope.interface import implements
+
+from repoze.catalog import RangeValue
+from repoze.catalog.interfaces import ICatalogIndex
+from repoze.catalog.indexes.common import CatalogIndex
+from repoze.catalog.indexes.field import CatalogFieldIndex
+from repoze.catalog.indexes.keyword import CatalogKeywordIndex
+from repoze.catalog.indexes.text import CatalogTextIndex
+
+_marker = object()
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# docids are random 32 bit integers; this makes 4096 blocks of them
+BLOCK_SHIFT = 20
+
+
+class AllowedIndex(Persistent):
+    """ A keyword index for the principals allowed to view a document.
+
+    Most documents share one of a few distinct principal sets (those of
+    their community, mostly), so each distinct set is stored once and
+    documents map to the id of their set.  A query finds the sets holding
+    the principals asked for, then unions the documents of those sets.
+    """
+    family = BTrees.family32
+
+    def __init__(self, family=None):
+        if family is not None:
+            self.family = family
+        self.clear()
+
+    def clear(self):
+        # set id -> sorted tuple of principals
+        self._sets = self.family.IO.BTree()
+        # sorted tuple of principals -> set id
+        self._set_ids = self.family.OI.BTree()
+        # principal -> ids of the sets holding it
+        self._principal_sets = self.family.OO.BTree()
+        # set id -> docids
+        self._set_docids = self.family.IO.BTree()
+        # docid -> set id
+        self._rev_index = self.family.II.BTree()
+        self._num_docs = Length(0)
+
+    def documentCount(self):
+        """Return the number of documents in the index."""
+        return self._num_docs()
+
+    def setCount(self):
+        """Return the number of distinct principal sets."""
+        return len(self._sets)
+
+    def has_doc(self, docid):
+        return docid in self._rev_index
+
+    def _indexed(self):
+        return self._rev_index.keys()
+
+    def _intern(self, principals):
+        key = tuple(sorted(set(principals)))
+        set_id = self._set_ids.get(key)
+        if set_id is None:
+            set_id = self._sets.maxKey() + 1 if self._sets else 1
+            self._sets[set_id] = key
+            self._set_ids[key] = set_id
+            self._set_docids[set_id] = self.family.IF.TreeSet()
+            for principal in key:
+                set_ids = self._principal_sets.get(principal)
+                if set_ids is None:
+                    set_ids = self._principal_sets[principal] = \
+                        self.family.II.TreeSet()
+                set_ids.insert(set_id)
+        return set_id
+
+    def _release(self, set_id, docid):
+        docids = self._set_docids[set_id]
+        docids.remove(docid)
+        if docids:
+            return
+        # the last document using this set has gone
+        key = self._sets[set_id]
+        del self._sets[set_id]
+        del self._set_ids[key]
+        del self._set_docids[set_id]
+        for principal in key:
+            set_ids = self._principal_sets[principal]
+            set_ids.remove(set_id)
+            if not set_ids:
+                del self._principal_sets[principal]
+
+    def index_doc(self, docid, principals):
+        if isinstance(principals, basestring):
+            raise TypeError('principals must be a list/tuple of strings')
+        if not principals:
+            self.unindex_doc(docid)
+            return
+        set_id = self._intern(principals)
+        old = self._rev_index.get(docid)
+        if old == set_id:
+            return
+        if old is None:
+            self._num_docs.change(1)
+        else:
+            self._release(old, docid)
+        self._set_docids[set_id].insert(docid)
+        self._rev_index[docid] = set_id
+
+    def unindex_doc(self, docid):
+        set_id = self._rev_index.get(docid)
+        if set_id is None:
+            return
+        del self._rev_index[docid]
+        self._release(set_id, docid)
+        self._num_docs.change(-1)
+
+    def principals(self, docid):
+        """Return the principals allowed to view ``docid``, or None."""
+        set_id = self._rev_index.get(docid)
+        if set_id is None:
+            return None
+        return self._sets[set_id]
+
+    def term_count(self, principal):
+        """Return the number of documents ``principal`` may view."""
+        set_ids = self._principal_sets.get(principal, ())
+        return sum([len(self._set_docids[id]) for id in set_ids])
+
+    def search(self, query, operator='and'):
+        if isinstance(query, basestring):
+            query = [query]
+        IF = self.family.IF
+        II = self.family.II
+        empty = II.Set()
+        set_ids = [self._principal_sets.get(principal, empty)
+                   for principal in query]
+        if not set_ids:
+            return IF.Set()
+        if operator == 'or':
+            set_ids = II.multiunion(set_ids)
+        elif operator == 'and':
+            set_ids.sort(key=len)
+            result = None
+            for ids in set_ids:
+                result = II.intersection(result, ids)
+                if not result:
+                    break
+            set_ids = result
+        else:
+            raise TypeError('Allowed index only supports `and` and `or` '
+                            'operators, not `%s`.' % operator)
+        if not set_ids:
+            return IF.Set()
+        return IF.multiunion([self._set_docids[id] for id in set_ids])
+
+    def apply(self, query):
+        operator = 'and'
+        if isinstance(query, dict):
+            if 'operator' in query:
+                operator = query['operator']
+            query = query['query']
+        return self.search(query, operator=operator)
+
+class CatalogAllowedIndex(CatalogIndex, AllowedIndex):
+    """ An AllowedIndex for use in a repoze.catalog catalog.
+
+    Query types supported: Eq, NotEq, Any, NotAny, All, NotAll, as for
+    a keyword index.
+    """
+    implements(ICatalogIndex)
+
+    # the index classes copy_from can convert
+    replaces = (CatalogKeywordIndex,)
+
+    def __init__(self, discriminator):
+        if not callable(discriminator):
+            if not isinstance(discriminator, basestring):
+                raise ValueError('discriminator value must be callable or a '
+                                 'string')
+        self.discriminator = discriminator
+        self._not_indexed = self.family.IF.Set()
+        self.clear()
+
+    def reindex_doc(self, docid, value):
+        # index_doc replaces the document's set
+        return self.index_doc(docid, value)
+
+    def applyAny(self, values):
+        return self.apply({'query': values, 'operator':'or'})
+
+    applyIn = applyAny
+
+    def applyAll(self, values):
+        return self.apply({'query': values, 'operator':'and'})
+
+    def applyEq(self, value):
+        return self.apply(value)
+
+    def copy_from(self, index):
+        """ Index the documents of a keyword index of the same principals,
+        without running the discriminator again.
+        """
+        for docid, principals in index._rev_index.items():
+            AllowedIndex.index_doc(self, docid, tuple(principals))
+        self._not_indexed = self.family.IF.Set(index._not_indexed)
+
+
+class _DateOrder(Persistent):
+    """ The docids of a date index sorted by (value, docid), alongside
+    their values.  Replaced rather than modified, so that each merge
+    writes a fresh record.
+    """
+    def __init__(self, values=None, docids=None):
+        self.values = values or array('i')
+        self.docids = docids or array('i')
+
+    def __len__(self):
+        return len(self.docids)
+
+class DateIndex(FieldIndex):
+    """ A field index of integer dates (see ``coarse_datetime_repr``)
+    which also keeps its documents in arrays sorted by date.
+
+    Writes go to a delta log: ``_pending`` holds the documents (re)indexed
+    since the arrays were last rebuilt, by value, and ``_stale`` every
+    document written since, whose array entry (if any) is out of date.
+    The log is merged into the arrays once it holds ``delta_size``
+    documents, or an eighth of the arrays' size if that is larger, so
+    indexing many documents costs a logarithmic number of rebuilds.
+
+    Docids are random 31 bit integers, so values by docid stay in the
+    reverse index BTree rather than in an array.
+    """
+    delta_size = 1000
+
+    def clear(self):
+        super(DateIndex, self).clear()
+        self._order = _DateOrder()
+        self._pending = self.family.IO.BTree()
+        self._stale = self.family.IF.TreeSet()
+
+    def index_doc(self, docid, value):
+        old = self._rev_index.get(docid, _marker)
+        super(DateIndex, self).index_doc(docid, value)
+        if value != old:
+            self._stale.insert(docid)
+            docids = self._pending.get(value)
+            if docids is None:
+                docids = self._pending[value] = self.family.IF.TreeSet()
+            docids.insert(docid)
+            self._maybe_merge()
+
+    def unindex_doc(self, docid):
+        old = self._rev_index.get(docid, _marker)
+        super(DateIndex, self).unindex_doc(docid)
+        self._forget(docid, old)
+
+    def _forget(self, docid, old):
+        if old is _marker:
+            return
+        self._stale.insert(docid)
+        docids = self._pending.get(old)
+        if docids is not None and docid in docids:
+            docids.remove(docid)
+            if not docids:
+                del self._pending[old]
+        self._maybe_merge()
+
+    def _maybe_merge(self):
+        if len(self._stale) >= max(self.delta_size, len(self._order) / 8):
+            self.merge()
+
+    def merge(self):
+        """ Fold the delta log into the sorted arrays. """
+        values = array('i')
+        docids = array('i')
+        for value, docid in self._ordered():
+            values.append(value)
+            docids.append(docid)
+        self._order = _DateOrder(values, docids)
+        self._pending.clear()
+        self._stale.clear()
+
+    def _ordered(self, reverse=False):
+        # Yield (value, docid) for every document, merging the arrays
+        # with the delta log.  Reversed order is produced by negating
+        # the keys, as heapq.merge only merges ascending sequences.
+        sign = reverse and -1 or 1
+        stale = self._stale
+        def current(values=self._order.values, docids=self._order.docids):
+            if reverse:
+                positions = xrange(len(docids) - 1, -1, -1)
+            else:
+                positions = xrange(len(docids))
+            for i in positions:
+                docid = docids[i]
+                if docid not in stale:
+                    yield sign * values[i], sign * docid
+        recent = [(sign * value, sign * docid)
+                  for value, docids in self._pending.items()
+                  for docid in docids]
+        if reverse:
+            recent.reverse()
+        for value, docid in heapq.merge(current(), recent):
+            yield sign * value, sign * docid
+
+    def presorted(self, reverse=False):
+        """ Yield every indexed docid in date order. """
+        for value, docid in self._ordered(reverse):
+            yield docid
+
+    def range(self, start=None, end=None, excludemin=False,
+              excludemax=False):
+        """ Return the docids whose value lies between ``start`` and
+        ``end`` (either of which may be None for an open range).
+        """
+        IF = self.family.IF
+        values = self._order.values
+        if start is None:
+            lo = 0
+        elif excludemin:
+            lo = bisect_right(values, start)
+        else:
+            lo = bisect_left(values, start)
+        if end is None:
+            hi = len(values)
+        elif excludemax:
+            hi = bisect_left(values, end)
+        else:
+            hi = bisect_right(values, end)
+        result = IF.multiunion(self._order.docids[lo:hi])
+        if self._stale:
+            result = IF.difference(result, self._stale)
+        recent = list(self._pending.values(
+            start, end, excludemin=excludemin, excludemax=excludemax))
+        if recent:
+            result = IF.multiunion([result] + recent)
+        return result
+
+class CatalogDateIndex(CatalogFieldIndex, DateIndex):
+    """ A CatalogFieldIndex for dates, answering range queries from its
+    sorted arrays and sorting by scanning them when that is cheaper than
+    sorting the result set.
+    """
+    implements(ICatalogIndex)
+
+    # the index classes copy_from can convert
+    replaces = (CatalogFieldIndex,)
+
+    def unindex_doc(self, docid):
+        # CatalogFieldIndex.unindex_doc doesn't call the base class
+        old = self._rev_index.get(docid, _marker)
+        super(CatalogDateIndex, self).unindex_doc(docid)
+        self._forget(docid, old)
+
+    def search(self, queries, operator='or'):
+        IF = self.family.IF
+        sets = []
+        for query in queries:
+            if isinstance(query, RangeValue):
+                sets.append(self.range(*query.as_tuple()))
+            else:
+                sets.append(self._fwd_index.get(query, IF.Set()))
+        if len(sets) == 1:
+            return sets[0]
+        if operator == 'and':
+            sets.sort(key=len)
+            result = None
+            for docids in sets:
+                result = IF.intersection(docids, result)
+            return result
+        return IF.multiunion(sets)
+
+    def applyInRange(self, start, end, excludemin=False, excludemax=False):
+        return self.range(start, end, excludemin, excludemax)
+
+    def copy_from(self, index):
+        """ Index the documents of a field index of the same dates,
+        without running the discriminator again.
+        """
+        for docid, value in index._rev_index.items():
+            DateIndex.index_doc(self, docid, value)
+        self._not_indexed = self.family.IF.Set(index._not_indexed)
+        self.merge()
+
+    def sort(self, docids, reverse=False, limit=None, sort_type=None):
+        numdocs = self._num_docs.value
+        if sort_type is not None or not docids or not numdocs:
+            return super(CatalogDateIndex, self).sort(
+                docids, reverse, limit, sort_type)
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError('limit must be 1 or greater')
+        rlen = len(docids)
+        # Scanning finds ``limit`` results after about limit * numdocs /
+        # rlen entries; sorting costs a reverse index lookup per result.
+        if (limit or rlen) * float(numdocs) / rlen > rlen:
+            return super(CatalogDateIndex, self).sort(
+                docids, reverse, limit, sort_type)
+        return self._scan(docids, reverse, limit)
+
+    def _scan(self, docids, reverse, limit):
+        IF = self.family.IF
+        if not isinstance(docids, (IF.Set, IF.TreeSet)):
+            docids = IF.Set(docids)
+        n = 0
+        for docid in self.presorted(reverse):
+            if docid in docids:
+                yield docid
+                n += 1
+                if limit and n >= limit:
+                    break
+
+
+class PrefixIndex(Persistent):
+    """ An index of names (of people, titles) answering "which names
+    start with this prefix", and sorting by name.
+
+    With ``words``, a name matches a prefix of any of its words; querying
+    several prefixes matches names with a word starting with each.
+    Otherwise only the whole name is matched.  Names are compared lower
+    case, with runs of whitespace collapsed.
+    """
+    family = BTrees.family32
+
+    def __init__(self, words=False, family=None):
+        if family is not None:
+            self.family = family
+        self.words = words
+        self.clear()
+
+    def clear(self):
+        # term -> docids
+        self._terms = self.family.OO.BTree()
+        # docid -> name
+        self._rev_index = self.family.IO.BTree()
+        # (name, docid), in name order
+        self._sorted = self.family.OO.TreeSet()
+        self._num_docs = Length(0)
+
+    def documentCount(self):
+        """Return the number of documents in the index."""
+        return self._num_docs()
+
+    def has_doc(self, docid):
+        return docid in self._rev_index
+
+    def _indexed(self):
+        return self._rev_index.keys()
+
+    def normalize(self, name):
+        if isinstance(name, str):
+            name = name.decode('utf-8', 'replace')
+        return u' '.join(name.lower().split())
+
+    def _split(self, name):
+        if self.words:
+            return set(_WORD.findall(name))
+        return [name]
+
+    def index_doc(self, docid, name):
+        if not isinstance(name, basestring):
+            raise TypeError('name must be a string')
+        name = self.normalize(name)
+        old = self._rev_index.get(docid)
+        if old == name:
+            return
+        if old is not None:
+            self.unindex_doc(docid)
+        if not name:
+            return
+        for term in self._split(name):
+            docids = self._terms.get(term)
+            if docids is None:
+                docids = self._terms[term] = self.family.IF.TreeSet()
+            docids.insert(docid)
+        self._rev_index[docid] = name
+        self._sorted.insert((name, docid))
+        self._num_docs.change(1)
+
+    def unindex_doc(self, docid):
+        name = self._rev_index.get(docid)
+        if name is None:
+            return
+        for term in self._split(name):
+            docids = self._terms[term]
+            docids.remove(docid)
+            if not docids:
+                del self._terms[term]
+        del self._rev_index[docid]
+        self._sorted.remove((name, docid))
+        self._num_docs.change(-1)
+
+    def search(self, prefixes, operator='and'):
+        """ Return the docids of the names starting with each (with
+        operator 'and') or any (with 'or') of ``prefixes``.
+        """
+        IF = self.family.IF
+        if not prefixes:
+            return IF.Set(self._rev_index.keys())
+        sets = []
+        for prefix in prefixes:
+            terms = self._terms.values(prefix, prefix + u'\uffff')
+            sets.append(IF.multiunion(list(terms)))
+        if operator == 'or':
+            return IF.multiunion(sets)
+        if operator != 'and':
+            raise TypeError('Prefix index only supports `and` and `or` '
+                            'operators, not `%s`.' % operator)
+        sets.sort(key=len)
+        result = None
+        for docids in sets:
+            result = IF.intersection(result, docids)
+            if not result:
+                break
+        return result
+
+    def apply(self, query):
+        operator = 'and'
+        if isinstance(query, dict):
+            operator = query.get('operator', operator)
+            query = query['query']
+        if isinstance(query, basestring):
+            query = [query]
+        prefixes = []
+        for prefix in query:
+            # a trailing glob, as the text index takes, is implied
+            prefix = self.normalize(prefix).rstrip('*')
+            if self.words:
+                prefixes.extend(_WORD.findall(prefix))
+            elif prefix:
+                prefixes.append(prefix)
+        return self.search(prefixes, operator)
+
+    def sort(self, docids, reverse=False, limit=None, sort_type=None):
+        if not docids:
+            return []
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError('limit must be 1 or greater')
+        numdocs = self._num_docs()
+        rlen = len(docids)
+        # Scanning the names in order finds ``limit`` results after about
+        # limit * numdocs / rlen names.
+        if not reverse and (limit or rlen) * float(numdocs) / rlen <= rlen:
+            return self._scan(docids, limit)
+        rev_index = self._rev_index
+        names = [(rev_index[docid], docid) for docid in docids
+                 if docid in rev_index]
+        if limit:
+            if reverse:
+                names = heapq.nlargest(limit, names)
+            else:
+                names = heapq.nsmallest(limit, names)
+        else:
+            names.sort(reverse=reverse)
+        return [docid for name, docid in names]
+
+    def _scan(self, docids, limit):
+        IF = self.family.IF
+        if not isinstance(docids, (IF.Set, IF.TreeSet)):
+            docids = IF.Set(docids)
+        n = 0
+        for name, docid in self._sorted:
+            if docid in docids:
+                yield docid
+                n += 1
+                if limit and n >= limit:
+                    break
+
+class CatalogPrefixIndex(CatalogIndex, PrefixIndex):
+    """ A PrefixIndex for use in a repoze.catalog catalog.
+    """
+    implements(ICatalogIndex)
+
+    # A text index can't be converted (it doesn't keep the text), so
+    # update_indexes replaces it with an empty index to be reindexed.
+    replaces = (CatalogTextIndex,)
+
+    def __init__(self, discriminator, words=False):
+        if not callable(discriminator):
+            if not isinstance(discriminator, basestring):
+                raise ValueError('discriminator value must be callable or a '
+                                 'string')
+        self.discriminator = discriminator
+        self.words = words
+        self._not_indexed = self.family.IF.Set()
+        self.clear()
+
+    def reindex_doc(self, docid, value):
+        # index_doc replaces the document's name
+        return self.index_doc(docid, value)
+
+class ChildrenIndex(Persistent):
+    """ An index of documents by the path of their container, answering
+    "which documents are directly inside this folder" with one lookup.
+
+    The children of each container are also kept in the order of each of
+    the values named by ``sort_names`` (say, 'title'), so a listing of one
+    container's children can be read in that order instead of sorting it.
+    """
+    family = BTrees.family32
+
+    def __init__(self, sort_names=(), family=None):
+        if family is not None:
+            self.family = family
+        self.sort_names = tuple(sort_names)
+        self.clear()
+
+    def clear(self):
+        # parent path -> docids
+        self._children = self.family.OO.BTree()
+        # parent path -> number of docids
+        self._counts = self.family.OI.BTree()
+        # docid -> (parent path,) + sort values
+        self._rev_index = self.family.IO.BTree()
+        # sort name -> parent path -> (value, docid), in value order
+        self._ordered = self.family.OO.BTree()
+        for name in self.sort_names:
+            self._ordered[name] = self.family.OO.BTree()
+        self._num_docs = Length(0)
+
+    def documentCount(self):
+        """Return the number of documents in the index."""
+        return self._num_docs()
+
+    def has_doc(self, docid):
+        return docid in self._rev_index
+
+    def _indexed(self):
+        return self._rev_index.keys()
+
+    def index_doc(self, docid, parent, values=None):
+        """ Index ``docid`` as a child of the container at path
+        ``parent``, with ``values`` the document's values for each of
+        the sort names.
+        """
+        if not isinstance(parent, basestring):
+            raise TypeError('parent must be a path')
+        if values is None:
+            values = (None,) * len(self.sort_names)
+        values = tuple(values)
+        if len(values) != len(self.sort_names):
+            raise ValueError('expected a value for each of %s' %
+                             ', '.join(self.sort_names))
+        entry = (parent,) + values
+        old = self._rev_index.get(docid)
+        if old == entry:
+            return
+        if old is not None:
+            self.unindex_doc(docid)
+        docids = self._children.get(parent)
+        if docids is None:
+            docids = self._children[parent] = self.family.IF.TreeSet()
+        docids.insert(docid)
+        self._counts[parent] = self._counts.get(parent, 0) + 1
+        for name, value in zip(self.sort_names, values):
+            ordered = self._ordered[name]
+            children = ordered.get(parent)
+            if children is None:
+                children = ordered[parent] = self.family.OO.TreeSet()
+            children.insert((value, docid))
+        self._rev_index[docid] = entry
+        self._num_docs.change(1)
+
+    def unindex_doc(self, docid):
+        entry = self._rev_index.get(docid)
+        if entry is None:
+            return
+        parent, values = entry[0], entry[1:]
+        docids = self._children[parent]
+        docids.remove(docid)
+        if not docids:
+            del self._children[parent]
+            del self._counts[parent]
+        else:
+            self._counts[parent] -= 1
+        for name, value in zip(self.sort_names, values):
+            ordered = self._ordered[name]
+            children = ordered[parent]
+            children.remove((value, docid))
+            if not children:
+                del ordered[parent]
+        del self._rev_index[docid]
+        self._num_docs.change(-1)
+
+    def child_count(self, parent):
+        """ Return the number of children of ``parent``.
+        """
+        return self._counts.get(parent, 0)
+
+    def search(self, parents):
+        """ Return the docids of the children of any of ``parents``.
+        """
+        IF = self.family.IF
+        sets = [self._children.get(parent) for parent in parents]
+        return IF.multiunion([docids for docids in sets if docids])
+
+    def apply(self, query):
+        operator = 'or'
+        if isinstance(query, dict):
+            operator = query.get('operator', operator)
+            query = query['query']
+        if operator != 'or':
+            raise TypeError('Children index only supports the `or` '
+                            'operator, not `%s`.' % operator)
+        if isinstance(query, basestring):
+            query = [query]
+        return self.search(query)
+
+    def sorted_children(self, parent, sort_name, docids=None,
+                        reverse=False, limit=None):
+        """ Iterate over the children of ``parent`` in the order of the
+        values called ``sort_name``, keeping only those in ``docids`` if
+        it is given.
+        """
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError('limit must be 1 or greater')
+        children = self._ordered[sort_name].get(parent, ())
+        if reverse:
+            # TreeSets can't be iterated backwards
+            children = reversed(list(children))
+        IF = self.family.IF
+        if docids is not None and not isinstance(docids, (IF.Set,
+                                                           IF.TreeSet)):
+            docids = IF.Set(docids)
+        n = 0
+        for value, docid in children:
+            if docids is None or docid in docids:
+                yield docid
+                n += 1
+                if limit and n >= limit:
+                    break
+
+class CatalogChildrenIndex(CatalogIndex, ChildrenIndex):
+    """ A ChildrenIndex for use in a repoze.catalog catalog.
+
+    The discriminator gives the path of a document's container;
+    ``sort_discriminators`` maps each sort name to the discriminator of
+    the value the children are ordered by (use the discriminator of the
+    sort index of the same name, so the order matches).
+    """
+    implements(ICatalogIndex)
+
+    def __init__(self, discriminator, sort_discriminators=None):
+        if not callable(discriminator):
+            if not isinstance(discriminator, basestring):
+                raise ValueError('discriminator value must be callable or a '
+                                 'string')
+        self.discriminator = discriminator
+        items = sorted((sort_discriminators or {}).items())
+        self.sort_names = tuple([name for name, d in items])
+        self.sort_discriminators = tuple([d for name, d in items])
+        self._not_indexed = self.family.IF.Set()
+        self.clear()
+
+    def _discriminate(self, discriminator, object):
+        if callable(discriminator):
+            return discriminator(object, _marker)
+        return getattr(object, discriminator, _marker)
+
+    def index_doc(self, docid, object):
+        parent = self._discriminate(self.discriminator, object)
+        if parent is _marker:
+            ChildrenIndex.unindex_doc(self, docid)
+            self._not_indexed.add(docid)
+            return None
+        if docid in self._not_indexed:
+            self._not_indexed.remove(docid)
+        values = []
+        for discriminator in self.sort_discriminators:
+            value = self._discriminate(discriminator, object)
+            if value is _marker:
+                value = None
+            values.append(value)
+        return ChildrenIndex.index_doc(self, docid, parent, values)
+
+    def reindex_doc(self, docid, object):
+        # index_doc replaces the document's entry
+        return self.index_doc(docid, object)
+
+    def applyEq(self, value):
+        return self.apply(value)
+
+    def applyAny(self, values):
+        return self.apply({'query': values, 'operator': 'or'})
+
+class CatalogRankedTextIndex(CatalogTextIndex):
+    """ A text index which can find the documents most relevant to a
+    query without scoring every document matching it.
+
+    For each word and block of docids, the index keeps the highest count
+    of the word in a document of the block and the shortest document of
+    the block, which bound the (Okapi BM25) score of the word in any
+    document of the block.  ``rank`` scores the blocks with the highest
+    bounds first, and stops as soon as no block left can beat the
+    ``limit`` best documents found so far.
+
+    Removing a document doesn't lower the bounds: they stay true, if
+    looser, until the index is rebuilt.
+    """
+    # takes over the lexicon and documents of a plain text index
+    replaces = (CatalogTextIndex,)
+
+    def clear(self):
+        CatalogTextIndex.clear(self)
+        # wid -> block -> (highest word count, shortest document length)
+        self._bounds = self.family.IO.BTree()
+
+    def index_doc(self, docid, object):
+        result = CatalogTextIndex.index_doc(self, docid, object)
+        self._raise_bounds(docid)
+        return result
+
+    def _raise_bounds(self, docid):
+        index = self.index
+        if docid not in index._docwords:
+            return
+        doclen = index._docweight[docid]
+        block = docid >> BLOCK_SHIFT
+        counts = {}
+        for wid in index.get_words(docid):
+            counts[wid] = counts.get(wid, 0) + 1
+        for wid, count in counts.items():
+            blocks = self._bounds.get(wid)
+            if blocks is None:
+                blocks = self._bounds[wid] = self.family.IO.BTree()
+            old = blocks.get(block)
+            if old is None:
+                new = (count, doclen)
+            else:
+                new = (max(old[0], count), min(old[1], doclen))
+            if new != old:
+                blocks[block] = new
+
+    def copy_from(self, index):
+        self.lexicon = index.lexicon
+        self.index = index.index
+        self._not_indexed = index._not_indexed
+        self._bounds = self.family.IO.BTree()
+        docweight = self.index._docweight
+        for wid, postings in self.index._wordinfo.items():
+            bounds = {}
+            for docid, count in postings.items():
+                block = docid >> BLOCK_SHIFT
+                doclen = docweight[docid]
+                old = bounds.get(block)
+                if old is not None:
+                    count = max(old[0], count)
+                    doclen = min(old[1], doclen)
+                bounds[block] = (count, doclen)
+            self._bounds[wid] = self.family.IO.BTree(bounds)
+
+    def _parse(self, query):
+        """ Return the operator and the wids of each word of a query made
+        of plain words, or None for any other query.
+        """
+        tree = QueryParser(self.lexicon).parseQuery(query)
+        kind = tree.nodeType()
+        if kind == 'ATOM':
+            operator, nodes = 'AND', [tree]
+        elif kind in ('AND', 'OR'):
+            operator, nodes = kind, tree.getValue()
+        else:
+            return None
+        terms = []
+        for node in nodes:
+            if node.nodeType() != 'ATOM':
+                return None
+            wids = self.lexicon.termToWordIds(node.getValue())
+            # a stop word has no wids, and matches everything
+            if wids:
+                terms.append(self.index._remove_oov_wids(wids))
+        if not terms:
+            return None
+        return operator, terms
+
+    def candidates(self, query):
+        """ Return the docids matching ``query`` without scoring them, if
+        ``rank`` can score them, or else the scored result of ``apply``.
+        """
+        parsed = self._parse(query)
+        if parsed is None:
+            return self.apply(query)
+        operator, terms = parsed
+        IF = self.family.IF
+        wordinfo = self.index._wordinfo
+        sets = [IF.multiunion([IF.Set(wordinfo[wid].keys()) for wid in wids])
+                for wids in terms]
+        if operator == 'OR':
+            return IF.multiunion(sets)
+        sets.sort(key=len)
+        result = None
+        for docids in sets:
+            result = IF.intersection(result, docids)
+            if not result:
+                break
+        return result
+
+    def rank(self, query, docids, limit=None):
+        """ Return the ``limit`` docids of ``docids`` most relevant to
+        ``query``, most relevant first.
+
+        ``docids`` are those returned by ``candidates`` (narrowed down by
+        other indexes); scored docids are sorted by their scores.
+        """
+        if hasattr(docids, 'items'):
+            return self.sort(docids, limit=limit)
+        if not docids:
+            return []
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError('limit must be 1 or greater')
+        parsed = self._parse(query)
+        if parsed is None:
+            return self.sort(docids, limit=limit)
+        terms = parsed[1]
+        index = self.index
+        wordinfo = index._wordinfo
+        docweight = index._docweight
+        N = float(index.documentCount())
+        try:
+            meandoclen = index._totaldoclen() / N
+        except TypeError: # older indexes keep an int
+            meandoclen = index._totaldoclen / N
+        K1 = index.K1
+        B = index.B
+        def tf(count, doclen):
+            # as OkapiIndex._search_wids
+            return count * (K1 + 1.0) / (
+                count + K1 * (1.0 - B + B * doclen / meandoclen))
+        words = []
+        for wid in set([wid for wids in terms for wid in wids]):
+            postings = wordinfo[wid]
+            idf = inverse_doc_frequency(len(postings), N)
+            bounds = dict(self._bounds.get(wid, {}).items())
+            words.append((idf, postings, bounds))
+
+        blocks = {}
+        for docid in docids:
+            blocks.setdefault(docid >> BLOCK_SHIFT, []).append(docid)
+        ordered = []
+        for block, members in blocks.items():
+            bound = 0.0
+            for idf, postings, bounds in words:
+                counts = bounds.get(block)
+                if counts is not None:
+                    bound += idf * tf(*counts)
+            ordered.append((bound, block))
+        ordered.sort(reverse=True)
+
+        best = [] # a heap of the (score, docid) of the best docids yet
+        for bound, block in ordered:
+            if limit and len(best) == limit and bound < best[0][0]:
+                break
+            for docid in blocks[block]:
+                doclen = docweight[docid]
+                score = 0.0
+                for idf, postings, bounds in words:
+                    count = postings.get(docid)
+                    if count:
+                        score += idf * tf(count, doclen)
+                item = (score, docid)
+                if not limit or len(best) < limit:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+        best.sort(reverse=True)
+        return [docid for score, docid in best]
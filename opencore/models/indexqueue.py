@@ -0,0 +1,146 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""Deferred catalog indexing.
+
+When the ``deferred_indexing`` setting is true, the content subscribers
+only record which documents need (re|un)indexing in an ``IndexingQueue``
+kept on the catalog, and the ``indexer`` script applies the queued
+operations in the background.  Searches which must see the current
+request's own changes pass ``consistent=True`` to ``ICatalogSearch``;
+this only covers operations queued by the same transaction.
+"""
+
+from itertools import islice
+from weakref import WeakKeyDictionary
+
+import transaction
+from persistent import Persistent
+from BTrees.IIBTree import IIBTree
+
+from repoze.bfg.settings import asbool
+from repoze.bfg.traversal import find_model
+
+from opencore.utils import find_catalog
+from opencore.utils import find_site
+from opencore.utils import get_setting
+
+INDEX = 1
+UNINDEX = 2
+
+# The docids each running transaction has queued, so that a consistent
+# search only applies the operations of its own transaction.
+_queued = WeakKeyDictionary()
+
+def queued_docids():
+    """ Return the set of docids queued by the current transaction.
+    """
+    return _queued.setdefault(transaction.get(), set())
+
+class IndexingQueue(Persistent):
+    """ The catalog operations waiting to be applied, by docid.
+
+    Only the latest operation on a document matters, so queueing an
+    operation replaces any earlier one for the same docid.  Entries live
+    in an IIBTree, whose conflict resolution merges concurrent
+    transactions queueing different documents.
+    """
+    def __init__(self):
+        self._ops = IIBTree()
+
+    def index(self, docid):
+        self._ops[docid] = INDEX
+        queued_docids().add(docid)
+
+    def unindex(self, docid):
+        self._ops[docid] = UNINDEX
+        queued_docids().add(docid)
+
+    def pop(self, limit=None):
+        """ Remove and return up to ``limit`` (docid, operation) pairs.
+        """
+        items = list(islice(self._ops.items(), limit))
+        for docid, op in items:
+            del self._ops[docid]
+        return items
+
+    def pop_docids(self, docids):
+        """ Remove and return the (docid, operation) pairs queued for
+        ``docids``.
+        """
+        items = []
+        for docid in sorted(docids):
+            op = self._ops.get(docid)
+            if op is not None:
+                del self._ops[docid]
+                items.append((docid, op))
+        return items
+
+    def __len__(self):
+        return len(self._ops)
+
+    def __nonzero__(self):
+        return bool(self._ops)
+
+def find_indexing_queue(context, create=False):
+    """ Return the site's indexing queue, or None if it has none.
+
+    With ``create``, return None unless deferred indexing is enabled, and
+    add the queue if it doesn't exist yet.
+    """
+    catalog = find_catalog(context)
+    if catalog is None:
+        return None
+    queue = getattr(catalog, 'indexing_queue', None)
+    if create:
+        if not asbool(get_setting(context, 'deferred_indexing', False)):
+            return None
+        if queue is None:
+            queue = catalog.indexing_queue = IndexingQueue()
+    return queue
+
+def process_indexing_queue(context, limit=None, docids=None):
+    """ Apply up to ``limit`` queued operations to the catalog.
+
+    With ``docids``, apply only the operations queued for those documents.
+    Returns the number of operations applied.  Documents which have been
+    removed since they were queued are skipped.
+    """
+    queue = find_indexing_queue(context)
+    if queue is None:
+        return 0
+    site = find_site(context)
+    catalog = site.catalog
+    if docids is None:
+        items = queue.pop(limit)
+    else:
+        items = queue.pop_docids(docids)
+    for docid, op in items:
+        if op == UNINDEX:
+            catalog.unindex_doc(docid)
+            continue
+        path = catalog.document_map.address_for_docid(docid)
+        if path is None:
+            continue
+        try:
+            model = find_model(site, path)
+        except KeyError:
+            continue
+        catalog.reindex_doc(docid, model)
+    return len(items)
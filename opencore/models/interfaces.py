@@ -319,7 +319,6 @@ class ITagQuery(Interface):
 
 class ICatalogSearchCache(Interface):
     """ Utility which provides a cache for catalog searches """
-    generation = Attribute('The current cache generation number')
     def clear():
         """ Clears the cache """
     def get(key, default=None):
@@ -327,12 +326,32 @@ class ICatalogSearchCache(Interface):
     def __setitem__(key, val):
         """ Set the key to val """
 
+class ISharedCatalogSearchCache(ICatalogSearchCache):
+    """ A catalog search cache shared between processes.
+
+    Entries are versioned by the index generations stored in them (see
+    ``CachingCatalog``), so a write in one process doesn't clear the
+    entries other processes are using.
+    """
+    hits = Attribute('Number of lookups answered from the cache')
+    misses = Attribute('Number of lookups not found in the cache')
+
+    def put(key, val):
+        """ Store ``val`` under ``key`` """
+
 class ICatalogQueryEvent(Interface):
     """Notification that a catalog was queried"""
     catalog = Attribute('The catalog that was queried')
     query = Attribute('Keyword parameters passed in the query')
     duration = Attribute('How long the query took, in seconds')
     result = Attribute('The result of the query: (result_count, [docid])')
+    plan = Attribute('The (index name, estimated result size) pairs in the '
+                     'order the planner applied the indexes, or None')
+    timings = Attribute('(index name, seconds, result size) for each index '
+                        'applied, in order')
+    sort_time = Attribute('Seconds spent sorting, or None if not sorted')
+    cached = Attribute('True if answered from the search cache, False if '
+                       'the cache missed, None if the cache was not used')
 
 class IUserAdded(Interface):
     """ Event interface for having a new user added to the system.
@@ -0,0 +1,273 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""Catalog query profiler.
+
+``profile_query`` listens to ``ICatalogQueryEvent`` and keeps latency
+histograms per query shape: the query with its values replaced by
+placeholders, so that every search for, say, a community's recent blog
+entries lands in the same bucket whatever the community.  It is enabled
+by the ``query_profile`` setting.  If ``query_profile_dir`` is set, a
+background thread writes each process' profile there as JSON every
+``query_profile_flush_interval`` seconds.
+"""
+
+from __future__ import with_statement
+
+import logging
+import os
+import threading
+import time
+
+from simplejson import dumps
+from zope.component import queryUtility
+
+from repoze.bfg.interfaces import ISettings
+from repoze.bfg.settings import asbool
+
+log = logging.getLogger(__name__)
+
+# query parameters whose values are part of the shape
+_LITERAL_PARAMETERS = ('sort_index', 'reverse', 'sort_type')
+
+def query_shape(query):
+    """ Return a string identifying the shape of a catalog query.
+    """
+    parts = []
+    for name, value in sorted(query.items()):
+        if name in _LITERAL_PARAMETERS:
+            shape = repr(value)
+        elif isinstance(value, dict):
+            keys = []
+            for key, item in sorted(value.items()):
+                if key == 'operator':
+                    keys.append('operator=%s' % item)
+                else:
+                    keys.append(key)
+            shape = '{%s}' % ','.join(keys)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            shape = '[?]'
+        else:
+            shape = '?'
+        parts.append('%s=%s' % (name, shape))
+    return ' '.join(parts)
+
+class Histogram(object):
+    """ A histogram of non-negative integers with bounded relative error.
+
+    Like an HDR histogram, values below ``2**precision`` get a bucket each
+    and larger values share buckets ``2**(n - precision)`` wide between
+    ``2**n`` and ``2**(n+1)``, so percentiles are accurate to within
+    ``2**-precision`` of the value while the number of buckets grows only
+    with the logarithm of the largest value.
+    """
+    def __init__(self, precision=5):
+        self.precision = precision
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        value = int(value)
+        shift = _bit_length(value) - self.precision
+        if shift > 0:
+            bucket = value >> shift << shift
+        else:
+            bucket = value
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """ Return the value ``percent`` percent of the values are at or
+        below, to within the histogram's precision.
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(round(self.count * percent / 100.0)))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(max(bucket, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / float(self.count),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            }
+
+def _bit_length(value):
+    length = 0
+    while value:
+        value >>= 1
+        length += 1
+    return length
+
+def _microseconds(seconds):
+    return int(seconds * 1000000)
+
+class QueryShapeProfile(object):
+    """ What the profiler knows about one query shape.  Times are in
+    microseconds.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.duration = Histogram()
+        self.results = Histogram()
+        self.sort = Histogram()
+        self.apply = {}
+        self.sizes = {}
+
+    def record(self, event):
+        self.duration.record(_microseconds(event.duration))
+        self.results.record(event.result[0])
+        if event.cached:
+            self.hits += 1
+            return
+        if event.cached is not None:
+            self.misses += 1
+        if event.sort_time is not None:
+            self.sort.record(_microseconds(event.sort_time))
+        for name, duration, size in event.timings:
+            apply = self.apply.get(name)
+            if apply is None:
+                apply = self.apply[name] = Histogram()
+                self.sizes[name] = Histogram()
+            apply.record(_microseconds(duration))
+            self.sizes[name].record(size)
+
+    def summary(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'duration_us': self.duration.summary(),
+            'results': self.results.summary(),
+            'sort_us': self.sort.summary(),
+            'indexes': dict(
+                (name, {'apply_us': self.apply[name].summary(),
+                        'size': self.sizes[name].summary()})
+                for name in self.apply),
+            }
+
+class QueryProfiler(object):
+    """ Event listener profiling ICatalogQueryEvents by query shape.
+    """
+    def __init__(self):
+        self._configured = False
+        self.enabled = False
+        self.flush_dir = None
+        self.flush_interval = 60.0
+        self._lock = threading.Lock()
+        self._shapes = {}
+        self._started = time.time()
+        self._flusher_pid = None
+
+    def configure(self, settings):
+        self.enabled = asbool(getattr(settings, 'query_profile', False))
+        self.flush_dir = getattr(settings, 'query_profile_dir', None)
+        if self.flush_dir and not os.path.exists(self.flush_dir):
+            os.makedirs(self.flush_dir)
+        self.flush_interval = float(
+            getattr(settings, 'query_profile_flush_interval', 60.0))
+        self._configured = True
+
+    def is_enabled(self):
+        """ Return whether profiling is on, reading the settings if they
+        haven't been yet.
+        """
+        if not self._configured:
+            settings = queryUtility(ISettings)
+            if settings is not None:
+                self.configure(settings)
+        return self.enabled
+
+    def __call__(self, event):
+        if not self.is_enabled():
+            return
+        shape = query_shape(event.query)
+        with self._lock:
+            profile = self._shapes.get(shape)
+            if profile is None:
+                profile = self._shapes[shape] = QueryShapeProfile()
+            profile.record(event)
+        if self.flush_dir and self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def snapshot(self):
+        """ Return the profile of every query shape seen so far, as a
+        dictionary which can be serialized as JSON.
+        """
+        with self._lock:
+            shapes = dict((shape, profile.summary())
+                          for shape, profile in self._shapes.items())
+        return {'pid': os.getpid(),
+                'since': self._started,
+                'shapes': shapes}
+
+    def reset(self):
+        with self._lock:
+            self._shapes = {}
+            self._started = time.time()
+
+    def flush(self):
+        """ Write the snapshot to this process' file in ``flush_dir``.
+        """
+        path = os.path.join(self.flush_dir,
+                            'query-profile-%d.json' % os.getpid())
+        tmp = path + '.tmp'
+        f = open(tmp, 'w')
+        try:
+            f.write(dumps(self.snapshot()))
+        finally:
+            f.close()
+        os.rename(tmp, path)
+
+    def _start_flusher(self):
+        # One flushing thread per process; a forked child starts its own.
+        self._flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._flush_forever,
+                                  name='query-profile-flusher')
+        thread.setDaemon(True)
+        thread.start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                log.warn('Failed to write the query profile', exc_info=True)
+
+profile_query = QueryProfiler()
@@ -0,0 +1,179 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""Catalog search cache shared by all worker processes on a host.
+
+To use it, override the ``ICatalogSearchCache`` utility in the
+application's ZCML::
+
+  <utility
+    provides="opencore.models.interfaces.ICatalogSearchCache"
+    component="opencore.models.searchcache.shared_cache"
+  />
+
+and point the ``catalog_cache_file`` setting at a file writable by every
+worker.  Each site needs its own file.
+"""
+
+import cPickle
+import logging
+import os
+import sqlite3
+import threading
+
+from zope.component import queryUtility
+from zope.interface import implements
+
+from repoze.bfg.interfaces import ISettings
+
+from opencore.models.interfaces import ISharedCatalogSearchCache
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_results (
+    key BLOB NOT NULL PRIMARY KEY,
+    value BLOB NOT NULL
+)
+"""
+
+class SQLiteSearchCache(object):
+    """ An ICatalogSearchCache stored in a local SQLite database.
+
+    Each entry records the generations of the indexes its search used,
+    and the catalog ignores entries whose generations are out of date, so
+    a write in any process doesn't have to clear the entries other
+    processes are using.  A stale entry is replaced by the next search
+    with the same key.  Every ``prune_interval`` puts, the cache is
+    trimmed to the ``maxsize`` most recently stored entries.
+
+    Any database error is logged and treated as a cache miss: the cache
+    must never make a search fail.
+    """
+    implements(ISharedCatalogSearchCache)
+
+    sqlite3 = sqlite3 # for unit tests
+
+    def __init__(self, path=None, maxsize=10000, prune_interval=100,
+                 timeout=1.0):
+        self._configured = path is not None
+        self.path = path
+        self.maxsize = maxsize
+        self.prune_interval = prune_interval
+        self.timeout = timeout
+        self._local = threading.local()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, settings):
+        self.path = getattr(settings, 'catalog_cache_file', None)
+        self.maxsize = int(
+            getattr(settings, 'catalog_cache_size', self.maxsize))
+        if not self.path:
+            log.warn('catalog_cache_file is not set; '
+                     'shared catalog search cache disabled')
+        self._configured = True
+
+    def _connect(self):
+        if not self._configured:
+            settings = queryUtility(ISettings)
+            if settings is not None:
+                self.configure(settings)
+        if not self.path:
+            return None
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, 'pid', None) != pid:
+            # Connections must not be shared across a fork.
+            conn = self.sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(_SCHEMA)
+            conn.commit()
+            local.conn = conn
+            local.pid = pid
+        return local.conn
+
+    def get(self, key, default=None):
+        try:
+            conn = self._connect()
+            if conn is None:
+                row = None
+            else:
+                row = conn.execute(
+                    'SELECT value FROM search_results WHERE key = ?',
+                    (self.sqlite3.Binary(key),)).fetchone()
+        except self.sqlite3.Error:
+            log.warn('Catalog search cache read failed', exc_info=True)
+            row = None
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return cPickle.loads(str(row[0]))
+
+    def put(self, key, val):
+        try:
+            conn = self._connect()
+            if conn is None:
+                return
+            value = cPickle.dumps(val, cPickle.HIGHEST_PROTOCOL)
+            # replacing a row gives it a new rowid, so _prune keeps the
+            # entries stored last
+            conn.execute(
+                'INSERT OR REPLACE INTO search_results (key, value) '
+                'VALUES (?, ?)',
+                (self.sqlite3.Binary(key), self.sqlite3.Binary(value)))
+            self._puts += 1
+            if self._puts % self.prune_interval == 0:
+                self._prune(conn)
+            conn.commit()
+        except self.sqlite3.Error:
+            log.warn('Catalog search cache write failed', exc_info=True)
+
+    __setitem__ = put
+
+    def _prune(self, conn):
+        conn.execute(
+            'DELETE FROM search_results WHERE rowid <= '
+            '(SELECT max(rowid) FROM search_results) - ?', (self.maxsize,))
+
+    def clear(self):
+        try:
+            conn = self._connect()
+            if conn is not None:
+                conn.execute('DELETE FROM search_results')
+                conn.commit()
+        except self.sqlite3.Error:
+            log.warn('Catalog search cache clear failed', exc_info=True)
+
+    def __len__(self):
+        try:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            return conn.execute(
+                'SELECT count(*) FROM search_results').fetchone()[0]
+        except self.sqlite3.Error:
+            log.warn('Catalog search cache count failed', exc_info=True)
+            return 0
+
+# the shared ICatalogSearchCache component (wire in via ZCML overrides)
+shared_cache = SQLiteSearchCache()
@@ -27,7 +27,6 @@ from repoze.bfg.security import Authenticated
 from repoze.bfg.security import principals_allowed_by_permission
 from repoze.bfg.traversal import model_path
 from repoze.catalog.indexes.field import CatalogFieldIndex
-from repoze.catalog.indexes.text import CatalogTextIndex
 from repoze.catalog.indexes.keyword import CatalogKeywordIndex
 from repoze.catalog.indexes.path2 import CatalogPathIndex2
 from repoze.catalog.document import DocumentMap
@@ -44,6 +43,11 @@ from zope.component import queryAdapter
 from zope.event import notify
 
 from opencore.models.catalog import CachingCatalog
+from opencore.models.indexes import CatalogAllowedIndex
+from opencore.models.indexes import CatalogChildrenIndex
+from opencore.models.indexes import CatalogDateIndex
+from opencore.models.indexes import CatalogPrefixIndex
+from opencore.models.indexes import CatalogRankedTextIndex
 from opencore.models.interfaces import ICommunities
 from opencore.models.interfaces import IIndexFactory
 from opencore.models.interfaces import IProfile
@@ -143,6 +147,12 @@ def get_interfaces(object, default):
 def get_path(object, default):
     return model_path(object)
 
+def get_parent_path(object, default):
+    parent = getattr(object, '__parent__', None)
+    if parent is None:
+        return default
+    return model_path(parent)
+
 def get_textrepr(object, default):
     adapter = queryAdapter(object, ITextIndexData)
     if adapter is not None:
@@ -302,15 +312,20 @@ class Site(Folder):
             'name': CatalogFieldIndex(get_name),
             'title': CatalogFieldIndex(get_title), # used as sort index
             'interfaces': CatalogKeywordIndex(get_interfaces),
-            'texts': CatalogTextIndex(get_textrepr),
+            'texts': CatalogRankedTextIndex(get_textrepr),
             'path': CatalogPathIndex2(get_path, attr_discriminator=get_acl),
-            'allowed':CatalogKeywordIndex(get_allowed_to_view),
-            'creation_date': CatalogFieldIndex(get_creation_date),
-            'modified_date': CatalogFieldIndex(get_modified_date),
-            'content_modified': CatalogFieldIndex(get_content_modified_date),
-            'start_date': CatalogFieldIndex(get_start_date),
-            'end_date': CatalogFieldIndex(get_end_date),
-            'publication_date': CatalogFieldIndex(get_publication_date),
+            'parent': CatalogChildrenIndex(get_parent_path, {
+                'title': get_title,
+                'modified_date': get_modified_date,
+                'lastfirst': get_lastfirst,
+                }),
+            'allowed':CatalogAllowedIndex(get_allowed_to_view),
+            'creation_date': CatalogDateIndex(get_creation_date),
+            'modified_date': CatalogDateIndex(get_modified_date),
+            'content_modified': CatalogDateIndex(get_content_modified_date),
+            'start_date': CatalogDateIndex(get_start_date),
+            'end_date': CatalogDateIndex(get_end_date),
+            'publication_date': CatalogDateIndex(get_publication_date),
             'mimetype': CatalogFieldIndex(get_mimetype),
             'creator': CatalogFieldIndex(get_creator),
             'modified_by': CatalogFieldIndex(get_modified_by),
@@ -318,7 +333,8 @@ class Site(Folder):
             'tags': TagIndex(self),
             'topics': TagIndex(self, add_topic),
             'lastfirst': CatalogFieldIndex(get_lastfirst),
-            'member_name': CatalogTextIndex(get_member_name),
+            'member_name': CatalogPrefixIndex(get_member_name, words=True),
+            'titlestartswith': CatalogPrefixIndex(get_title),
             'virtual':CatalogFieldIndex(get_virtual),
             }
         log.info('look up any other site indexes that have been registered.') 
@@ -333,6 +349,15 @@ class Site(Folder):
         for name, index in indexes.iteritems():
             if name not in catalog:
                 catalog[name] = index
+            elif type(catalog[name]) in getattr(index, 'replaces', ()):
+                # upgrade from the kind of index formerly used
+                log.info('converting index %s to %s' % (
+                    name, index.__class__.__name__))
+                if hasattr(index, 'copy_from'):
+                    index.copy_from(catalog[name])
+                else:
+                    log.warn('index %s is empty until it is reindexed' % name)
+                catalog[name] = index
 
         # remove indexes
         for name in catalog.keys():
@@ -0,0 +1,516 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Read-only catalog snapshots shared by all worker processes on a host.
+
+A snapshot is a file holding the docid sets of the catalog's most used
+indexes (keyword, allowed, path and date indexes) and its document map
+as flat arrays, written by the ``catalog_snapshot`` script.  Workers
+memory-map it, so they share one copy in the page cache and don't have
+to load the indexes' BTree buckets from the database after a restart.
+
+Each index in the snapshot is tagged with the index's generation: a
+search uses the snapshot for an index only as long as the index has not
+changed since, and the index itself otherwise.  Point the
+``catalog_snapshot_file`` setting at the file to use snapshots.
+"""
+
+import cPickle
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+
+import BTrees
+from zope.component import queryUtility
+
+from repoze.bfg.interfaces import ISettings
+from repoze.catalog.indexes.keyword import CatalogKeywordIndex
+from repoze.catalog.indexes.path2 import CatalogPathIndex2
+from repoze.catalog import RangeValue
+
+from opencore.models.indexes import CatalogAllowedIndex
+from opencore.models.indexes import CatalogDateIndex
+
+log = logging.getLogger(__name__)
+
+MAGIC = 'OCSNAP01'
+_TRAILER = struct.Struct('q') # offset of the header
+
+class _Writer(object):
+    """ Appends arrays to a file, returning where each one went.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+
+    def write(self, data):
+        start = self.offset
+        self.f.write(data)
+        self.offset += len(data)
+        return start
+
+    def array(self, typecode, values):
+        values = array(typecode, values)
+        return (self.write(values.tostring()), len(values))
+
+    def strings(self, strings):
+        """ Write a sequence of strings as their concatenation and an
+        array of the offsets of each one (and of the end).
+        """
+        offsets = [0]
+        parts = []
+        for s in strings:
+            if isinstance(s, unicode):
+                s = s.encode('utf-8')
+            parts.append(s)
+            offsets.append(offsets[-1] + len(s))
+        return {'data': self.write(''.join(parts)),
+                'offsets': self.array('i', offsets)}
+
+def _term_postings(index):
+    """ Yield (term, docids) for a keyword or allowed index.
+    """
+    if isinstance(index, CatalogAllowedIndex):
+        for principal in index._principal_sets.keys():
+            yield principal, index.search([principal], 'or')
+    else:
+        for term, docids in index._fwd_index.items():
+            yield term, docids
+
+def _write_terms(writer, index):
+    terms = {}
+    for term, docids in _term_postings(index):
+        terms[term] = writer.array('i', docids)
+    return {'kind': 'terms', 'terms': terms}
+
+def _write_values(writer, index):
+    pairs = sorted([(value, docid)
+                    for docid, value in index._rev_index.items()])
+    return {'kind': 'values',
+            'values': writer.array('l', [value for value, docid in pairs]),
+            'docids': writer.array('i', [docid for value, docid in pairs])}
+
+def _join_path(path):
+    path = '/'.join(path)
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    return path
+
+def _write_path(writer, index):
+    paths = sorted([(_join_path(path), docid)
+                    for path, docid in index.path_to_docid.items()])
+    parents = []
+    starts = [0]
+    children = []
+    for parent, docids in index.adjacency.items():
+        parents.append(parent)
+        children.extend(docids)
+        starts.append(len(children))
+    return {'kind': 'path',
+            'paths': writer.strings([path for path, docid in paths]),
+            'path_docids': writer.array('i', [docid for path, docid in paths]),
+            'parents': writer.array('i', parents),
+            'starts': writer.array('i', starts),
+            'children': writer.array('i', children)}
+
+def _writer_for(index):
+    if isinstance(index, CatalogPathIndex2):
+        return _write_path
+    if isinstance(index, CatalogDateIndex):
+        return _write_values
+    if isinstance(index, (CatalogAllowedIndex, CatalogKeywordIndex)):
+        return _write_terms
+    return None
+
+def write_snapshot(catalog, path, names=None):
+    """ Write a snapshot of ``catalog`` to the file ``path``.
+
+    ``names`` are the indexes to include; by default, every index of a
+    kind snapshots support.  The file is replaced atomically, so workers
+    never see a partly written snapshot.  Returns the names of the
+    indexes written.
+    """
+    if names is None:
+        names = [name for name, index in catalog.items()
+                 if _writer_for(index) is not None]
+    generations = catalog.generations or {}
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    f = open(tmp, 'wb')
+    try:
+        f.write(MAGIC)
+        writer = _Writer(f)
+        writer.offset = len(MAGIC)
+        indexes = {}
+        for name in names:
+            index = catalog[name]
+            write = _writer_for(index)
+            if write is None:
+                raise ValueError('Index %s can not be snapshotted' % name)
+            length = generations.get(name)
+            section = write(writer, index)
+            section['generation'] = length is not None and length.value or 0
+            indexes[name] = section
+        items = sorted(catalog.document_map.docid_to_address.items())
+        document_map = {
+            'docids': writer.array('i', [docid for docid, a in items]),
+            'addresses': writer.strings([a for docid, a in items]),
+            }
+        header = {
+            'oid': catalog._p_oid,
+            'generation': catalog.generation.value,
+            'byteorder': sys.byteorder,
+            'itemsizes': (array('i').itemsize, array('l').itemsize),
+            'indexes': indexes,
+            'document_map': document_map,
+            }
+        offset = writer.write(cPickle.dumps(header, cPickle.HIGHEST_PROTOCOL))
+        writer.write(_TRAILER.pack(offset))
+        f.close()
+        os.rename(tmp, path)
+    except:
+        f.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return sorted(indexes)
+
+class _ArrayView(object):
+    """ A memory-mapped array, read item by item (for bisecting) or as a
+    slice copied into an ``array``.
+    """
+    def __init__(self, buf, typecode, section):
+        self.buf = buf
+        self.typecode = typecode
+        self.start, self.length = section
+        self.itemsize = array(typecode).itemsize
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.length:
+            raise IndexError(i)
+        offset = self.start + i * self.itemsize
+        return struct.unpack_from(self.typecode, self.buf, offset)[0]
+
+    def slice(self, start, stop):
+        start = self.start + start * self.itemsize
+        stop = self.start + stop * self.itemsize
+        return array(self.typecode, self.buf[start:stop])
+
+class _StringsView(object):
+    """ Memory-mapped strings written by ``_Writer.strings``.
+    """
+    def __init__(self, buf, section):
+        self.buf = buf
+        self.data = section['data']
+        self.offsets = _ArrayView(buf, 'i', section['offsets'])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        offsets = self.offsets
+        return self.buf[self.data + offsets[i]:self.data + offsets[i + 1]]
+
+class CatalogSnapshot(object):
+    """ A snapshot file, memory-mapped.
+    """
+    family = BTrees.family32
+
+    def __init__(self, path):
+        f = open(path, 'rb')
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        if buf[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not a catalog snapshot' % path)
+        offset, = _TRAILER.unpack_from(buf, len(buf) - _TRAILER.size)
+        header = cPickle.loads(buf[offset:len(buf) - _TRAILER.size])
+        if (header['byteorder'] != sys.byteorder or
+            header['itemsizes'] != (array('i').itemsize,
+                                    array('l').itemsize)):
+            raise ValueError('%s was written on another platform' % path)
+        self.path = path
+        self.buf = buf
+        self.oid = header['oid']
+        self.generation = header['generation']
+        self.indexes = header['indexes']
+        document_map = header['document_map']
+        self._docids = _ArrayView(buf, 'i', document_map['docids'])
+        self._addresses = _StringsView(buf, document_map['addresses'])
+
+    def is_current(self, catalog, name=None):
+        """ Tell whether the snapshot holds the current state of the index
+        called ``name`` (or with no name, of the whole catalog).
+        """
+        if getattr(catalog, '_p_oid', None) != self.oid:
+            return False
+        if name is None:
+            generation = catalog.generation
+            return (generation is not None and
+                    generation.value == self.generation)
+        section = self.indexes.get(name)
+        if section is None:
+            return False
+        length = (catalog.generations or {}).get(name)
+        return (length is not None and
+                length.value == section['generation'])
+
+    def wrap(self, catalog, name, index):
+        """ Return a stand-in for ``index`` answering queries from the
+        snapshot if it is current, else ``index`` itself.
+        """
+        if self.is_current(catalog, name):
+            return SnapshotIndex(self, name, index)
+        return index
+
+    def address_for_docid(self, docid):
+        docids = self._docids
+        i = bisect_left(docids, docid)
+        if i < len(docids) and docids[i] == docid:
+            return self._addresses[i]
+        return None
+
+    def apply(self, name, query):
+        """ Apply ``query`` to the snapshot of the index called ``name``.
+
+        Returns None if the snapshot can't answer the query, in which case
+        the index has to.
+        """
+        section = self.indexes[name]
+        kind = section['kind']
+        if kind == 'terms':
+            return self._apply_terms(section, query)
+        if kind == 'values':
+            return self._apply_values(section, query)
+        return self._apply_path(section, query)
+
+    def _apply_terms(self, section, query):
+        operator = 'and'
+        if isinstance(query, dict):
+            if set(query) - set(['query', 'operator']):
+                return None
+            operator = query.get('operator', operator)
+            query = query['query']
+        if isinstance(query, basestring):
+            query = [query]
+        if not isinstance(query, (list, tuple)):
+            return None
+        if operator not in ('and', 'or'):
+            # let the index raise its error
+            return None
+        IF = self.family.IF
+        terms = section['terms']
+        sets = []
+        for term in query:
+            posting = terms.get(term)
+            if posting is None:
+                docids = ()
+            else:
+                docids = _ArrayView(self.buf, 'i', posting)
+                docids = docids.slice(0, len(docids))
+            sets.append(docids)
+        if not sets:
+            return IF.Set()
+        if operator == 'or':
+            return IF.multiunion([IF.multiunion(docids) for docids in sets])
+        sets.sort(key=len)
+        result = None
+        for docids in sets:
+            result = IF.intersection(result, IF.Set(docids))
+            if not result:
+                break
+        return result
+
+    def _apply_values(self, section, query):
+        if isinstance(query, RangeValue):
+            start, end = query.as_tuple()
+        elif isinstance(query, tuple) and len(query) == 2:
+            start, end = query
+        elif isinstance(query, (int, long)):
+            start = end = query
+        else:
+            return None
+        values = _ArrayView(self.buf, 'l', section['values'])
+        if start is None:
+            lo = 0
+        else:
+            lo = bisect_left(values, start)
+        if end is None:
+            hi = len(values)
+        else:
+            hi = bisect_right(values, end)
+        if lo >= hi:
+            return self.family.IF.Set()
+        docids = _ArrayView(self.buf, 'i', section['docids'])
+        return self.family.IF.multiunion(docids.slice(lo, hi))
+
+    def _apply_path(self, section, query):
+        if isinstance(query, (basestring, tuple, list)):
+            path, depth, include_path = query, None, False
+        else:
+            if query.get('attr_checker') is not None:
+                return None
+            path = query['query']
+            depth = query.get('depth')
+            include_path = query.get('include_path', False)
+        if not path:
+            return None # let the index raise its error
+        if isinstance(path, basestring):
+            path = tuple(path.rstrip('/').split('/'))
+        if path[0] != '':
+            return None
+        path = _join_path(path)
+
+        paths = _StringsView(self.buf, section['paths'])
+        i = bisect_left(paths, path)
+        if i == len(paths) or paths[i] != path:
+            return self.family.IF.Set()
+        root = _ArrayView(self.buf, 'i', section['path_docids'])[i]
+
+        parents = _ArrayView(self.buf, 'i', section['parents'])
+        starts = _ArrayView(self.buf, 'i', section['starts'])
+        children = _ArrayView(self.buf, 'i', section['children'])
+        found = []
+        if include_path:
+            found.append(root)
+        stack = [(root, 0)]
+        while stack:
+            docid, level = stack.pop()
+            if depth is not None and level >= depth:
+                continue
+            j = bisect_left(parents, docid)
+            if j == len(parents) or parents[j] != docid:
+                continue
+            docids = children.slice(starts[j], starts[j + 1])
+            found.extend(docids)
+            stack.extend([(child, level + 1) for child in docids])
+        return self.family.IF.multiunion(found)
+
+class SnapshotIndex(object):
+    """ Stands in for an index during a search, answering the queries it
+    can from a snapshot.
+    """
+    def __init__(self, snapshot, name, index):
+        self._snapshot = snapshot
+        self._name = name
+        self._index = index
+
+    def apply(self, query):
+        result = self._snapshot.apply(self._name, query)
+        if result is None:
+            return self._index.apply(query)
+        return result
+
+    def apply_intersect(self, query, docids):
+        result = self._snapshot.apply(self._name, query)
+        if result is None:
+            return self._index.apply_intersect(query, docids)
+        if docids is None:
+            return result
+        return self._snapshot.family.IF.intersection(result, docids)
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+class SnapshotLoader(object):
+    """ Opens the snapshot named by the ``catalog_snapshot_file``
+    setting, once per process, and reopens it when the file is replaced
+    (checking at most every ``check_interval`` seconds).
+    """
+    check_interval = 1.0
+    time = time.time # for unit tests
+
+    def __init__(self, path=None):
+        self._configured = path is not None
+        self.path = path
+        self._snapshot = None
+        self._stat = None
+        self._checked = None
+
+    def configure(self, settings):
+        self.path = getattr(settings, 'catalog_snapshot_file', None)
+        self._configured = True
+
+    def get(self, catalog):
+        """ Return the snapshot of ``catalog``, or None if there is none.
+        """
+        if not self._configured:
+            settings = queryUtility(ISettings)
+            if settings is None:
+                return None
+            self.configure(settings)
+        if not self.path:
+            return None
+        now = self.time()
+        if self._checked is None or now - self._checked >= self.check_interval:
+            self._checked = now
+            self._reload()
+        snapshot = self._snapshot
+        if snapshot is None or getattr(catalog, '_p_oid', None) != snapshot.oid:
+            return None
+        return snapshot
+
+    def _reload(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._snapshot = self._stat = None
+            return
+        stat = (st.st_ino, st.st_mtime, st.st_size)
+        if stat == self._stat:
+            return
+        self._stat = stat
+        # A snapshot being replaced is left to be closed when the last
+        # search using it lets it go.
+        try:
+            self._snapshot = CatalogSnapshot(self.path)
+        except (IOError, ValueError, EnvironmentError, cPickle.UnpicklingError):
+            log.warn('Catalog snapshot %s could not be read' % self.path,
+                     exc_info=True)
+            self._snapshot = None
+
+def address_lookup(catalog):
+    """ Return a function giving the address of a docid in ``catalog``,
+    from the snapshot if it is current.
+    """
+    lookup = catalog.document_map.address_for_docid
+    snapshot = snapshots.get(catalog)
+    if snapshot is None or not snapshot.is_current(catalog):
+        return lookup
+    def address(docid):
+        path = snapshot.address_for_docid(docid)
+        if path is None:
+            return lookup(docid)
+        return path
+    return address
+
+# the snapshot of this process
+snapshots = SnapshotLoader()
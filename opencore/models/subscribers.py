@@ -31,6 +31,7 @@ from repoze.bfg.traversal import find_interface
 from repoze.folder.interfaces import IFolder
 from repoze.lemonade.content import is_content
 
+from opencore.models.indexqueue import find_indexing_queue
 from opencore.models.interfaces import ICommunity
 from opencore.utils import find_catalog
 from opencore.utils import find_site
@@ -57,6 +58,7 @@ def index_content(obj, event):
     log.debug('index_content: obj=%s, event=%s' % (obj, event))
     catalog = find_catalog(obj)
     if catalog is not None:
+        docs = []
         for node in postorder(obj):
             if is_content(obj):
                 path = model_path(node)
@@ -65,15 +67,25 @@ def index_content(obj, event):
                     docid = node.docid = catalog.document_map.add(path)
                 else:
                     catalog.document_map.add(path, docid)
-                catalog.index_doc(docid, node)
+                docs.append((docid, node))
+        queue = find_indexing_queue(obj, create=True)
+        if queue is None:
+            catalog.index_docs(docs)
+        else:
+            for docid, node in docs:
+                queue.index(docid)
 
 def unindex_content(obj, docids):
     """ Unindex given 'docids'.
     """
     catalog = find_catalog(obj)
     if catalog is not None:
+        queue = find_indexing_queue(obj, create=True)
         for docid in docids:
-            catalog.unindex_doc(docid)
+            if queue is None:
+                catalog.unindex_doc(docid)
+            else:
+                queue.unindex(docid)
             catalog.document_map.remove_docid(docid)
 
 def cleanup_content_tags(obj, docids):
@@ -90,11 +102,28 @@ def handle_content_removed(obj, event):
     catalog = find_catalog(obj)
     if catalog is not None:
         path = model_path(obj)
-        num, docids = catalog.search(path={'query': path,
-                                           'include_path': True})
+        if find_indexing_queue(obj, create=True) is None:
+            num, docids = catalog.search(path={'query': path,
+                                               'include_path': True})
+        else:
+            # documents may still be waiting to be indexed
+            docids = _docids_under(catalog, path)
         unindex_content(obj, docids)
         cleanup_content_tags(obj, docids)
 
+def _docids_under(catalog, path):
+    # the docids of path and of everything below it, from the document map;
+    # addresses like path + '-2' sort between path and its children, so
+    # the children are read as the range of keys starting with path + '/'
+    address_to_docid = catalog.document_map.address_to_docid
+    docids = []
+    docid = address_to_docid.get(path)
+    if docid is not None:
+        docids.append(docid)
+    prefix = path.rstrip('/') + '/'
+    docids.extend(address_to_docid.values(min=prefix, max=prefix + '\xff'))
+    return docids
+
 def reindex_content(obj, event):
     """ Reindex a single piece of content (non-recursive); an
     IObjectModifed event subscriber """
@@ -102,7 +131,11 @@ def reindex_content(obj, event):
     if catalog is not None:
         path = model_path(obj)
         docid = catalog.document_map.docid_for_address(path)
-        catalog.reindex_doc(docid, obj)
+        queue = find_indexing_queue(obj, create=True)
+        if queue is None:
+            catalog.reindex_doc(docid, obj)
+        else:
+            queue.index(docid)
 
 def set_modified(obj, event):
     """ Set the modified date on a single piece of content.
@@ -145,6 +178,10 @@ def _modify_community(obj, when):
             index = catalog.get('content_modified')
             if index is not None:
                 index.index_doc(community.docid, community)
+                # only searches using content_modified are affected
+                invalidate = getattr(catalog, 'invalidate', None)
+                if invalidate is not None:
+                    invalidate(['content_modified'])
 
 def delete_community(obj, event):
     # delete the groups related to the community when a community is
@@ -218,7 +255,7 @@ class QueryLogger(object):
             settings = queryUtility(ISettings)
             if settings is not None:
                 self.configure(settings)
-        if not self.log_dir:
+        if not self.log_dir or event.cached:
             return
         t = datetime.now().isoformat()
         duration = event.duration
@@ -138,6 +138,175 @@ class TestCatalogSearch(unittest.TestCase):
         num, docids, resolver = adapter()
         self.assertEqual(resolver(123), None)
 
+    def test_consistent_processes_indexing_queue(self):
+        import transaction
+        from opencore.models.indexqueue import IndexingQueue
+        transaction.abort()
+        a = testing.DummyModel()
+        testing.registerModels({'/a':a})
+        context = testing.DummyModel()
+        context.catalog = ocoretesting.DummyCatalog({1:'/a', 2:'/b'})
+        context.catalog.indexing_queue = queue = IndexingQueue()
+        queue.index(1)
+        adapter = self._makeOne(context)
+        adapter(consistent=True)
+        self.assertEqual(context.catalog.reindexed, [a])
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(context.catalog.queries, [{}])
+
+    def test_consistent_leaves_other_transactions_operations(self):
+        import transaction
+        from opencore.models.indexqueue import INDEX
+        from opencore.models.indexqueue import IndexingQueue
+        transaction.abort()
+        a = testing.DummyModel()
+        testing.registerModels({'/a':a})
+        context = testing.DummyModel()
+        context.catalog = ocoretesting.DummyCatalog({1:'/a', 2:'/b'})
+        context.catalog.indexing_queue = queue = IndexingQueue()
+        queue._ops[2] = INDEX # queued by another, committed transaction
+        queue.index(1)
+        adapter = self._makeOne(context)
+        adapter(consistent=True)
+        self.assertEqual(context.catalog.reindexed, [a])
+        self.assertEqual(queue.pop(), [(2, INDEX)])
+
+    def test_not_consistent_leaves_indexing_queue(self):
+        from opencore.models.indexqueue import IndexingQueue
+        context = testing.DummyModel()
+        context.catalog = ocoretesting.DummyCatalog({1:'/a'})
+        context.catalog.indexing_queue = queue = IndexingQueue()
+        queue.index(1)
+        adapter = self._makeOne(context)
+        adapter()
+        self.assertEqual(context.catalog.reindexed, [])
+        self.assertEqual(len(queue), 1)
+
+    def _makeTree(self):
+        root = testing.DummyModel()
+        root['a'] = testing.DummyModel()
+        root['a']['b'] = DummyCountingModel()
+        root['a']['b']['c'] = testing.DummyModel()
+        root['a']['b']['d'] = testing.DummyModel()
+        root['e'] = testing.DummyModel()
+        return root
+
+    def test_resolve_many(self):
+        root = self._makeTree()
+        root.catalog = ocoretesting.DummyCatalog(
+            {1:'/a/b/d', 2:'/e', 3:'/a/b/c', 4:'/a/b'})
+        b = root['a']['b']
+        c, d = b['c'], b['d']
+        b.gets = 0
+        adapter = self._makeOne(root)
+        models = adapter.resolve_many([1, 2, 3, 4, 5])
+        self.assertEqual(models, [d, root['e'], c, b, None])
+        # each path was traversed from the root once, then remembered
+        self.assertEqual(b.gets, 2)
+        self.assertEqual(adapter.resolve_many([3]), [c])
+        self.assertEqual(b.gets, 2)
+
+    def test_resolve_many_missing(self):
+        from repoze.bfg.interfaces import ILogger
+        class DummyLogger:
+            def warn(self, msg):
+                self.msg = msg
+        logger = DummyLogger()
+        testing.registerUtility(logger, ILogger, 'repoze.bfg.debug')
+        root = self._makeTree()
+        root.catalog = ocoretesting.DummyCatalog({1:'/a/x', 2:'/e'})
+        adapter = self._makeOne(root)
+        models = adapter.resolve_many([1, 2])
+        self.assertEqual(models, [None, root['e']])
+        self.assertEqual(logger.msg, 'Model missing: /a/x')
+
+    def test_resolve_many_prefetch(self):
+        root = self._makeTree()
+        jar = DummyJar()
+        root['e']._p_jar = jar
+        root.catalog = ocoretesting.DummyCatalog({1:'/e', 2:'/a'})
+        adapter = self._makeOne(root)
+        adapter.resolve_many([1, 2], prefetch=True)
+        self.assertEqual(jar.prefetched, [[root['e']]])
+
+    def _makeFacetCatalog(self, *maps):
+        from repoze.catalog.indexes.field import CatalogFieldIndex
+        from repoze.catalog.indexes.keyword import CatalogKeywordIndex
+        from opencore.utils import coarse_datetime_repr
+        import datetime
+        catalog = ocoretesting.DummyCatalog(*maps)
+        catalog['creator'] = CatalogFieldIndex('creator')
+        catalog['interfaces'] = CatalogKeywordIndex('interfaces')
+        catalog['creation_date'] = CatalogFieldIndex('creation_date')
+        docs = [
+            (1, 'phred', ['a', 'b'], datetime.datetime(2009, 5, 1)),
+            (2, 'phred', ['a'], datetime.datetime(2010, 1, 1)),
+            (3, 'bharney', ['b'], datetime.datetime(2010, 7, 1)),
+            (4, 'bharney', ['a', 'c'], datetime.datetime(2011, 2, 1)),
+            ]
+        for docid, creator, interfaces, created in docs:
+            doc = testing.DummyModel(
+                creator=creator, interfaces=interfaces,
+                creation_date=coarse_datetime_repr(created))
+            for index in catalog.values():
+                index.index_doc(docid, doc)
+        return catalog
+
+    def test_facets(self):
+        context = testing.DummyModel()
+        context.catalog = self._makeFacetCatalog(
+            {1:'/a', 2:'/b', 3:'/c'})
+        adapter = self._makeOne(context)
+        num, counts = adapter.facets(
+            ['creator', 'interfaces', 'creation_date'], texts='foo',
+            sort_index='texts', limit=5)
+        self.assertEqual(num, 3)
+        self.assertEqual(counts['creator'], {'phred': 2, 'bharney': 1})
+        self.assertEqual(counts['interfaces'], {'a': 2, 'b': 2})
+        self.assertEqual(counts['creation_date'], {2009: 1, 2010: 2})
+        self.assertEqual(context.catalog.queries, [{'texts': 'foo'}])
+
+    def test_facets_by_postings(self):
+        # fewer values than matching documents
+        context = testing.DummyModel()
+        context.catalog = self._makeFacetCatalog(
+            {1:'/a', 2:'/b', 3:'/c', 4:'/d'})
+        adapter = self._makeOne(context)
+        num, counts = adapter.facets(['creator', 'creation_date'])
+        self.assertEqual(counts['creator'], {'phred': 2, 'bharney': 2})
+        self.assertEqual(counts['creation_date'],
+                         {2009: 1, 2010: 2, 2011: 1})
+
+    def test_facets_no_results(self):
+        context = testing.DummyModel()
+        context.catalog = self._makeFacetCatalog()
+        adapter = self._makeOne(context)
+        num, counts = adapter.facets(['creator'])
+        self.assertEqual(num, 0)
+        self.assertEqual(counts, {'creator': {}})
+
+    def test_facets_index_counts_itself(self):
+        context = testing.DummyModel()
+        context.catalog = ocoretesting.DummyCatalog({1:'/a', 2:'/b'})
+        context.catalog['tags'] = DummyFacetIndex({'foo': 2})
+        adapter = self._makeOne(context)
+        num, counts = adapter.facets(['tags'])
+        self.assertEqual(counts, {'tags': {'foo': 2}})
+        self.assertEqual(list(context.catalog['tags'].docids), [1, 2])
+
+    def test_facets_consistent(self):
+        import transaction
+        from opencore.models.indexqueue import IndexingQueue
+        transaction.abort()
+        context = testing.DummyModel()
+        context.catalog = self._makeFacetCatalog({1:'/a'})
+        context.catalog.indexing_queue = queue = IndexingQueue()
+        queue.unindex(1)
+        adapter = self._makeOne(context)
+        adapter.facets(['creator'], consistent=True)
+        self.assertEqual(context.catalog.unindexed, [1])
+        self.assertEqual(len(queue), 0)
+
 
 class TestGridEntryInfo(unittest.TestCase):
 
@@ -890,3 +1059,26 @@ class DummyInterface(Interface):
 class DummyFieldIndex:
     def __init__(self, data={}):
         self._fwd_index = data
+
+class DummyFacetIndex:
+    def __init__(self, counts):
+        self.counts = counts
+
+    def facet_counts(self, docids):
+        self.docids = docids
+        return self.counts
+
+
+class DummyCountingModel(testing.DummyModel):
+    gets = 0
+    def __getitem__(self, name):
+        self.gets += 1
+        return testing.DummyModel.__getitem__(self, name)
+
+
+class DummyJar:
+    def __init__(self):
+        self.prefetched = []
+
+    def prefetch(self, objects):
+        self.prefetched.append(objects)
@@ -53,36 +53,49 @@ class TestCachingCatalog(unittest.TestCase):
         cache = DummyCache({1:1})
         self._registerCache(cache)
         catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
         catalog.clear()
-        self.assertEqual(cache, {})
+        self.assertEqual(catalog.generation.value, 2)
+        self.assertEqual(catalog.generations['dummy'].value, 2)
 
-    def test_index_doc(self):
-        cache = DummyCache({1:1})
-        self._registerCache(cache)
+    def test_index_doc_unknown_index_invalidated(self):
         catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
         catalog.index_doc(1,1)
-        self.assertEqual(cache, {})
+        self.assertEqual(catalog.generation.value, 2)
+        self.assertEqual(catalog.generations['dummy'].value, 2)
 
-    def test_reindex_doc(self):
-        cache = DummyCache({1:1})
-        self._registerCache(cache)
+    def test_index_doc_only_changed_indexes_invalidated(self):
         catalog = self._makeOne()
-        catalog.reindex_doc(1,1)
-        self.assertEqual(cache, {})
+        catalog['changed'] = DummyFieldIndex()
+        catalog['unchanged'] = DummyFieldIndex(ignore=True)
+        catalog.index_doc(1, 'value')
+        self.assertEqual(catalog.generations['changed'].value, 2)
+        self.assertEqual(catalog.generations['unchanged'].value, 1)
+
+    def test_reindex_doc_same_value_not_invalidated(self):
+        catalog = self._makeOne()
+        catalog['field'] = DummyFieldIndex()
+        catalog.index_doc(1, 'value')
+        catalog.reindex_doc(1, 'value')
+        self.assertEqual(catalog.generations['field'].value, 2)
+        catalog.reindex_doc(1, 'other')
+        self.assertEqual(catalog.generations['field'].value, 3)
 
     def test_unindex_doc(self):
-        cache = DummyCache({1:1})
-        self._registerCache(cache)
         catalog = self._makeOne()
+        catalog['field'] = DummyFieldIndex()
+        catalog.index_doc(1, 'value')
         catalog.unindex_doc(1)
-        self.assertEqual(cache, {})
+        self.assertEqual(catalog.generations['field'].value, 3)
+        catalog.unindex_doc(1)
+        self.assertEqual(catalog.generations['field'].value, 3)
 
     def test_setitem(self):
-        cache = DummyCache({1:1})
-        self._registerCache(cache)
         catalog = self._makeOne()
         catalog['dummy'] = DummyIndex()
-        self.assertEqual(cache, {})
+        self.assertEqual(catalog.generation.value, 1)
+        self.assertEqual(catalog.generations['dummy'].value, 1)
 
     def test_search(self):
         cache = DummyCache({})
@@ -92,70 +105,184 @@ class TestCachingCatalog(unittest.TestCase):
         catalog.index_doc(1,1)
         self.assertEqual(cache, {})
         result = catalog.search(dummy=1)
-        self.assertEqual(result, (3, [1,2,3]))
+        self.assertEqual(_unroll(result), (3, [1,2,3]))
         self.assertEqual(len(cache), 1)
         import cPickle
+        from array import array
         key = cPickle.dumps(((), {'dummy':1}))
         self.failUnless(key in cache)
+        self.assertEqual(cache[key],
+                         ((('dummy', 2),), 3, array('i', [1,2,3]), True))
+        catalog._search = None # must not be called again
         result = catalog.search(dummy=1)
-        self.assertEqual(result, (3, [1,2,3]))
-        self.failUnless(key in cache)
+        self.assertEqual(_unroll(result), (3, [1,2,3]))
 
-    def test_search_no_catalog_cache_in_environ(self):
+    def test_search_stale_when_used_index_changes(self):
         cache = DummyCache({})
         self._registerCache(cache)
         catalog = self._makeOne()
         catalog['dummy'] = DummyIndex()
-        catalog.index_doc(1,1)
-        class DummyOS:
-            environ = {'NO_CATALOG_CACHE':1}
-        catalog.os = DummyOS
+        catalog['field'] = DummyFieldIndex()
+        catalog.search(dummy=1)
+        catalog.invalidate(['field'])
+        catalog._search = None # unrelated change; served from the cache
+        self.assertEqual(_unroll(catalog.search(dummy=1)), (3, [1,2,3]))
+        catalog.invalidate(['dummy'])
+        calls = []
+        def dummy(*arg, **kw):
+            calls.append(kw)
+            return (1, [1])
+        catalog._search = dummy
+        self.assertEqual(_unroll(catalog.search(dummy=1)), (1, [1]))
+        self.assertEqual(calls, [{'dummy': 1}])
+
+    def test_search_sort_index_is_used(self):
+        catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
+        catalog['field'] = DummyFieldIndex()
+        generations, uncommitted = catalog._query_generations(
+            (), {'dummy': 1, 'sort_index': 'field', 'reverse': True})
+        self.assertEqual(generations, (('dummy', 1), ('field', 1)))
+        self.assertEqual(uncommitted, False)
+
+    def test_search_uncommitted_write_not_cached(self):
+        cache = DummyCache({})
+        self._registerCache(cache)
+        catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
+        catalog.generations['dummy'] = DummyChangedGeneration()
         result = catalog.search(dummy=1)
-        self.assertEqual(result, (3, [1,2,3]))
+        self.assertEqual(list(result[1]), [1,2,3])
         self.assertEqual(len(cache), 0)
 
-    def test_search_generation_0(self):
+    def test_search_new_generation_not_cached(self):
         cache = DummyCache({})
         self._registerCache(cache)
         catalog = self._makeOne()
         catalog['dummy'] = DummyIndex()
-        catalog.index_doc(1,1)
-        class DummyOS:
-            environ = {'NO_CATALOG_CACHE':1}
-        catalog.os = DummyOS
+        catalog._p_jar = DummyJar()
+        catalog.generations = None # created before the generations
+        catalog.invalidate(['dummy'])
         result = catalog.search(dummy=1)
-        self.assertEqual(result, (3, [1,2,3]))
+        self.assertEqual(list(result[1]), [1,2,3])
+        self.assertEqual(len(cache), 0)
+        catalog.generations['dummy']._p_jar = catalog._p_jar
+        catalog.search(dummy=1)
+        self.assertEqual(len(cache), 1)
 
-    def test_search_no_icatalog_search_cache(self):
+    def test_search_versioned_by_index_source(self):
+        from BTrees.Length import Length
+        cache = DummyCache({})
+        self._registerCache(cache)
+        catalog = self._makeOne()
+        catalog['tags'] = index = DummyIndex()
+        index.generation = Length(0)
+        result = catalog.search(tags='a')
+        self.assertEqual(_unroll(result), (3, [1,2,3]))
+        self.assertEqual(cache.values()[0][0], (('tags', 1, 0),))
+        catalog._search = None # must not be called again
+        self.assertEqual(_unroll(catalog.search(tags='a')), (3, [1,2,3]))
+        index.generation.change(1)
+        catalog._search = lambda *arg, **kw: (1, [1])
+        self.assertEqual(_unroll(catalog.search(tags='a')), (1, [1]))
+
+    def test_search_uncommitted_source_not_cached(self):
+        cache = DummyCache({})
+        self._registerCache(cache)
+        catalog = self._makeOne()
+        catalog['tags'] = index = DummyIndex()
+        index.generation = DummyChangedGeneration()
+        result = catalog.search(tags='a')
+        self.assertEqual(list(result[1]), [1,2,3])
+        self.assertEqual(len(cache), 0)
+
+    def test_search_new_source_not_cached(self):
+        from BTrees.Length import Length
+        cache = DummyCache({})
+        self._registerCache(cache)
+        catalog = self._makeOne()
+        catalog['tags'] = index = DummyIndex()
+        catalog._p_jar = DummyJar()
+        for length in catalog.generations.values():
+            length._p_jar = catalog._p_jar
+        index.generation = Length(1)
+        result = catalog.search(tags='a')
+        self.assertEqual(list(result[1]), [1,2,3])
+        self.assertEqual(len(cache), 0)
+
+    def test_search_large_unsorted_not_cached(self):
+        cache = DummyCache({})
+        self._registerCache(cache)
+        catalog = self._makeOne()
+        from opencore.models.catalog import MAX_CACHED_RESULT_SET
+        num = MAX_CACHED_RESULT_SET + 1
+        catalog._search = lambda *arg, **kw: (num, xrange(num))
+        result = catalog.search(dummy=1)
+        self.assertEqual(result[0], num)
+        self.assertEqual(len(cache), 0)
+
+    def test_search_large_sorted_caches_prefix(self):
+        from opencore.models.catalog import LARGE_RESULT_SET
+        cache = DummyCache({})
+        self._registerCache(cache)
+        catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
+        num = LARGE_RESULT_SET * 3
+        searches = []
+        def dummy(*arg, **kw):
+            searches.append(kw)
+            return num, (docid for docid in xrange(num))
+        catalog._search = dummy
+        result = catalog.search(dummy=1, sort_index='dummy')
+        self.assertEqual(result[0], num)
+        self.assertEqual(list(result[1]), range(num))
+        self.assertEqual(list(result[1]), range(num)) # can iterate again
+        entry = cache.values()[0]
+        self.assertEqual(list(entry[2]), range(LARGE_RESULT_SET))
+        self.assertEqual(entry[3], False)
+        self.assertEqual(len(searches), 1)
+
+        result = catalog.search(dummy=1, sort_index='dummy')
+        self.assertEqual(result[1][:20], range(20))
+        self.assertEqual(result[1][5], 5)
+        self.assertEqual(len(searches), 1) # prefix served from the cache
+        self.assertEqual(result[1][LARGE_RESULT_SET + 1],
+                         LARGE_RESULT_SET + 1)
+        self.assertEqual(len(searches), 2) # continuation reran the search
+        self.assertEqual(list(result[1]), range(num))
+        self.assertEqual(len(searches), 2)
+
+    def test_search_no_catalog_cache_in_environ(self):
+        cache = DummyCache({})
+        self._registerCache(cache)
         catalog = self._makeOne()
         catalog['dummy'] = DummyIndex()
         catalog.index_doc(1,1)
+        class DummyOS:
+            environ = {'NO_CATALOG_CACHE':1}
+        catalog.os = DummyOS
         result = catalog.search(dummy=1)
         self.assertEqual(result, (3, [1,2,3]))
+        self.assertEqual(len(cache), 0)
 
-    def test_search_generation_None(self):
-        cache = DummyCache({})
-        self._registerCache(cache)
+    def test_search_no_icatalog_search_cache(self):
         catalog = self._makeOne()
         catalog['dummy'] = DummyIndex()
         catalog.index_doc(1,1)
-        catalog.generation = None
         result = catalog.search(dummy=1)
         self.assertEqual(result, (3, [1,2,3]))
-        self.assertEqual(cache.generation, 0)
 
-    def test_search_generation_gt_cachegen(self):
-        from BTrees.Length import Length
+    def test_search_generations_None(self):
         cache = DummyCache({})
-        cache.generation = -1
         self._registerCache(cache)
         catalog = self._makeOne()
         catalog['dummy'] = DummyIndex()
-        catalog.index_doc(1,1)
-        catalog.generation = Length(1)
+        catalog.generations = None
         result = catalog.search(dummy=1)
-        self.assertEqual(result, (3, [1,2,3]))
-        self.assertEqual(cache.generation, 2)
+        self.assertEqual(_unroll(result), (3, [1,2,3]))
+        from array import array
+        self.assertEqual(cache.values(),
+                         [((('dummy', 0),), 3, array('i', [1,2,3]), True)])
 
     def test_search_returns_generator(self):
         cache = DummyCache({})
@@ -167,28 +294,24 @@ class TestCachingCatalog(unittest.TestCase):
             return (1, gen())
         catalog._search = dummy
         result = catalog.search(dummy=1)
-        self.assertEqual(result, (1, [1]))
+        self.assertEqual(_unroll(result), (1, [1]))
         self.assertEqual(len(cache), 1)
 
     def test_invalidate_generation_is_None(self):
-        cache = DummyCache({})
         catalog = self._makeOne()
-        self._registerCache(cache)
         catalog.generation = None
-        catalog.invalidate()
+        catalog.generations = None
+        catalog.invalidate(['dummy'])
         self.assertEqual(catalog.generation.value, 1)
-        self.assertEqual(cache.generation, 1)
+        self.assertEqual(catalog.generations['dummy'].value, 1)
 
     def test_invalidate_generation_gt_sys_maxint(self):
         from BTrees.Length import Length
         import sys
-        cache = DummyCache({})
         catalog = self._makeOne()
-        self._registerCache(cache)
         catalog.generation = Length(sys.maxint + 1)
         catalog.invalidate()
         self.assertEqual(catalog.generation.value, 0)
-        self.assertEqual(cache.generation, 0)
 
     def test_notify_on_query(self):
         handled = []
@@ -206,6 +329,192 @@ class TestCachingCatalog(unittest.TestCase):
         self.assertEqual(type(event.duration), float)
         self.assertEqual(event.result, result)
 
+    def test_notify_on_query_profile(self):
+        handled = []
+        from opencore.models.interfaces import ICatalogQueryEvent
+        testing.registerSubscriber(handled.append, ICatalogQueryEvent)
+        catalog = self._makeOne()
+        catalog.profiler = DummyProfiler()
+        catalog['dummy'] = DummyIndex()
+        catalog['sort'] = DummySortIndex()
+        catalog.search(dummy=1, sort_index='sort', offset=0, limit=2)
+        event = handled[0]
+        self.assertEqual([(name, size) for name, duration, size
+                          in event.timings], [('dummy', 3)])
+        self.assertEqual(type(event.timings[0][1]), float)
+        self.assertEqual(type(event.sort_time), float)
+        self.assertEqual(event.cached, None)
+        self.failUnless(catalog['dummy'].__class__ is DummyIndex)
+
+    def test_notify_on_query_profile_intersected_indexes(self):
+        handled = []
+        from opencore.models.interfaces import ICatalogQueryEvent
+        testing.registerSubscriber(handled.append, ICatalogQueryEvent)
+        catalog = self._makeOne()
+        catalog.profiler = DummyProfiler()
+        catalog['big'] = DummyPostingsIndex([], 'big', {'a': [1,2,3]})
+        catalog['small'] = DummyPostingsIndex([], 'small', {'a': [1]})
+        catalog.search(big='a', small='a', limit=1)
+        event = handled[0]
+        self.assertEqual([(name, size) for name, duration, size
+                          in event.timings], [('small', 1), ('big', 1)])
+
+    def test_notify_on_query_profiling_disabled(self):
+        handled = []
+        from opencore.models.interfaces import ICatalogQueryEvent
+        testing.registerSubscriber(handled.append, ICatalogQueryEvent)
+        catalog = self._makeOne()
+        catalog.profiler = DummyProfiler(False)
+        catalog['dummy'] = DummyIndex()
+        catalog['sort'] = DummySortIndex()
+        catalog.search(dummy=1, sort_index='sort', offset=0, limit=2)
+        event = handled[0]
+        self.assertEqual(event.timings, ())
+        self.assertEqual(event.sort_time, None)
+
+    def test_notify_cache_miss_and_hit(self):
+        handled = []
+        from opencore.models.interfaces import ICatalogQueryEvent
+        testing.registerSubscriber(handled.append, ICatalogQueryEvent)
+        self._registerCache(DummyCache({}))
+        catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
+        catalog.search(dummy=1)
+        catalog.search(dummy=1)
+        self.assertEqual([event.cached for event in handled], [False, True])
+        self.assertEqual(handled[1].result[0], 3)
+        self.assertEqual(handled[1].timings, ())
+
+    def test_search_count_only(self):
+        handled = []
+        from opencore.models.interfaces import ICatalogQueryEvent
+        testing.registerSubscriber(handled.append, ICatalogQueryEvent)
+        catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
+        catalog['sort'] = sort_index = DummySortIndex()
+        result = catalog.search(dummy=1, sort_index='sort', reverse=True,
+                                limit=1, count_only=True)
+        self.assertEqual(result, (3, ()))
+        self.assertEqual(sort_index.sorted, [])
+        self.assertEqual(handled[0].query, {'dummy': 1})
+
+    def test_search_count_only_cached_apart(self):
+        import cPickle
+        cache = DummyCache({})
+        self._registerCache(cache)
+        catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
+        catalog['sort'] = DummySortIndex()
+        self.assertEqual(catalog.search(dummy=1, sort_index='sort',
+                                        count_only=True), (3, ()))
+        key = cPickle.dumps(('count', (), {'dummy': 1}))
+        self.assertEqual(cache.keys(), [key])
+        self.assertEqual(cache[key], ((('dummy', 1),), 3))
+        # changing the sort index doesn't invalidate the count
+        catalog.invalidate(['sort'])
+        def fail(*arg, **kw):
+            raise AssertionError('not cached')
+        catalog._search = fail
+        self.assertEqual(catalog.search(dummy=1, count_only=True), (3, ()))
+        catalog.invalidate(['dummy'])
+        self.assertRaises(AssertionError, catalog.search, dummy=1,
+                          count_only=True)
+
+    def test_search_offset_and_limit(self):
+        catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
+        catalog['sort'] = sort_index = DummySortIndex()
+        num, docids = catalog.search(dummy=1, sort_index='sort',
+                                     reverse=True, offset=1, limit=1)
+        self.assertEqual(num, 3)
+        self.assertEqual(list(docids), [2])
+        self.assertEqual(sort_index.sorted, [([1,2,3], True, 2)])
+
+    def test_search_offset_sorted_by_children_index(self):
+        catalog = self._makeOne()
+        catalog['parent'] = parent = DummyChildrenIndex()
+        catalog['sort'] = sort_index = DummySortIndex()
+        num, docids = catalog.search(parent='/a', sort_index='sort',
+                                     reverse=True, offset=1, limit=1)
+        self.assertEqual(num, 3)
+        self.assertEqual(list(docids), [2])
+        self.assertEqual(parent.sorted, [('/a', 'sort', True, 2)])
+        self.assertEqual(sort_index.sorted, [])
+        # a query for several parents uses the sort index
+        catalog.search(parent=['/a'], sort_index='sort', offset=0)
+        self.assertEqual(len(parent.sorted), 1)
+        self.assertEqual(len(sort_index.sorted), 1)
+
+    def test_search_few_results_in_large_parent(self):
+        catalog = self._makeOne()
+        catalog['parent'] = parent = DummyChildrenIndex(1000)
+        catalog['sort'] = sort_index = DummySortIndex()
+        num, docids = catalog.search(parent='/a', sort_index='sort',
+                                     offset=0, limit=2)
+        self.assertEqual(list(docids), [1, 2])
+        self.assertEqual(parent.sorted, [])
+        self.assertEqual(len(sort_index.sorted), 1)
+        # a short listing of a larger parent still reads it in order,
+        # unless it has to read all of it backwards
+        parent.children = 4
+        catalog.search(parent='/a', sort_index='sort', offset=0, limit=2)
+        self.assertEqual(parent.sorted, [('/a', 'sort', False, 2)])
+        catalog.search(parent='/a', sort_index='sort', reverse=True,
+                       offset=0, limit=2)
+        self.assertEqual(len(parent.sorted), 1)
+        self.assertEqual(len(sort_index.sorted), 2)
+
+    def test_search_ranked_by_text_index(self):
+        catalog = self._makeOne()
+        catalog['texts'] = texts = DummyRankedIndex()
+        num, docids = catalog.search(texts='fox', sort_index='texts',
+                                     offset=1, limit=1)
+        self.assertEqual(num, 2)
+        self.assertEqual(list(docids), [1])
+        self.assertEqual(texts.ranked, [('fox', [1, 2], 2)])
+        self.assertEqual(texts.sorted, [])
+
+    def test_search_limit_ranked_by_text_index(self):
+        catalog = self._makeOne()
+        catalog['texts'] = texts = DummyRankedIndex()
+        num, docids = catalog.search(texts='fox', sort_index='texts',
+                                     limit=1)
+        self.assertEqual(num, 1)
+        self.assertEqual(list(docids), [2])
+        self.assertEqual(texts.ranked, [('fox', [1, 2], 1)])
+
+    def test_search_limit_num(self):
+        # num is at most limit without an offset, the total with one,
+        # whether the results are ranked or sorted
+        catalog = self._makeOne()
+        catalog['texts'] = DummyRankedIndex()
+        catalog['sort'] = DummySortIndex()
+        # (the ranked search only matches the text index's candidates)
+        for sort_index, total in (('texts', 2), ('sort', 3)):
+            num, docids = catalog.search(texts='fox', sort_index=sort_index,
+                                         limit=1)
+            self.assertEqual(num, 1)
+            num, docids = catalog.search(texts='fox', sort_index=sort_index,
+                                         offset=0, limit=1)
+            self.assertEqual(num, total)
+
+    def test_search_least_relevant_first_is_sorted(self):
+        catalog = self._makeOne()
+        catalog['texts'] = texts = DummyRankedIndex()
+        num, docids = catalog.search(texts='fox', sort_index='texts',
+                                     reverse=True, offset=0, limit=1)
+        self.assertEqual(num, 3)
+        self.assertEqual(list(docids), [3])
+        self.assertEqual(texts.ranked, [])
+        self.assertEqual(texts.sorted, [([1, 2, 3], True, 1)])
+
+    def test_search_offset_without_limit_or_sort_index(self):
+        catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
+        num, docids = catalog.search(dummy=1, offset=1)
+        self.assertEqual(num, 3)
+        self.assertEqual(list(docids), [2,3])
+
     def test_search_use_cache_is_false(self):
         cache = DummyCache({})
         self._registerCache(cache)
@@ -216,6 +525,118 @@ class TestCachingCatalog(unittest.TestCase):
         self.assertEqual(result, (3, [1,2,3]))
         self.assertEqual(len(cache), 0)
 
+    def test_index_docs(self):
+        catalog = self._makeOne()
+        catalog['field'] = field = DummyFieldIndex()
+        catalog['ignoring'] = DummyFieldIndex(ignore=True)
+        calls = []
+        def index_doc(docid, val):
+            calls.append(docid)
+            DummyFieldIndex.index_doc(field, docid, val)
+        field.index_doc = index_doc
+        catalog.index_docs([(3, 'c'), (1, 'a'), (2, 'b')])
+        self.assertEqual(calls, [1, 2, 3])
+        self.assertEqual(field._rev_index, {1: 'a', 2: 'b', 3: 'c'})
+        self.assertEqual(catalog.generation.value, 3)
+        self.assertEqual(catalog.generations['field'].value, 2)
+        self.assertEqual(catalog.generations['ignoring'].value, 1)
+
+    def test_index_docs_unchanged(self):
+        catalog = self._makeOne()
+        catalog['field'] = field = DummyFieldIndex()
+        field.index_doc(1, 'a')
+        catalog.index_docs([(1, 'a')])
+        self.assertEqual(catalog.generation.value, 1)
+        self.assertEqual(catalog.generations['field'].value, 1)
+
+    def test_plan_orders_indexes_by_estimate(self):
+        applied = []
+        catalog = self._makeOne()
+        catalog['big'] = DummyPostingsIndex(applied, 'big',
+                                            {'a': [1,2,3], 'b': [4]})
+        catalog['small'] = DummyPostingsIndex(applied, 'small', {'a': [1,2]})
+        catalog['empty'] = DummyPostingsIndex(applied, 'empty', {'a': [1]})
+        catalog['path'] = DummyPostingsIndex(applied, 'path', None)
+        plan = catalog._plan({'big': ['a', 'b'], 'small': 'a',
+                              'empty': 'x', 'path': '/a', 'sort_index': 'x'})
+        self.assertEqual(plan, [('empty', 0), ('path', None),
+                                ('small', 2), ('big', 4)])
+
+    def test_plan_single_index(self):
+        catalog = self._makeOne()
+        catalog['dummy'] = DummyIndex()
+        self.assertEqual(catalog._plan({'dummy': 1}), None)
+
+    def test_estimate_operators(self):
+        from repoze.catalog.indexes.keyword import CatalogKeywordIndex
+        catalog = self._makeOne()
+        catalog['field'] = DummyPostingsIndex(
+            [], 'field', {'a': [1,2,3], 'b': [4]})
+        self.assertEqual(catalog._estimate('field', ['a', 'b']), 4)
+        self.assertEqual(catalog._estimate(
+            'field', {'query': ['a', 'b'], 'operator': 'and'}), 1)
+        self.assertEqual(catalog._estimate(
+            'field', {'query': ('a', 'z'), 'range': True}), 4)
+        self.assertEqual(catalog._estimate('field', []), 0)
+        class DummyKeywordIndex(DummyPostingsIndex, CatalogKeywordIndex):
+            pass
+        catalog['keyword'] = DummyKeywordIndex(
+            [], 'keyword', {'a': [1,2,3], 'b': [4]})
+        self.assertEqual(catalog._estimate('keyword', ['a', 'b']), 1)
+
+    def test_plan_estimates_allowed_index(self):
+        from opencore.models.indexes import CatalogAllowedIndex
+        catalog = self._makeOne()
+        catalog['allowed'] = allowed = CatalogAllowedIndex('allowed')
+        for docid in range(1, 11):
+            allowed.index_doc(docid, testing.DummyModel(
+                allowed=['system.Everyone']))
+        allowed.index_doc(11, testing.DummyModel(allowed=['group.Admin']))
+        catalog['small'] = DummyPostingsIndex([], 'small', {'a': [1, 2]})
+        query = {'allowed': {'query': ['system.Everyone', 'group.Admin'],
+                             'operator': 'or'},
+                 'small': 'a'}
+        self.assertEqual(catalog._plan(query),
+                         [('small', 2), ('allowed', 11)])
+
+    def test_search_applies_indexes_in_planned_order(self):
+        handled = []
+        from opencore.models.interfaces import ICatalogQueryEvent
+        testing.registerSubscriber(handled.append, ICatalogQueryEvent)
+        applied = []
+        catalog = self._makeOne()
+        catalog['big'] = DummyPostingsIndex(applied, 'big', {'a': [1,2,3]})
+        catalog['small'] = DummyPostingsIndex(applied, 'small', {'a': [1]})
+        num, docids = catalog.search(big='a', small='a')
+        self.assertEqual((num, list(docids)), (1, [1]))
+        self.assertEqual(applied, ['small', 'big'])
+        event = handled[0]
+        self.assertEqual(event.query, {'big': 'a', 'small': 'a'})
+        self.assertEqual(event.plan, [('small', 1), ('big', 3)])
+
+    def test_search_explicit_index_query_order(self):
+        applied = []
+        catalog = self._makeOne()
+        catalog['big'] = DummyPostingsIndex(applied, 'big', {'a': [1,2,3]})
+        catalog['small'] = DummyPostingsIndex(applied, 'small', {'a': [1]})
+        catalog.search(big='a', small='a', index_query_order=['big', 'small'])
+        self.assertEqual(applied, ['big', 'small'])
+
+    def test_term_counts_are_memoized(self):
+        from opencore.models.catalog import ESTIMATE_REFRESH
+        catalog = self._makeOne()
+        catalog['field'] = index = DummyPostingsIndex([], 'field', {'a': [1]})
+        self.assertEqual(catalog._estimate('field', 'a'), 1)
+        index._fwd_index['a'] = [1, 2]
+        self.assertEqual(catalog._estimate('field', 'a'), 1)
+        for i in range(ESTIMATE_REFRESH):
+            catalog.invalidate(['field'])
+        self.assertEqual(catalog._estimate('field', 'a'), 2)
+
+def _unroll(result):
+    num, docids = result
+    return num, list(docids)
+
 class TestReindexCatalog(unittest.TestCase):
     def _callFUT(self, context, **kw):
         from opencore.models.catalog import reindex_catalog
@@ -322,6 +743,199 @@ class TestReindexCatalog(unittest.TestCase):
                           '*** committing ***'])
         self.assertEqual(transaction.committed, 2)
         self.assertEqual(catalog.index.indexed, {1:a})
+        self.assertEqual(catalog.invalidated, [('index',)])
+
+    def _makeSite(self, catalog):
+        from zope.interface import directlyProvides
+        from opencore.models.interfaces import ISite
+        site = testing.DummyModel()
+        directlyProvides(site, ISite)
+        site.catalog = catalog
+        return site
+
+    def test_it_worker(self):
+        testing.registerModels({'a':testing.DummyModel(),
+                                'b':testing.DummyModel(),
+                                'c':testing.DummyModel()})
+        catalog = DummyCatalog({'a':1, 'b':2, 'c':3})
+        site = self._makeSite(catalog)
+        transaction = DummyTransaction()
+        self._callFUT(site, transaction=transaction, worker=1, workers=2,
+                      update_indexes=False)
+        self.assertEqual(sorted(catalog.reindexed), [1, 3])
+        self.assertEqual(transaction.committed, 1)
+
+    def test_it_records_checkpoints(self):
+        from BTrees.OOBTree import OOBTree
+        testing.registerModels({'a':testing.DummyModel(),
+                                'b':testing.DummyModel()})
+        catalog = DummyCatalog(OOBTree({'a':1, 'b':2}))
+        catalog.reindex_checkpoints = checkpoints = OOBTree()
+        site = self._makeSite(catalog)
+        committed = []
+        transaction = DummyTransaction(
+            lambda: committed.append(dict(checkpoints)))
+        self._callFUT(site, transaction=transaction, commit_interval=1,
+                      update_indexes=False)
+        self.assertEqual(committed,
+                         [{(0, 1): ((None, None, False), 'a')}, {}])
+
+    def test_it_resumes_after_checkpoint(self):
+        from BTrees.OOBTree import OOBTree
+        testing.registerModels({'a':testing.DummyModel(),
+                                'b':testing.DummyModel(),
+                                'c':testing.DummyModel()})
+        L = []
+        catalog = DummyCatalog(OOBTree({'a':1, 'b':2, 'c':3}))
+        catalog.reindex_checkpoints = OOBTree()
+        catalog.reindex_checkpoints[(0, 1)] = ((None, None, False), 'a')
+        site = self._makeSite(catalog)
+        transaction = DummyTransaction()
+        self._callFUT(site, output=L.append, transaction=transaction,
+                      update_indexes=False)
+        self.assertEqual(catalog.reindexed, [2, 3])
+        self.assertEqual(L[0], 'resuming after a')
+        self.assertEqual(len(catalog.reindex_checkpoints), 0)
+
+    def test_it_ignores_checkpoint_of_other_run(self):
+        from BTrees.OOBTree import OOBTree
+        testing.registerModels({'a':testing.DummyModel(),
+                                'b':testing.DummyModel()})
+        catalog = DummyCatalog(OOBTree({'a':1, 'b':2}))
+        catalog.reindex_checkpoints = OOBTree()
+        catalog.reindex_checkpoints[(0, 1)] = ((('title',), None, False), 'a')
+        site = self._makeSite(catalog)
+        self._callFUT(site, transaction=DummyTransaction(),
+                      update_indexes=False)
+        self.assertEqual(catalog.reindexed, [1, 2])
+
+    def test_it_retries_conflicts(self):
+        from ZODB.POSException import ConflictError
+        testing.registerModels({'a':testing.DummyModel()})
+        catalog = DummyCatalog({'a':1})
+        site = self._makeSite(catalog)
+        conflicts = [ConflictError()]
+        def on_commit():
+            if conflicts:
+                raise conflicts.pop()
+        transaction = DummyTransaction(on_commit)
+        self._callFUT(site, transaction=transaction, update_indexes=False)
+        self.assertEqual(catalog.reindexed, [1, 1])
+        self.assertEqual(transaction.aborted, 1)
+        self.assertEqual(transaction.committed, 1)
+
+    def test_it_gives_up_on_repeated_conflicts(self):
+        from ZODB.POSException import ConflictError
+        testing.registerModels({'a':testing.DummyModel()})
+        catalog = DummyCatalog({'a':1})
+        site = self._makeSite(catalog)
+        def on_commit():
+            raise ConflictError()
+        transaction = DummyTransaction(on_commit)
+        self.assertRaises(ConflictError, self._callFUT, site,
+                          transaction=transaction, update_indexes=False,
+                          retries=2)
+        self.assertEqual(transaction.aborted, 2)
+
+    def test_it_with_computed_values(self):
+        from repoze.catalog.indexes.field import CatalogFieldIndex
+        from opencore.models.catalog import compute_index_values
+        a = testing.DummyModel(title='A')
+        b = testing.DummyModel()
+        testing.registerModels({'a':a, 'b':b})
+        L = []
+        catalog = DummyCatalog({'a':1, 'b':2, 'c':3})
+        catalog.title = CatalogFieldIndex('title')
+        catalog.title.index_doc(2, testing.DummyModel(title='B'))
+        site = self._makeSite(catalog)
+        def imap(batches):
+            return [compute_index_values(site, batch, ('title',))
+                    for batch in batches]
+        self._callFUT(site, output=L.append, transaction=DummyTransaction(),
+                      indexes=('title',), imap=imap, update_indexes=False)
+        self.assertEqual(dict(catalog.title._rev_index), {1: 'A'})
+        self.failUnless('error: c not found' in L)
+        self.assertEqual(catalog.invalidated, [('title',)])
+        self.assertEqual(catalog.reindexed, [])
+
+    def test_it_with_computed_values_not_indexed(self):
+        from repoze.catalog.indexes.field import CatalogFieldIndex
+        from opencore.models.catalog import compute_index_values
+        testing.registerModels({'a':testing.DummyModel(title='A'),
+                                'b':testing.DummyModel()})
+        catalog = DummyCatalog({'a':1, 'b':2})
+        catalog.title = CatalogFieldIndex('title')
+        catalog.title.index_doc(1, testing.DummyModel())
+        catalog.title.index_doc(2, testing.DummyModel(title='B'))
+        site = self._makeSite(catalog)
+        def imap(batches):
+            return [compute_index_values(site, batch, ('title',))
+                    for batch in batches]
+        self._callFUT(site, transaction=DummyTransaction(),
+                      indexes=('title',), imap=imap, update_indexes=False)
+        self.assertEqual(dict(catalog.title._rev_index), {1: 'A'})
+        self.assertEqual(list(catalog.title._not_indexed), [2])
+        self.assertEqual(list(catalog.title.docids()), [1, 2])
+
+    def test_it_with_computed_values_ranked(self):
+        from opencore.models.catalog import compute_index_values
+        from opencore.models.indexes import CatalogRankedTextIndex
+        a = testing.DummyModel(text='a fox')
+        testing.registerModels({'a':a})
+        catalog = DummyCatalog({'a':1})
+        catalog.texts = CatalogRankedTextIndex('text')
+        site = self._makeSite(catalog)
+        def imap(batches):
+            return [compute_index_values(site, batch, ('texts',))
+                    for batch in batches]
+        self._callFUT(site, transaction=DummyTransaction(),
+                      indexes=('texts',), imap=imap, update_indexes=False)
+        expected = CatalogRankedTextIndex('text')
+        expected.index_doc(1, a)
+        self.failUnless(catalog.texts._bounds)
+        self.assertEqual(list(catalog.texts._bounds.keys()),
+                         list(expected._bounds.keys()))
+
+    def test_it_with_computed_persistent_value(self):
+        from persistent import Persistent
+        from repoze.catalog.indexes.field import CatalogFieldIndex
+        testing.registerModels({})
+        catalog = DummyCatalog({})
+        catalog.title = CatalogFieldIndex('title')
+        site = self._makeSite(catalog)
+        def imap(batches):
+            return [[('a', 1, {'title': Persistent()})]]
+        self.assertRaises(ValueError, self._callFUT, site,
+                          transaction=DummyTransaction(), indexes=('title',),
+                          imap=imap, update_indexes=False)
+
+    def test_it_with_computed_values_unsupported_index(self):
+        catalog = DummyCatalog({})
+        catalog.index = DummyIndex()
+        site = self._makeSite(catalog)
+        self.assertRaises(ValueError, self._callFUT, site,
+                          transaction=DummyTransaction(), indexes=('index',),
+                          imap=map, update_indexes=False)
+
+class TestPrepareReindex(unittest.TestCase):
+    def _callFUT(self, context, **kw):
+        from opencore.models.catalog import prepare_reindex
+        return prepare_reindex(context, **kw)
+
+    def test_it(self):
+        from zope.interface import directlyProvides
+        from opencore.models.interfaces import ISite
+        L = []
+        site = testing.DummyModel()
+        site.update_indexes = lambda *arg: L.append('updated')
+        site.catalog = catalog = DummyCatalog({})
+        directlyProvides(site, ISite)
+        transaction = DummyTransaction()
+        self._callFUT(site, output=L.append, transaction=transaction)
+        self.assertEqual(L, ['updating indexes', 'updated',
+                             '*** committing ***'])
+        self.assertEqual(len(catalog.reindex_checkpoints), 0)
+        self.assertEqual(transaction.committed, 1)
 
 from repoze.catalog.interfaces import ICatalogIndex
 from zope.interface import implements
@@ -331,6 +945,7 @@ class DummyCatalog(object):
         self.document_map = testing.DummyModel()
         self.document_map.address_to_docid = address_to_docid
         self.reindexed = []
+        self.invalidated = []
 
     def __getitem__(self, k):
         return getattr(self, k)
@@ -338,19 +953,25 @@ class DummyCatalog(object):
     def reindex_doc(self, docid, model):
         self.reindexed.append(docid)
 
+    def invalidate(self, names=None):
+        self.invalidated.append(names)
+
 class DummyTransaction(object):
-    def __init__(self):
+    def __init__(self, on_commit=None):
         self.committed = 0
         self.aborted = 0
+        self.on_commit = on_commit
         
     def commit(self):
+        if self.on_commit is not None:
+            self.on_commit()
         self.committed += 1
 
     def abort(self):
         self.aborted += 1
         
 
-class DummyIndex:
+class DummyIndex(object):
     implements(ICatalogIndex)
     def __init__(self):
         self.indexed = {}
@@ -360,6 +981,9 @@ class DummyIndex:
 
     reindex_doc = index_doc
 
+    def clear(self):
+        self.indexed = {}
+
     def apply(self, *arg, **kw):
         return [1,2,3]
 
@@ -368,3 +992,96 @@ class DummyCache(dict):
     
     def put(self, k, v):
         self[k] = v
+
+class DummyFieldIndex(DummyIndex):
+    # keeps a reverse index of the indexed values, like a field index
+    def __init__(self, ignore=False):
+        DummyIndex.__init__(self)
+        self.ignore = ignore
+        self._rev_index = {}
+
+    def index_doc(self, docid, val):
+        if not self.ignore:
+            self._rev_index[docid] = val
+
+    reindex_doc = index_doc
+
+    def unindex_doc(self, docid):
+        self._rev_index.pop(docid, None)
+
+class DummySortIndex(DummyIndex):
+    def __init__(self):
+        DummyIndex.__init__(self)
+        self.sorted = []
+
+    def sort(self, docids, reverse=False, limit=None, sort_type=None):
+        self.sorted.append((list(docids), reverse, limit))
+        return sorted(docids, reverse=reverse)[:limit]
+
+class DummyChildrenIndex(DummyIndex):
+    sort_names = ('sort',)
+
+    def __init__(self, children=3):
+        DummyIndex.__init__(self)
+        self.children = children
+        self.sorted = []
+
+    def child_count(self, parent):
+        return self.children
+
+    def sorted_children(self, parent, sort_name, docids, reverse=False,
+                        limit=None):
+        self.sorted.append((parent, sort_name, reverse, limit))
+        return sorted(docids, reverse=reverse)[:limit]
+
+class DummyRankedIndex(DummySortIndex):
+    def __init__(self):
+        DummySortIndex.__init__(self)
+        self.ranked = []
+
+    def candidates(self, query):
+        return [1, 2]
+
+    def rank(self, query, docids, limit=None):
+        self.ranked.append((query, list(docids), limit))
+        return sorted(docids, reverse=True)[:limit]
+
+class DummyJar:
+    def register(self, obj):
+        pass
+
+class DummyProfiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+
+    def is_enabled(self):
+        return self.enabled
+
+class DummyChangedGeneration:
+    # a Length written to in the current, uncommitted transaction
+    value = 1
+    _p_jar = DummyJar()
+    _p_changed = True
+
+class DummyPostingsIndex(DummyIndex):
+    # keeps a forward index of term -> docids, like a field index
+    def __init__(self, applied, name, fwd_index):
+        DummyIndex.__init__(self)
+        self.applied = applied
+        self.name = name
+        self._fwd_index = fwd_index
+
+    def documentCount(self):
+        docids = set()
+        for value in self._fwd_index.values():
+            docids.update(value)
+        return len(docids)
+
+    def apply(self, query):
+        from BTrees.IFBTree import IFSet
+        self.applied.append(self.name)
+        return IFSet(self._fwd_index.get(query, ()))
+
+    def apply_intersect(self, query, docids):
+        from BTrees.IFBTree import intersection
+        return intersection(self.apply(query), docids)
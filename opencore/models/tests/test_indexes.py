@@ -0,0 +1,580 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+
+class TestCatalogAllowedIndex(unittest.TestCase):
+
+    def _getTargetClass(self):
+        from opencore.models.indexes import CatalogAllowedIndex
+        return CatalogAllowedIndex
+
+    def _makeOne(self):
+        return self._getTargetClass()(_discriminator)
+
+    def test_class_conforms_to_ICatalogIndex(self):
+        from zope.interface.verify import verifyClass
+        from repoze.catalog.interfaces import ICatalogIndex
+        verifyClass(ICatalogIndex, self._getTargetClass())
+
+    def test_object_conforms_to_ICatalogIndex(self):
+        from zope.interface.verify import verifyObject
+        from repoze.catalog.interfaces import ICatalogIndex
+        verifyObject(ICatalogIndex, self._makeOne())
+
+    def test_bad_discriminator(self):
+        self.assertRaises(ValueError, self._getTargetClass(), object())
+
+    def test_shared_sets_are_stored_once(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a', 'b']))
+        index.index_doc(2, DummyDoc(['b', 'a']))
+        index.index_doc(3, DummyDoc(['a']))
+        self.assertEqual(index.documentCount(), 3)
+        self.assertEqual(index.setCount(), 2)
+        self.assertEqual(index.principals(1), ('a', 'b'))
+        self.assertEqual(index.principals(2), ('a', 'b'))
+        self.assertEqual(index.principals(3), ('a',))
+        self.assertEqual(index.principals(4), None)
+
+    def test_term_count(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a', 'b']))
+        index.index_doc(2, DummyDoc(['b', 'a']))
+        index.index_doc(3, DummyDoc(['b']))
+        self.assertEqual(index.term_count('a'), 2)
+        self.assertEqual(index.term_count('b'), 3)
+        self.assertEqual(index.term_count('c'), 0)
+
+    def test_apply_or(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a', 'b']))
+        index.index_doc(2, DummyDoc(['b', 'c']))
+        index.index_doc(3, DummyDoc(['c']))
+        result = index.apply({'query': ['a', 'b'], 'operator': 'or'})
+        self.assertEqual(list(result), [1, 2])
+        result = index.apply({'query': ['x'], 'operator': 'or'})
+        self.assertEqual(list(result), [])
+
+    def test_apply_and(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a', 'b']))
+        index.index_doc(2, DummyDoc(['b', 'c']))
+        self.assertEqual(list(index.apply({'query': ['a', 'b']})), [1])
+        self.assertEqual(list(index.apply({'query': ['a', 'c']})), [])
+        self.assertEqual(list(index.apply({'query': []})), [])
+
+    def test_apply_string(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a', 'b']))
+        index.index_doc(2, DummyDoc(['b']))
+        self.assertEqual(list(index.apply('b')), [1, 2])
+
+    def test_apply_bad_operator(self):
+        index = self._makeOne()
+        self.assertRaises(TypeError, index.apply,
+                          {'query': ['a'], 'operator': 'xor'})
+
+    def test_apply_intersect(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a']))
+        index.index_doc(2, DummyDoc(['a']))
+        result = index.apply_intersect({'query': ['a'], 'operator': 'or'},
+                                       index.family.IF.Set([2, 3]))
+        self.assertEqual(list(result), [2])
+
+    def test_reindex_releases_unused_set(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a']))
+        index.reindex_doc(1, DummyDoc(['b']))
+        self.assertEqual(index.documentCount(), 1)
+        self.assertEqual(index.setCount(), 1)
+        self.assertEqual(list(index.apply('a')), [])
+        self.assertEqual(list(index.apply('b')), [1])
+        self.failIf('a' in index._principal_sets)
+
+    def test_reindex_same_set(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a']))
+        index.reindex_doc(1, DummyDoc(['a']))
+        self.assertEqual(index.documentCount(), 1)
+        self.assertEqual(list(index.apply('a')), [1])
+
+    def test_unindex_doc(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a']))
+        index.index_doc(2, DummyDoc(['a']))
+        index.unindex_doc(1)
+        index.unindex_doc(3)
+        self.assertEqual(index.documentCount(), 1)
+        self.assertEqual(list(index.apply('a')), [2])
+        index.unindex_doc(2)
+        self.assertEqual(index.setCount(), 0)
+
+    def test_index_empty_unindexes(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a']))
+        index.index_doc(1, DummyDoc([]))
+        self.assertEqual(index.documentCount(), 0)
+
+    def test_index_string_fails(self):
+        index = self._makeOne()
+        self.assertRaises(TypeError, index.index_doc, 1, DummyDoc('abc'))
+
+    def test_not_indexed(self):
+        index = self._makeOne()
+        index.index_doc(1, DummyDoc(['a']))
+        index.index_doc(2, object())
+        self.assertEqual(list(index.docids()), [1, 2])
+        self.assertEqual(list(index.applyNotAny(['a'])), [2])
+
+    def test_copy_from(self):
+        from repoze.catalog.indexes.keyword import CatalogKeywordIndex
+        old = CatalogKeywordIndex(_discriminator)
+        old.index_doc(1, DummyDoc(['a', 'b']))
+        old.index_doc(2, DummyDoc(['b', 'a']))
+        old.index_doc(3, object())
+        index = self._makeOne()
+        index.copy_from(old)
+        self.assertEqual(index.setCount(), 1)
+        self.assertEqual(list(index.apply('a')), [1, 2])
+        self.assertEqual(list(index.docids()), [1, 2, 3])
+
+
+class TestCatalogDateIndex(unittest.TestCase):
+
+    def _getTargetClass(self):
+        from opencore.models.indexes import CatalogDateIndex
+        return CatalogDateIndex
+
+    def _makeOne(self, delta_size=None, **docs):
+        index = self._getTargetClass()(_date_discriminator)
+        if delta_size is not None:
+            index.delta_size = delta_size
+        for docid, value in docs.items():
+            index.index_doc(int(docid[1:]), DummyDated(value))
+        return index
+
+    def _makeIndexed(self, delta_size=None):
+        return self._makeOne(delta_size, d1=30, d2=10, d3=20, d4=10, d5=40)
+
+    def test_class_conforms_to_ICatalogIndex(self):
+        from zope.interface.verify import verifyClass
+        from repoze.catalog.interfaces import ICatalogIndex
+        verifyClass(ICatalogIndex, self._getTargetClass())
+
+    def test_presorted_from_log(self):
+        index = self._makeIndexed()
+        self.assertEqual(len(index._order), 0)
+        self.assertEqual(list(index.presorted()), [2, 4, 3, 1, 5])
+        self.assertEqual(list(index.presorted(True)), [5, 1, 3, 4, 2])
+
+    def test_presorted_merged(self):
+        index = self._makeIndexed(delta_size=2)
+        self.failUnless(len(index._order) >= 2)
+        self.assertEqual(list(index.presorted()), [2, 4, 3, 1, 5])
+        self.assertEqual(list(index.presorted(True)), [5, 1, 3, 4, 2])
+        index.merge()
+        self.assertEqual(list(index._order.docids), [2, 4, 3, 1, 5])
+        self.assertEqual(list(index._order.values), [10, 10, 20, 30, 40])
+        self.assertEqual(len(index._stale), 0)
+
+    def test_reindex_and_unindex_after_merge(self):
+        index = self._makeIndexed()
+        index.merge()
+        index.reindex_doc(2, DummyDated(35))
+        index.unindex_doc(5)
+        index.index_doc(6, DummyDated(5))
+        self.assertEqual(list(index.presorted()), [6, 4, 3, 1, 2])
+        self.assertEqual(list(index.applyInRange(10, 35)), [1, 2, 3, 4])
+        index.merge()
+        self.assertEqual(list(index._order.docids), [6, 4, 3, 1, 2])
+
+    def test_unindex_by_missing_value(self):
+        index = self._makeIndexed()
+        index.merge()
+        index.index_doc(3, object())
+        self.assertEqual(list(index.presorted()), [2, 4, 1, 5])
+        self.assertEqual(list(index.applyInRange(None, None)), [1, 2, 4, 5])
+
+    def test_range(self):
+        index = self._makeIndexed()
+        index.merge()
+        index.index_doc(6, DummyDated(20))
+        self.assertEqual(list(index.applyInRange(10, 20)), [2, 3, 4, 6])
+        self.assertEqual(list(index.applyInRange(10, 20, excludemin=True)),
+                         [3, 6])
+        self.assertEqual(list(index.applyInRange(10, 20, excludemax=True)),
+                         [2, 4])
+        self.assertEqual(list(index.applyGe(30)), [1, 5])
+        self.assertEqual(list(index.applyLt(20)), [2, 4])
+
+    def test_apply(self):
+        from repoze.catalog import RangeValue
+        index = self._makeIndexed()
+        index.merge()
+        self.assertEqual(list(index.apply((15, 30))), [1, 3])
+        self.assertEqual(list(index.apply(10)), [2, 4])
+        query = {'query': [RangeValue(None, 10), 40], 'operator': 'or'}
+        self.assertEqual(list(index.apply(query)), [2, 4, 5])
+        query = {'query': [RangeValue(10, 30), 30], 'operator': 'and'}
+        self.assertEqual(list(index.apply(query)), [1])
+
+    def test_sort_by_scanning(self):
+        index = self._makeIndexed()
+        index.merge()
+        docids = index.family.IF.Set([1, 2, 3, 4, 5])
+        self.assertEqual(list(index.sort(docids)), [2, 4, 3, 1, 5])
+        self.assertEqual(list(index.sort(docids, reverse=True, limit=2)),
+                         [5, 1])
+
+    def test_sort_small_result_set(self):
+        index = self._makeIndexed()
+        for docid in range(100, 200):
+            index.index_doc(docid, DummyDated(docid))
+        docids = index.family.IF.Set([5, 1, 3])
+        self.assertEqual(list(index.sort(docids)), [3, 1, 5])
+        self.assertEqual(list(index.sort(docids, reverse=True)), [5, 1, 3])
+
+    def test_sort_empty(self):
+        index = self._makeIndexed()
+        self.assertEqual(list(index.sort(index.family.IF.Set())), [])
+
+    def test_sort_bad_limit(self):
+        index = self._makeIndexed()
+        self.assertRaises(ValueError, index.sort,
+                          index.family.IF.Set([1]), limit=0)
+
+    def test_copy_from(self):
+        from repoze.catalog.indexes.field import CatalogFieldIndex
+        old = CatalogFieldIndex(_date_discriminator)
+        old.index_doc(1, DummyDated(20))
+        old.index_doc(2, DummyDated(10))
+        old.index_doc(3, object())
+        index = self._makeOne()
+        index.copy_from(old)
+        self.assertEqual(list(index._order.docids), [2, 1])
+        self.assertEqual(list(index.docids()), [1, 2, 3])
+
+
+class TestCatalogPrefixIndex(unittest.TestCase):
+
+    def _getTargetClass(self):
+        from opencore.models.indexes import CatalogPrefixIndex
+        return CatalogPrefixIndex
+
+    def _makeOne(self, words=False, **docs):
+        index = self._getTargetClass()(_name_discriminator, words)
+        for docid, name in docs.items():
+            index.index_doc(int(docid[1:]), DummyNamed(name))
+        return index
+
+    def _makeIndexed(self, words=False):
+        return self._makeOne(words, d1='Bob Smith', d2='Alice  Jones',
+                             d3='alice smithers', d4='Carol Alison')
+
+    def test_class_conforms_to_ICatalogIndex(self):
+        from zope.interface.verify import verifyClass
+        from repoze.catalog.interfaces import ICatalogIndex
+        verifyClass(ICatalogIndex, self._getTargetClass())
+
+    def test_apply_whole_name(self):
+        index = self._makeIndexed()
+        self.assertEqual(list(index.apply('ali')), [2, 3])
+        self.assertEqual(list(index.apply('Alice J')), [2])
+        self.assertEqual(list(index.apply('smi')), [])
+        self.assertEqual(list(index.apply('')), [1, 2, 3, 4])
+
+    def test_apply_words(self):
+        index = self._makeIndexed(words=True)
+        self.assertEqual(list(index.apply('ali')), [2, 3, 4])
+        self.assertEqual(list(index.apply('smi*')), [1, 3])
+        self.assertEqual(list(index.apply('ali smith')), [3])
+        self.assertEqual(list(index.apply('dave')), [])
+
+    def test_apply_operator(self):
+        index = self._makeIndexed(words=True)
+        query = {'query': ['bob', 'carol'], 'operator': 'or'}
+        self.assertEqual(list(index.apply(query)), [1, 4])
+        query = {'query': ['bob', 'carol']}
+        self.assertEqual(list(index.apply(query)), [])
+        self.assertRaises(TypeError, index.apply,
+                          {'query': ['a', 'b'], 'operator': 'xor'})
+
+    def test_reindex_and_unindex(self):
+        index = self._makeIndexed(words=True)
+        index.reindex_doc(1, DummyNamed('Robert Smith'))
+        index.unindex_doc(3)
+        index.unindex_doc(5)
+        self.assertEqual(index.documentCount(), 3)
+        self.assertEqual(list(index.apply('bob')), [])
+        self.assertEqual(list(index.apply('rob')), [1])
+        self.assertEqual(list(index.apply('smith')), [1])
+        self.failIf(u'smithers' in index._terms)
+
+    def test_index_non_string_fails(self):
+        index = self._makeOne()
+        self.assertRaises(TypeError, index.index_doc, 1, DummyNamed(1))
+
+    def test_not_indexed(self):
+        index = self._makeIndexed()
+        index.index_doc(2, object())
+        self.assertEqual(list(index.apply('ali')), [3])
+        self.assertEqual(list(index.docids()), [1, 2, 3, 4])
+
+    def test_sort_by_scanning(self):
+        index = self._makeIndexed(words=True)
+        docids = index.family.IF.Set([1, 2, 3, 4])
+        self.assertEqual(list(index.sort(docids)), [2, 3, 1, 4])
+        self.assertEqual(list(index.sort(docids, limit=2)), [2, 3])
+        self.assertEqual(list(index.sort(docids, reverse=True)),
+                         [4, 1, 3, 2])
+
+    def test_sort_small_result_set(self):
+        index = self._makeIndexed()
+        for docid in range(100, 200):
+            index.index_doc(docid, DummyNamed('name %d' % docid))
+        docids = index.family.IF.Set([1, 4, 3])
+        self.assertEqual(list(index.sort(docids)), [3, 1, 4])
+        self.assertEqual(list(index.sort(docids, limit=1)), [3])
+        self.assertEqual(list(index.sort(docids, reverse=True, limit=2)),
+                         [4, 1])
+
+    def test_sort_bad_limit(self):
+        index = self._makeIndexed()
+        self.assertRaises(ValueError, index.sort,
+                          index.family.IF.Set([1]), limit=0)
+
+class TestCatalogChildrenIndex(unittest.TestCase):
+
+    def _getTargetClass(self):
+        from opencore.models.indexes import CatalogChildrenIndex
+        return CatalogChildrenIndex
+
+    def _makeOne(self):
+        index = self._getTargetClass()(_parent_discriminator,
+                                       {'title': _name_discriminator})
+        index.index_doc(1, DummyChild('/a', 'carol'))
+        index.index_doc(2, DummyChild('/a', 'alice'))
+        index.index_doc(3, DummyChild('/b', 'bob'))
+        index.index_doc(4, DummyChild('/a', 'bob'))
+        index.index_doc(5, DummyChild('/a/b'))
+        return index
+
+    def test_class_conforms_to_ICatalogIndex(self):
+        from zope.interface.verify import verifyClass
+        from repoze.catalog.interfaces import ICatalogIndex
+        verifyClass(ICatalogIndex, self._getTargetClass())
+
+    def test_apply(self):
+        index = self._makeOne()
+        self.assertEqual(list(index.apply('/a')), [1, 2, 4])
+        self.assertEqual(list(index.apply(['/b', '/a/b'])), [3, 5])
+        self.assertEqual(list(index.apply({'query': '/c'})), [])
+        self.assertRaises(TypeError, index.apply,
+                          {'query': '/a', 'operator': 'and'})
+
+    def test_reindex_and_unindex(self):
+        index = self._makeOne()
+        index.reindex_doc(1, DummyChild('/b', 'carol'))
+        index.reindex_doc(4, DummyChild('/a', 'zed'))
+        index.unindex_doc(3)
+        index.unindex_doc(6)
+        self.assertEqual(index.documentCount(), 4)
+        self.assertEqual(list(index.apply('/a')), [2, 4])
+        self.assertEqual(list(index.apply('/b')), [1])
+        self.assertEqual(list(index.sorted_children('/a', 'title')), [2, 4])
+        self.assertEqual(list(index.sorted_children('/b', 'title')), [1])
+
+    def test_child_count(self):
+        index = self._makeOne()
+        self.assertEqual(index.child_count('/a'), 3)
+        index.reindex_doc(1, DummyChild('/b', 'carol'))
+        index.unindex_doc(3)
+        self.assertEqual(index.child_count('/a'), 2)
+        self.assertEqual(index.child_count('/b'), 1)
+        index.unindex_doc(1)
+        self.assertEqual(index.child_count('/b'), 0)
+        self.assertEqual(index.child_count('/c'), 0)
+
+    def test_not_indexed(self):
+        index = self._makeOne()
+        index.index_doc(2, object())
+        self.assertEqual(list(index.apply('/a')), [1, 4])
+        self.assertEqual(list(index.docids()), [1, 2, 3, 4, 5])
+
+    def test_sorted_children(self):
+        index = self._makeOne()
+        self.assertEqual(list(index.sorted_children('/a', 'title')),
+                         [2, 4, 1])
+        self.assertEqual(list(index.sorted_children('/a', 'title',
+                                                    reverse=True)),
+                         [1, 4, 2])
+        self.assertEqual(list(index.sorted_children('/a', 'title', [1, 2],
+                                                    limit=1)),
+                         [2])
+        self.assertEqual(list(index.sorted_children('/a/b', 'title')), [5])
+        self.assertEqual(list(index.sorted_children('/c', 'title')), [])
+
+    def test_sorted_children_bad_limit(self):
+        index = self._makeOne()
+        self.assertRaises(ValueError, list,
+                          index.sorted_children('/a', 'title', limit=0))
+
+class TestCatalogRankedTextIndex(unittest.TestCase):
+
+    def _getTargetClass(self):
+        from opencore.models.indexes import CatalogRankedTextIndex
+        return CatalogRankedTextIndex
+
+    def _makeOne(self):
+        index = self._getTargetClass()(_text_discriminator)
+        for docid, text in enumerate(TEXTS):
+            index.index_doc(docid + 1, DummyText(text))
+        return index
+
+    def _ranked(self, index, query, limit=None):
+        return index.rank(query, index.candidates(query), limit=limit)
+
+    def _sorted(self, index, query, limit=None):
+        return list(index.sort(index.apply(query), limit=limit))
+
+    def test_class_conforms_to_ICatalogIndex(self):
+        from zope.interface.verify import verifyClass
+        from repoze.catalog.interfaces import ICatalogIndex
+        verifyClass(ICatalogIndex, self._getTargetClass())
+
+    def test_candidates(self):
+        index = self._makeOne()
+        self.assertEqual(list(index.candidates('fox')), [1, 2, 4, 5])
+        self.assertEqual(list(index.candidates('fox dog')), [1, 4])
+        self.assertEqual(list(index.candidates('fox and dog')), [1, 4])
+        self.assertEqual(list(index.candidates('cat or dog')), [1, 3, 4])
+        self.assertEqual(list(index.candidates('fox zebra')), [])
+
+    def test_candidates_other_queries_are_scored(self):
+        index = self._makeOne()
+        result = index.candidates('"quick brown"')
+        self.failUnless(hasattr(result, 'items'))
+        self.assertEqual(list(result.keys()), [1])
+
+    def test_rank_matches_sort(self):
+        index = self._makeOne()
+        for query in ('fox', 'fox dog', 'cat or dog', 'lazy', 'quick fox'):
+            expected = self._sorted(index, query)
+            self.assertEqual(self._ranked(index, query), expected)
+            for limit in (1, 2, 3):
+                self.assertEqual(self._ranked(index, query, limit),
+                                 expected[:limit])
+
+    def test_rank_skips_blocks_which_cant_win(self):
+        from opencore.models.indexes import BLOCK_SHIFT
+        index = self._makeOne()
+        # a long document in a block of its own
+        far = 5 << BLOCK_SHIFT
+        index.index_doc(far, DummyText('fox ' + 'filler ' * 50))
+        scored = []
+        postings = index.index._wordinfo
+        class Recording(dict):
+            def get(self, docid, default=None):
+                scored.append(docid)
+                return dict.get(self, docid, default)
+        wid = index.lexicon.termToWordIds('fox')[0]
+        postings[wid] = Recording(postings[wid])
+        docids = index.candidates('fox')
+        self.assertEqual(index.rank('fox', docids, limit=2),
+                         self._sorted(index, 'fox', 2))
+        self.failIf(far in scored)
+
+    def test_rank_scored_result(self):
+        index = self._makeOne()
+        result = index.apply('fox')
+        self.assertEqual(index.rank('fox', result, limit=2),
+                         self._sorted(index, 'fox', 2))
+
+    def test_rank_bad_limit(self):
+        index = self._makeOne()
+        self.assertRaises(ValueError, index.rank, 'fox',
+                          index.candidates('fox'), limit=0)
+
+    def test_bounds_after_reindex_and_unindex(self):
+        index = self._makeOne()
+        index.reindex_doc(2, DummyText('fox fox fox fox'))
+        index.unindex_doc(1)
+        self.assertEqual(self._ranked(index, 'fox'),
+                         self._sorted(index, 'fox'))
+        self.assertEqual(self._ranked(index, 'fox', 1), [2])
+
+    def test_copy_from(self):
+        from repoze.catalog.indexes.text import CatalogTextIndex
+        old = CatalogTextIndex(_text_discriminator)
+        for docid, text in enumerate(TEXTS):
+            old.index_doc(docid + 1, DummyText(text))
+        index = self._getTargetClass()(_text_discriminator)
+        index.copy_from(old)
+        self.assertEqual(list(index._bounds.keys()),
+                         list(self._makeOne()._bounds.keys()))
+        self.assertEqual(self._ranked(index, 'fox dog'),
+                         self._sorted(index, 'fox dog'))
+
+
+def _discriminator(obj, default):
+    return getattr(obj, 'principals', default)
+
+class DummyDoc:
+    def __init__(self, principals):
+        self.principals = principals
+
+def _date_discriminator(obj, default):
+    return getattr(obj, 'date', default)
+
+class DummyDated:
+    def __init__(self, date):
+        self.date = date
+
+def _name_discriminator(obj, default):
+    return getattr(obj, 'name', default)
+
+class DummyNamed:
+    def __init__(self, name):
+        self.name = name
+
+def _parent_discriminator(obj, default):
+    return getattr(obj, 'parent', default)
+
+class DummyChild:
+    def __init__(self, parent, name=None):
+        self.parent = parent
+        if name is not None:
+            self.name = name
+
+TEXTS = [
+    'the quick brown fox jumps over the lazy dog',
+    'a fox',
+    'the cat sat on the mat',
+    'fox fox dog',
+    'a very long story about a fox and many other animals of the woods',
+    ]
+
+def _text_discriminator(obj, default):
+    return getattr(obj, 'text', default)
+
+class DummyText:
+    def __init__(self, text):
+        self.text = text
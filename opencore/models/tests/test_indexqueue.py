@@ -0,0 +1,172 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+
+from repoze.bfg import testing
+
+class TestIndexingQueue(unittest.TestCase):
+    def _getTargetClass(self):
+        from opencore.models.indexqueue import IndexingQueue
+        return IndexingQueue
+
+    def _makeOne(self):
+        return self._getTargetClass()()
+
+    def test_empty(self):
+        queue = self._makeOne()
+        self.failIf(queue)
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.pop(), [])
+
+    def test_latest_operation_wins(self):
+        from opencore.models.indexqueue import INDEX
+        from opencore.models.indexqueue import UNINDEX
+        queue = self._makeOne()
+        queue.index(1)
+        queue.unindex(1)
+        queue.index(2)
+        self.failUnless(queue)
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.pop(), [(1, UNINDEX), (2, INDEX)])
+        self.assertEqual(len(queue), 0)
+
+    def test_pop_limit(self):
+        from opencore.models.indexqueue import INDEX
+        queue = self._makeOne()
+        queue.index(1)
+        queue.index(2)
+        self.assertEqual(queue.pop(1), [(1, INDEX)])
+        self.assertEqual(queue.pop(1), [(2, INDEX)])
+
+    def test_pop_docids(self):
+        from opencore.models.indexqueue import INDEX
+        from opencore.models.indexqueue import UNINDEX
+        queue = self._makeOne()
+        queue.index(1)
+        queue.unindex(2)
+        queue.index(3)
+        self.assertEqual(queue.pop_docids([4, 2, 1]),
+                         [(1, INDEX), (2, UNINDEX)])
+        self.assertEqual(queue.pop(), [(3, INDEX)])
+
+    def test_queued_docids(self):
+        import transaction
+        from opencore.models.indexqueue import queued_docids
+        transaction.abort()
+        queue = self._makeOne()
+        queue.index(1)
+        queue.unindex(2)
+        self.assertEqual(queued_docids(), set([1, 2]))
+        transaction.abort()
+        self.assertEqual(queued_docids(), set())
+
+class TestFindIndexingQueue(unittest.TestCase):
+    def setUp(self):
+        testing.cleanUp()
+
+    def tearDown(self):
+        testing.cleanUp()
+
+    def _callFUT(self, context, **kw):
+        from opencore.models.indexqueue import find_indexing_queue
+        return find_indexing_queue(context, **kw)
+
+    def test_no_catalog(self):
+        context = testing.DummyModel()
+        self.assertEqual(self._callFUT(context, create=True), None)
+
+    def test_no_queue(self):
+        context = testing.DummyModel()
+        context.catalog = DummyCatalog()
+        self.assertEqual(self._callFUT(context), None)
+
+    def test_create_not_deferred(self):
+        context = testing.DummyModel()
+        context.catalog = DummyCatalog()
+        self.assertEqual(self._callFUT(context, create=True), None)
+        self.failIf(hasattr(context.catalog, 'indexing_queue'))
+
+    def test_create_deferred(self):
+        from opencore.testing import registerSettings
+        from opencore.models.indexqueue import IndexingQueue
+        registerSettings(deferred_indexing='true')
+        context = testing.DummyModel()
+        context.catalog = DummyCatalog()
+        queue = self._callFUT(context, create=True)
+        self.failUnless(isinstance(queue, IndexingQueue))
+        self.failUnless(context.catalog.indexing_queue is queue)
+        self.failUnless(self._callFUT(context, create=True) is queue)
+
+class TestProcessIndexingQueue(unittest.TestCase):
+    def setUp(self):
+        testing.cleanUp()
+
+    def tearDown(self):
+        testing.cleanUp()
+
+    def _callFUT(self, context, limit=None):
+        from opencore.models.indexqueue import process_indexing_queue
+        return process_indexing_queue(context, limit)
+
+    def test_no_queue(self):
+        context = testing.DummyModel()
+        context.catalog = DummyCatalog()
+        self.assertEqual(self._callFUT(context), 0)
+
+    def test_it(self):
+        from opencore.models.indexqueue import IndexingQueue
+        a = testing.DummyModel()
+        testing.registerModels({'/a':a})
+        context = testing.DummyModel()
+        catalog = context.catalog = DummyCatalog({1:'/a', 2:'/gone'})
+        queue = catalog.indexing_queue = IndexingQueue()
+        queue.index(1)
+        queue.index(2)
+        queue.index(3)
+        queue.unindex(4)
+        self.assertEqual(self._callFUT(context), 4)
+        self.assertEqual(catalog.reindexed, [a])
+        self.assertEqual(catalog.unindexed, [4])
+        self.assertEqual(len(queue), 0)
+
+    def test_limit(self):
+        from opencore.models.indexqueue import IndexingQueue
+        context = testing.DummyModel()
+        catalog = context.catalog = DummyCatalog()
+        queue = catalog.indexing_queue = IndexingQueue()
+        queue.unindex(1)
+        queue.unindex(2)
+        self.assertEqual(self._callFUT(context, 1), 1)
+        self.assertEqual(catalog.unindexed, [1])
+        self.assertEqual(len(queue), 1)
+
+    def test_docids(self):
+        from opencore.models.indexqueue import IndexingQueue
+        from opencore.models.indexqueue import process_indexing_queue
+        context = testing.DummyModel()
+        catalog = context.catalog = DummyCatalog()
+        queue = catalog.indexing_queue = IndexingQueue()
+        queue.unindex(1)
+        queue.unindex(2)
+        self.assertEqual(process_indexing_queue(context, docids=[2, 3]), 1)
+        self.assertEqual(catalog.unindexed, [2])
+        self.assertEqual(len(queue), 1)
+
+from opencore.testing import DummyCatalog
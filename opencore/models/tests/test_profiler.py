@@ -0,0 +1,177 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+
+from repoze.bfg import testing
+
+class TestQueryShape(unittest.TestCase):
+    def _callFUT(self, query):
+        from opencore.models.profiler import query_shape
+        return query_shape(query)
+
+    def test_values_are_placeholders(self):
+        self.assertEqual(self._callFUT({'creator': 'me', 'limit': 10}),
+                         'creator=? limit=?')
+        self.assertEqual(self._callFUT({'creator': 'you', 'limit': 20}),
+                         'creator=? limit=?')
+
+    def test_sequences_and_dicts(self):
+        self.assertEqual(
+            self._callFUT({'interfaces': [1, 2],
+                           'path': {'query': '/a', 'depth': 1},
+                           'allowed': {'query': [1], 'operator': 'or'}}),
+            'allowed={operator=or,query} interfaces=[?] path={depth,query}')
+
+    def test_sort_parameters_are_literal(self):
+        self.assertEqual(
+            self._callFUT({'sort_index': 'title', 'reverse': True}),
+            "reverse=True sort_index='title'")
+
+class TestHistogram(unittest.TestCase):
+    def _makeOne(self, precision=5):
+        from opencore.models.profiler import Histogram
+        return Histogram(precision)
+
+    def test_empty(self):
+        histogram = self._makeOne()
+        self.assertEqual(histogram.percentile(50), None)
+        self.assertEqual(histogram.summary(), {'count': 0})
+
+    def test_small_values_exact(self):
+        histogram = self._makeOne()
+        for value in range(1, 11):
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(50), 5)
+        self.assertEqual(histogram.percentile(95), 10)
+        self.assertEqual(histogram.percentile(100), 10)
+        self.assertEqual(histogram.min, 1)
+
+    def test_large_values_within_precision(self):
+        histogram = self._makeOne()
+        for value in range(1000, 101000, 1000):
+            histogram.record(value)
+        for percent in (50, 95, 99):
+            expected = percent * 1000
+            value = histogram.percentile(percent)
+            self.failUnless(abs(value - expected) <= expected / 32.0,
+                            (percent, value))
+        self.failUnless(len(histogram.buckets) < 100)
+
+    def test_summary(self):
+        histogram = self._makeOne()
+        histogram.record(2)
+        histogram.record(4)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['mean'], 3.0)
+        self.assertEqual(summary['max'], 4)
+
+class TestQueryProfiler(unittest.TestCase):
+    def setUp(self):
+        testing.cleanUp()
+
+    def tearDown(self):
+        testing.cleanUp()
+
+    def _makeOne(self):
+        from opencore.models.profiler import QueryProfiler
+        return QueryProfiler()
+
+    def test_disabled_by_default(self):
+        profiler = self._makeOne()
+        profiler(DummyQueryEvent())
+        self.assertEqual(profiler.snapshot()['shapes'], {})
+
+    def test_configure_by_utility(self):
+        from repoze.bfg.interfaces import ISettings
+        testing.registerUtility(DummySettings(), ISettings)
+        profiler = self._makeOne()
+        profiler(DummyQueryEvent())
+        self.assertEqual(profiler.enabled, True)
+        self.assertEqual(profiler.snapshot()['shapes'].keys(), ['creator=?'])
+
+    def test_is_enabled_configures(self):
+        from repoze.bfg.interfaces import ISettings
+        profiler = self._makeOne()
+        self.assertEqual(profiler.is_enabled(), False)
+        testing.registerUtility(DummySettings(), ISettings)
+        self.assertEqual(profiler.is_enabled(), True)
+
+    def test_records_by_shape(self):
+        profiler = self._makeOne()
+        profiler.configure(DummySettings())
+        profiler(DummyQueryEvent(cached=False))
+        profiler(DummyQueryEvent(cached=True))
+        profiler(DummyQueryEvent(query={'creator': 'you'}))
+        shapes = profiler.snapshot()['shapes']
+        shape = shapes['creator=?']
+        self.assertEqual(shape['hits'], 1)
+        self.assertEqual(shape['misses'], 1)
+        self.assertEqual(shape['duration_us']['count'], 3)
+        self.assertEqual(shape['duration_us']['p50'], 400000)
+        self.assertEqual(shape['sort_us']['count'], 2)
+        self.assertEqual(shape['indexes']['creator']['apply_us']['count'], 2)
+        self.assertEqual(shape['indexes']['creator']['size']['max'], 1)
+
+    def test_reset(self):
+        profiler = self._makeOne()
+        profiler.configure(DummySettings())
+        profiler(DummyQueryEvent())
+        profiler.reset()
+        self.assertEqual(profiler.snapshot()['shapes'], {})
+
+    def test_flush(self):
+        import os
+        import shutil
+        import simplejson
+        import tempfile
+        d = tempfile.mkdtemp()
+        try:
+            profiler = self._makeOne()
+            profiler.configure(DummySettings(d))
+            profiler._flusher_pid = os.getpid() # no background thread
+            profiler(DummyQueryEvent())
+            profiler.flush()
+            names = os.listdir(d)
+            self.assertEqual(names, ['query-profile-%d.json' % os.getpid()])
+            f = open(os.path.join(d, names[0]))
+            try:
+                data = simplejson.load(f)
+            finally:
+                f.close()
+            self.assertEqual(data['shapes'].keys(), ['creator=?'])
+        finally:
+            shutil.rmtree(d)
+
+class DummyQueryEvent:
+    def __init__(self, query=None, cached=None):
+        if query is None:
+            query = {'creator': 'me'}
+        self.query = query
+        self.cached = cached
+        self.duration = 0.4
+        self.result = (1, [99])
+        self.timings = [('creator', 0.1, 1)]
+        self.sort_time = 0.2
+
+class DummySettings:
+    def __init__(self, profile_dir=None):
+        self.query_profile = 'true'
+        self.query_profile_dir = profile_dir
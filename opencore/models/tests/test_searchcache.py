@@ -0,0 +1,118 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+
+from repoze.bfg import testing
+
+class TestSQLiteSearchCache(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        testing.cleanUp()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        testing.cleanUp()
+        shutil.rmtree(self.tmpdir)
+
+    def _getTargetClass(self):
+        from opencore.models.searchcache import SQLiteSearchCache
+        return SQLiteSearchCache
+
+    def _makeOne(self, **kw):
+        import os
+        path = os.path.join(self.tmpdir, 'cache.db')
+        return self._getTargetClass()(path, **kw)
+
+    def test_class_conforms_to_ISharedCatalogSearchCache(self):
+        from zope.interface.verify import verifyClass
+        from opencore.models.interfaces import ISharedCatalogSearchCache
+        verifyClass(ISharedCatalogSearchCache, self._getTargetClass())
+
+    def test_get_miss(self):
+        cache = self._makeOne()
+        self.assertEqual(cache.get('key'), None)
+        self.assertEqual(cache.get('key', 'default'), 'default')
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.hits, 0)
+
+    def test_put_get(self):
+        cache = self._makeOne()
+        cache.put('key', (3, [1, 2, 3]))
+        self.assertEqual(cache.get('key'), (3, [1, 2, 3]))
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_shared_between_instances(self):
+        one = self._makeOne()
+        two = self._makeOne()
+        one.put('key', (1, [1]))
+        self.assertEqual(two.get('key'), (1, [1]))
+
+    def test_put_replaces(self):
+        cache = self._makeOne()
+        cache.put('key', ((('dummy', 1),), 1))
+        cache.put('key', ((('dummy', 2),), 3))
+        self.assertEqual(cache.get('key'), ((('dummy', 2),), 3))
+        self.assertEqual(len(cache), 1)
+
+    def test_prune(self):
+        cache = self._makeOne(maxsize=2, prune_interval=1)
+        cache.put('a', (1, [1]))
+        cache.put('b', (1, [2]))
+        cache.put('a', (1, [3]))
+        cache.put('c', (1, [4]))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), (1, [3]))
+
+    def test_clear(self):
+        cache = self._makeOne()
+        cache.put('key', (1, [1]))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_configure_by_utility(self):
+        import os
+        from repoze.bfg.interfaces import ISettings
+        path = os.path.join(self.tmpdir, 'configured.db')
+        testing.registerUtility(DummySettings(path), ISettings)
+        cache = self._getTargetClass()()
+        cache.put('key', (1, [1]))
+        self.assertEqual(cache.path, path)
+        self.assertEqual(cache.get('key'), (1, [1]))
+        self.failUnless(os.path.exists(path))
+
+    def test_unconfigured_is_disabled(self):
+        cache = self._getTargetClass()()
+        cache.put('key', (1, [1]))
+        self.assertEqual(cache.get('key'), None)
+        self.assertEqual(len(cache), 0)
+
+    def test_database_error_is_a_miss(self):
+        cache = self._makeOne()
+        cache.put('key', (1, [1]))
+        cache._local.conn.close()
+        self.assertEqual(cache.get('key'), None)
+        cache.put('key', (1, [1])) # doesn't blow up
+
+class DummySettings:
+    def __init__(self, path):
+        self.catalog_cache_file = path
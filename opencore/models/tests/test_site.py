@@ -158,20 +158,59 @@ class SiteTests(unittest.TestCase):
         for index_name, type_name in (('name', 'CatalogFieldIndex'),
                                       ('title', 'CatalogFieldIndex'),
                                       ('interfaces', 'CatalogKeywordIndex'),
-                                      ('texts', 'CatalogTextIndex'),
+                                      ('texts', 'CatalogRankedTextIndex'),
                                       ('path', 'CatalogPathIndex2'),
-                                      ('creation_date', 'CatalogFieldIndex'),
-                                      ('modified_date', 'CatalogFieldIndex'),
-                                      ('content_modified', 'CatalogFieldIndex'),
-                                      ('publication_date', 'CatalogFieldIndex'),
-                                      ('start_date', 'CatalogFieldIndex'),
-                                      ('end_date', 'CatalogFieldIndex'),
+                                      ('parent', 'CatalogChildrenIndex'),
+                                      ('allowed', 'CatalogAllowedIndex'),
+                                      ('creation_date', 'CatalogDateIndex'),
+                                      ('modified_date', 'CatalogDateIndex'),
+                                      ('content_modified', 'CatalogDateIndex'),
+                                      ('publication_date', 'CatalogDateIndex'),
+                                      ('start_date', 'CatalogDateIndex'),
+                                      ('end_date', 'CatalogDateIndex'),
                                       ('mimetype', 'CatalogFieldIndex'),
                                       ('email', 'CatalogFieldIndex'),
+                                      ('member_name', 'CatalogPrefixIndex'),
+                                      ('titlestartswith',
+                                       'CatalogPrefixIndex'),
                                      ):
             index = site.catalog[index_name]
             self.assertEqual(index.__class__.__name__, type_name)
 
+    def test_update_indexes_converts_allowed_keyword_index(self):
+        from repoze.catalog.indexes.keyword import CatalogKeywordIndex
+        self._registerUtilities()
+        site = self._makeOne()
+        old = CatalogKeywordIndex('allowed')
+        old.index_doc(1, testing.DummyModel(allowed=['b', 'a']))
+        site.catalog['allowed'] = old
+        site.update_indexes()
+        index = site.catalog['allowed']
+        self.assertEqual(index.__class__.__name__, 'CatalogAllowedIndex')
+        self.assertEqual(index.principals(1), ('a', 'b'))
+
+    def test_update_indexes_replaces_member_name_text_index(self):
+        from repoze.catalog.indexes.text import CatalogTextIndex
+        self._registerUtilities()
+        site = self._makeOne()
+        site.catalog['member_name'] = CatalogTextIndex('member_name')
+        site.update_indexes()
+        index = site.catalog['member_name']
+        self.assertEqual(index.__class__.__name__, 'CatalogPrefixIndex')
+        self.assertEqual(index.documentCount(), 0)
+
+    def test_update_indexes_converts_texts_index(self):
+        from repoze.catalog.indexes.text import CatalogTextIndex
+        self._registerUtilities()
+        site = self._makeOne()
+        old = CatalogTextIndex('text')
+        old.index_doc(1, testing.DummyModel(text='hello world'))
+        site.catalog['texts'] = old
+        site.update_indexes()
+        index = site.catalog['texts']
+        self.assertEqual(index.__class__.__name__, 'CatalogRankedTextIndex')
+        self.assertEqual(list(index.candidates('hello')), [1])
+
     def test_verify_constructor(self):
         self._registerUtilities()
         site = self._makeOne()
@@ -308,6 +347,22 @@ class TestGetPath(unittest.TestCase):
         result = self._callFUT(context, None)
         self.assertEqual(result, '/')
 
+class TestGetParentPath(unittest.TestCase):
+    def _callFUT(self, object, default):
+        from opencore.models.site import get_parent_path
+        return get_parent_path(object, default)
+
+    def test_it(self):
+        root = testing.DummyModel()
+        root['a'] = folder = testing.DummyModel()
+        folder['b'] = context = testing.DummyModel()
+        self.assertEqual(self._callFUT(context, None), '/a')
+        self.assertEqual(self._callFUT(folder, None), '/')
+
+    def test_root(self):
+        context = testing.DummyModel()
+        self.assertEqual(self._callFUT(context, None), None)
+
 class TestGetInterfaces(unittest.TestCase):
     def _callFUT(self, object, default):
         from opencore.models.site import get_interfaces
@@ -0,0 +1,279 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+import unittest
+
+from repoze.bfg import testing
+
+class SnapshotTestBase(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        testing.cleanUp()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        testing.cleanUp()
+        shutil.rmtree(self.tmpdir)
+
+    def _path(self, name='catalog.snapshot'):
+        import os
+        return os.path.join(self.tmpdir, name)
+
+    def _makeCatalog(self):
+        from repoze.catalog.document import DocumentMap
+        from repoze.catalog.indexes.field import CatalogFieldIndex
+        from repoze.catalog.indexes.keyword import CatalogKeywordIndex
+        from repoze.catalog.indexes.path2 import CatalogPathIndex2
+        from opencore.models.catalog import CachingCatalog
+        from opencore.models.indexes import CatalogAllowedIndex
+        from opencore.models.indexes import CatalogDateIndex
+        catalog = CachingCatalog()
+        catalog._p_oid = 'oid'
+        catalog.snapshots = DummyLoader(None)
+        catalog.document_map = DocumentMap()
+        catalog['interfaces'] = CatalogKeywordIndex('interfaces')
+        catalog['allowed'] = CatalogAllowedIndex('allowed')
+        catalog['path'] = CatalogPathIndex2('path')
+        catalog['date'] = CatalogDateIndex('date')
+        catalog['name'] = CatalogFieldIndex('name')
+        for docid, path, interfaces, allowed, date in (
+            (1, '/', [], ['a'], 10),
+            (2, '/a', ['x'], ['a', 'b'], 20),
+            (3, '/a/b', ['x', 'y'], ['b'], 30),
+            (4, '/a/b/c', ['y'], ['b', 'c'], 20),
+            (5, '/d', ['x'], ['c'], 40),
+            ):
+            catalog.document_map.add(path, docid)
+            catalog.index_doc(docid, DummyDoc(path, interfaces, allowed,
+                                              date, str(docid)))
+        return catalog
+
+    def _write(self, catalog, names=None):
+        from opencore.models.snapshot import write_snapshot
+        path = self._path()
+        write_snapshot(catalog, path, names)
+        return path
+
+    def _makeSnapshot(self, catalog):
+        from opencore.models.snapshot import CatalogSnapshot
+        return CatalogSnapshot(self._write(catalog))
+
+class TestCatalogSnapshot(SnapshotTestBase):
+
+    def _assertSame(self, snapshot, catalog, name, query):
+        expected = list(catalog[name].apply(query))
+        self.assertEqual(list(snapshot.apply(name, query)), expected)
+
+    def test_writes_supported_indexes(self):
+        from opencore.models.snapshot import write_snapshot
+        catalog = self._makeCatalog()
+        names = write_snapshot(catalog, self._path())
+        self.assertEqual(names, ['allowed', 'date', 'interfaces', 'path'])
+
+    def test_write_unsupported_index(self):
+        catalog = self._makeCatalog()
+        self.assertRaises(ValueError, self._write, catalog, ['name'])
+
+    def test_keyword_queries(self):
+        catalog = self._makeCatalog()
+        snapshot = self._makeSnapshot(catalog)
+        for query in (['x'], ['x', 'y'], ('y',), 'x', ['z'], [],
+                      {'query': ['x', 'y'], 'operator': 'or'},
+                      {'query': ['x', 'z'], 'operator': 'or'}):
+            self._assertSame(snapshot, catalog, 'interfaces', query)
+
+    def test_allowed_queries(self):
+        catalog = self._makeCatalog()
+        snapshot = self._makeSnapshot(catalog)
+        for query in ({'query': ['a', 'c'], 'operator': 'or'},
+                      {'query': ['b', 'c']}, 'b', ['z']):
+            self._assertSame(snapshot, catalog, 'allowed', query)
+
+    def test_date_queries(self):
+        from repoze.catalog import RangeValue
+        catalog = self._makeCatalog()
+        snapshot = self._makeSnapshot(catalog)
+        for query in ((20, 30), (None, 20), (25, None), (50, 60), 20,
+                      RangeValue(10, 20)):
+            self._assertSame(snapshot, catalog, 'date', query)
+
+    def test_path_queries(self):
+        catalog = self._makeCatalog()
+        snapshot = self._makeSnapshot(catalog)
+        for query in ('/', '/a', '/a/', ('', 'a'), '/nonesuch',
+                      {'query': '/', 'depth': 1},
+                      {'query': '/a', 'depth': 1, 'include_path': True},
+                      {'query': '/a', 'depth': 0, 'include_path': True}):
+            self._assertSame(snapshot, catalog, 'path', query)
+
+    def test_unsupported_queries(self):
+        catalog = self._makeCatalog()
+        snapshot = self._makeSnapshot(catalog)
+        self.assertEqual(snapshot.apply('interfaces',
+                         {'query': ['x'], 'operator': 'xor'}), None)
+        self.assertEqual(snapshot.apply('interfaces', object()), None)
+        self.assertEqual(snapshot.apply('date', {'query': [20]}), None)
+        self.assertEqual(snapshot.apply('path',
+            {'query': '/', 'attr_checker': lambda *arg: True}), None)
+
+    def test_address_for_docid(self):
+        catalog = self._makeCatalog()
+        snapshot = self._makeSnapshot(catalog)
+        self.assertEqual(snapshot.address_for_docid(1), '/')
+        self.assertEqual(snapshot.address_for_docid(4), '/a/b/c')
+        self.assertEqual(snapshot.address_for_docid(6), None)
+
+    def test_is_current(self):
+        catalog = self._makeCatalog()
+        snapshot = self._makeSnapshot(catalog)
+        self.failUnless(snapshot.is_current(catalog))
+        self.failUnless(snapshot.is_current(catalog, 'interfaces'))
+        self.failIf(snapshot.is_current(catalog, 'name'))
+        catalog.invalidate(['interfaces'])
+        self.failIf(snapshot.is_current(catalog))
+        self.failIf(snapshot.is_current(catalog, 'interfaces'))
+        self.failUnless(snapshot.is_current(catalog, 'allowed'))
+
+    def test_other_catalog_is_not_current(self):
+        catalog = self._makeCatalog()
+        snapshot = self._makeSnapshot(catalog)
+        catalog._p_oid = 'other'
+        self.failIf(snapshot.is_current(catalog, 'interfaces'))
+
+    def test_not_a_snapshot(self):
+        from opencore.models.snapshot import CatalogSnapshot
+        path = self._path()
+        f = open(path, 'wb')
+        f.write('x' * 100)
+        f.close()
+        self.assertRaises(ValueError, CatalogSnapshot, path)
+
+class TestCachingCatalogWithSnapshot(SnapshotTestBase):
+
+    def test_search_uses_current_snapshot(self):
+        catalog = self._makeCatalog()
+        catalog.snapshots = DummyLoader(self._makeSnapshot(catalog))
+        # bypass the catalog, so the snapshot stays current
+        catalog['interfaces'].index_doc(6, DummyDoc(interfaces=['x']))
+        num, docids = catalog.search(interfaces=['x'])
+        self.assertEqual(list(docids), [2, 3, 5])
+        catalog.invalidate(['interfaces'])
+        num, docids = catalog.search(interfaces=['x'])
+        self.assertEqual(list(docids), [2, 3, 5, 6])
+
+    def test_search_falls_back_to_index(self):
+        catalog = self._makeCatalog()
+        catalog.snapshots = DummyLoader(self._makeSnapshot(catalog))
+        num, docids = catalog.search(name='3', date=(10, 30),
+                                     sort_index='date')
+        self.assertEqual(list(docids), [3])
+        self.assertEqual(catalog._v_snapshot, None)
+
+    def test_address_lookup(self):
+        from opencore.models import snapshot
+        catalog = self._makeCatalog()
+        loader = DummyLoader(self._makeSnapshot(catalog))
+        original = snapshot.snapshots
+        snapshot.snapshots = loader
+        try:
+            catalog.document_map.docid_to_address[1] = '/changed'
+            address = snapshot.address_lookup(catalog)
+            self.assertEqual(address(1), '/')
+            catalog.invalidate()
+            address = snapshot.address_lookup(catalog)
+            self.assertEqual(address(1), '/changed')
+        finally:
+            snapshot.snapshots = original
+
+class TestSnapshotLoader(SnapshotTestBase):
+
+    def _makeOne(self, path=None):
+        from opencore.models.snapshot import SnapshotLoader
+        loader = SnapshotLoader(path)
+        loader.time = DummyClock()
+        return loader
+
+    def test_unconfigured(self):
+        loader = self._makeOne()
+        self.assertEqual(loader.get(self._makeCatalog()), None)
+
+    def test_configure_by_utility(self):
+        from repoze.bfg.interfaces import ISettings
+        catalog = self._makeCatalog()
+        path = self._write(catalog)
+        testing.registerUtility(DummySettings(path), ISettings)
+        loader = self._makeOne()
+        self.assertEqual(loader.get(catalog).path, path)
+
+    def test_missing_file(self):
+        loader = self._makeOne(self._path())
+        self.assertEqual(loader.get(self._makeCatalog()), None)
+
+    def test_other_catalog(self):
+        catalog = self._makeCatalog()
+        loader = self._makeOne(self._write(catalog))
+        catalog._p_oid = 'other'
+        self.assertEqual(loader.get(catalog), None)
+
+    def test_reopens_replaced_file(self):
+        catalog = self._makeCatalog()
+        loader = self._makeOne(self._write(catalog))
+        first = loader.get(catalog)
+        self.assertEqual(loader.get(catalog), first)
+        catalog.index_doc(6, DummyDoc('/e', ['z'], ['a'], 50, '6'))
+        self._write(catalog)
+        loader.time.now += loader.check_interval
+        second = loader.get(catalog)
+        self.failIf(second is first)
+        self.assertEqual(list(second.apply('interfaces', 'z')), [6])
+
+    def test_unreadable_file(self):
+        path = self._path()
+        f = open(path, 'wb')
+        f.write('x' * 100)
+        f.close()
+        loader = self._makeOne(path)
+        self.assertEqual(loader.get(self._makeCatalog()), None)
+
+class DummyDoc:
+    def __init__(self, path='/x', interfaces=(), allowed=(), date=0,
+                 name=''):
+        self.path = path
+        self.interfaces = interfaces
+        self.allowed = allowed
+        self.date = date
+        self.name = name
+
+class DummyLoader:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def get(self, catalog):
+        return self.snapshot
+
+class DummyClock:
+    now = 0
+    def __call__(self):
+        return self.now
+
+class DummySettings:
+    def __init__(self, path):
+        self.catalog_snapshot_file = path
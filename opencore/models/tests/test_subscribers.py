@@ -118,6 +118,20 @@ class TestIndexContent(unittest.TestCase):
         self.assertEqual(catalog.document_map.added, [(123, path)])
         self.assertEqual(catalog.indexed, [model])
 
+    def test_content_object_deferred(self):
+        from opencore.testing import DummyCatalog
+        from opencore.testing import registerSettings
+        from zope.interface import directlyProvides
+        from repoze.lemonade.interfaces import IContent
+        registerSettings(deferred_indexing='true')
+        model = testing.DummyModel()
+        directlyProvides(model, IContent)
+        catalog = DummyCatalog()
+        model.catalog = catalog
+        self._callFUT(model, None)
+        self.assertEqual(catalog.indexed, [])
+        self.assertEqual(list(catalog.indexing_queue.pop()), [(1, 1)])
+
     def test_noncontent_object(self):
         from opencore.testing import DummyCatalog
         model = testing.DummyModel()
@@ -152,6 +166,21 @@ class TestUnindexContent(unittest.TestCase):
         self.assertEqual(catalog.unindexed, [2, 4, 6])
         self.assertEqual(catalog.document_map.removed, [2, 4, 6])
 
+    def test_content_object_deferred(self):
+        from opencore.models.indexqueue import UNINDEX
+        from opencore.testing import DummyCatalog
+        from opencore.testing import registerSettings
+        registerSettings(deferred_indexing='true')
+        model = testing.DummyModel()
+        catalog = model.catalog = DummyCatalog()
+
+        self._callFUT(model, [2, 4])
+
+        self.assertEqual(catalog.unindexed, [])
+        self.assertEqual(catalog.indexing_queue.pop(),
+                         [(2, UNINDEX), (4, UNINDEX)])
+        self.assertEqual(catalog.document_map.removed, [2, 4])
+
 class TestCleanupContentTags(unittest.TestCase):
     def setUp(self):
         testing.cleanUp()
@@ -228,6 +257,39 @@ class TestHandleContentRemoved(unittest.TestCase):
         self.assertEqual(tags._delete_called_with[1], (2, None, None))
         self.assertEqual(tags._delete_called_with[2], (3, None, None))
 
+    def test_deferred_uses_document_map(self):
+        from BTrees.OOBTree import OOBTree
+        from opencore.models.indexqueue import UNINDEX
+        from opencore.testing import DummyCatalog
+        from opencore.testing import registerSettings
+        registerSettings(deferred_indexing='true')
+        root = testing.DummyModel()
+        model = root['a'] = testing.DummyModel()
+        catalog = root.catalog = DummyCatalog()
+        catalog.document_map.address_to_docid = OOBTree(
+            {'/a': 1, '/a/foo': 2, '/ab': 3, '/b': 4})
+        self._callFUT(model, None)
+        self.assertEqual(catalog.queries, [])
+        self.assertEqual(catalog.indexing_queue.pop(),
+                         [(1, UNINDEX), (2, UNINDEX)])
+        self.assertEqual(catalog.document_map.removed, [1, 2])
+
+    def test_deferred_skips_siblings_sorting_before_children(self):
+        from BTrees.OOBTree import OOBTree
+        from opencore.models.indexqueue import UNINDEX
+        from opencore.testing import DummyCatalog
+        from opencore.testing import registerSettings
+        registerSettings(deferred_indexing='true')
+        root = testing.DummyModel()
+        model = root['foo'] = testing.DummyModel()
+        catalog = root.catalog = DummyCatalog()
+        catalog.document_map.address_to_docid = OOBTree(
+            {'/foo': 1, '/foo-2': 2, '/foo-2/bar': 3, '/foo/bar': 4,
+             '/foo/bar/baz': 5})
+        self._callFUT(model, None)
+        self.assertEqual(catalog.indexing_queue.pop(),
+                         [(1, UNINDEX), (4, UNINDEX), (5, UNINDEX)])
+
 class TestReindexContent(unittest.TestCase):
     def setUp(self):
         testing.cleanUp()
@@ -253,6 +315,20 @@ class TestReindexContent(unittest.TestCase):
         self._callFUT(model, None)
         self.assertEqual(catalog.reindexed, [model])
 
+    def test_content_object_deferred(self):
+        from repoze.bfg.traversal import model_path
+        from opencore.models.indexqueue import INDEX
+        from opencore.testing import DummyCatalog
+        from opencore.testing import registerSettings
+        registerSettings(deferred_indexing='true')
+        model = testing.DummyModel()
+        path = model_path(model)
+        catalog = DummyCatalog({1:path})
+        model.catalog = catalog
+        self._callFUT(model, None)
+        self.assertEqual(catalog.reindexed, [])
+        self.assertEqual(catalog.indexing_queue.pop(), [(1, INDEX)])
+
 class _NOW_replacer:
     _old_NOW = None
 
@@ -319,6 +395,24 @@ class Test_set_modified(unittest.TestCase,
         self.assertEqual(len(index._called_with), 1)
         self.assertEqual(index._called_with[0], (42, root))
 
+    def test_with_icommunity_invalidates_content_modified_only(self):
+        from zope.interface import directlyProvides
+        from repoze.catalog.interfaces import ICatalog
+        from repoze.lemonade.interfaces import IContent
+        from opencore.models.interfaces import ICommunity
+        root = testing.DummyModel()
+        directlyProvides(root, ICommunity)
+        root.docid = 42
+        catalog = root.catalog = testing.DummyModel()
+        catalog['content_modified'] = DummyIndex()
+        invalidated = []
+        catalog.invalidate = invalidated.append
+        directlyProvides(catalog, ICatalog)
+        model = testing.DummyModel(__parent__=root)
+        directlyProvides(model, IContent)
+        self._callFUT(model, None)
+        self.assertEqual(invalidated, [['content_modified']])
+
 class Test_set_created(unittest.TestCase,
                        _NOW_replacer,
                       ):
@@ -617,6 +711,21 @@ class QueryLoggerTests(unittest.TestCase):
         finally:
             shutil.rmtree(d)
 
+    def test_cache_hits_not_logged(self):
+        import os
+        import shutil
+        import tempfile
+        d = tempfile.mkdtemp()
+        try:
+            logger = self._makeOne()
+            logger.configure(DummySettings(d, log_all=True))
+            event = DummyQueryEvent()
+            event.cached = True
+            logger(event)
+            self.assertEquals(os.listdir(d), [])
+        finally:
+            shutil.rmtree(d)
+
 class DummyTags:
     _delete_called_with = None
 
@@ -630,6 +739,7 @@ class DummyQueryEvent:
     query = {'creator': 'me'}
     duration = 0.4
     result = (1, [99])
+    cached = None
 
 class DummySettings:
     def __init__(self, log_dir, min_duration=0, log_all=False):
@@ -0,0 +1,136 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Benchmark the catalog queries of the views against a synthetic site.
+
+Builds a site in a FileStorage (a temporary one unless --storage is
+given; an existing --storage is reused), times the queries and prints
+the results.  With --output, the results are saved as JSON; with
+--compare, they are compared with those of an earlier run.
+"""
+
+from opencore.benchmark.queries import choose_sample
+from opencore.benchmark.report import compare_reports
+from opencore.benchmark.report import format_comparison
+from opencore.benchmark.report import format_results
+from opencore.benchmark.report import make_report
+from opencore.benchmark.report import run_queries
+from opencore.benchmark.sitegen import DEFAULT_SIZES
+from opencore.benchmark.sitegen import build_site
+from optparse import OptionParser
+from repoze.bfg.configuration import Configurator
+from ZODB.DB import DB
+from ZODB.FileStorage import FileStorage
+import os
+import shutil
+import simplejson
+import tempfile
+import transaction
+
+import logging
+logging.basicConfig()
+
+def main():
+    parser = OptionParser(description=__doc__)
+    parser.add_option('-z', '--zcml', dest='zcml',
+        default='opencore.includes:standalone.zcml',
+        help="The ZCML file configuring the application")
+    parser.add_option('-s', '--storage', dest='storage', default=None,
+        metavar='FILE', help="Keep the site in this FileStorage file")
+    parser.add_option('-o', '--output', dest='output', default=None,
+        metavar='FILE', help="Save the results to FILE as JSON")
+    parser.add_option('-c', '--compare', dest='compare', default=None,
+        metavar='FILE', help="Compare the results with a saved report")
+    parser.add_option('-l', '--label', dest='label', default=None,
+        help="A label for the report, such as the commit benchmarked")
+    parser.add_option('-r', '--repeat', dest='repeat', default=20,
+        metavar='N', help="Time N runs of each query")
+    parser.add_option('--seed', dest='seed', default=0,
+        help="Seed for generating the site and choosing the sample")
+    parser.add_option('--cached', dest='cached',
+        action="store_true", default=False,
+        help="Let the catalog cache search results between runs")
+    for name in sorted(DEFAULT_SIZES):
+        parser.add_option('--%s' % name.replace('_', '-'), dest=name,
+            default=None, metavar='N',
+            help="Size of the site (default %d)" % DEFAULT_SIZES[name])
+
+    options, args = parser.parse_args()
+    if args:
+        parser.error("Too many parameters: %s" % repr(args))
+
+    sizes = DEFAULT_SIZES.copy()
+    for name in DEFAULT_SIZES:
+        value = getattr(options, name)
+        if value is not None:
+            sizes[name] = int(value)
+    seed = int(options.seed)
+    if not options.cached:
+        os.environ['NO_CATALOG_CACHE'] = '1'
+
+    config = Configurator()
+    config.hook_zca()
+    config.begin()
+    config.load_zcml(options.zcml)
+
+    tmpdir = None
+    path = options.storage
+    if path is None:
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'Data.fs')
+    db = DB(FileStorage(path, blob_dir=path + '.blobs'))
+    conn = db.open()
+    try:
+        root = conn.root()
+        if 'site' not in root:
+            build_site(root, sizes, seed)
+            root['benchmark_sizes'] = sizes
+            transaction.commit()
+        sizes = root['benchmark_sizes']
+        site = root['site']
+        sample = choose_sample(site, seed)
+        # the queries run as a member of the sample community
+        user = site.users.get_by_id(sample.userid)
+        config.testing_securitypolicy(sample.userid, user['groups'])
+        results = run_queries(sample, repeat=int(options.repeat))
+        report = make_report(results, sizes, sample, options.label)
+    finally:
+        transaction.abort()
+        conn.close()
+        db.close()
+        config.end()
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+
+    print '\n'.join(format_results(report['queries']))
+    if options.output:
+        f = open(options.output, 'w')
+        simplejson.dump(report, f, indent=2, sort_keys=True)
+        f.close()
+    if options.compare:
+        f = open(options.compare)
+        old = simplejson.load(f)
+        f.close()
+        print
+        print 'Compared with %s:' % (old.get('label') or options.compare)
+        print '\n'.join(format_comparison(compare_reports(old, report)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+"""Write a snapshot of the catalog for the workers to share.
+
+The snapshot is written to the file named by the catalog_snapshot_file
+setting (or --output).  Runs as a daemon, rewriting the snapshot
+whenever the catalog has changed, unless --once is given.
+"""
+
+from opencore.scripting import get_default_config
+from opencore.scripting import open_root
+from opencore.scripting import run_daemon
+from opencore.models.snapshot import write_snapshot
+from opencore.utils import find_catalog
+from opencore.utils import get_setting
+from optparse import OptionParser
+
+import transaction
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+
+def update_snapshot(root, path, names=None, written=None,
+                    transaction=transaction, write_snapshot=write_snapshot):
+    """ Write a snapshot of the catalog to ``path`` unless the catalog
+    has not changed since the generation ``written``.  Returns the
+    generation of the catalog.
+    """
+    # start from the current state of the database
+    transaction.abort()
+    catalog = find_catalog(root)
+    generation = catalog.generation.value
+    if generation != written:
+        names = write_snapshot(catalog, path, names)
+        log.info('Wrote snapshot of %s at generation %d' % (
+            ', '.join(names), generation))
+    transaction.abort()
+    return generation
+
+def main():
+    parser = OptionParser(description=__doc__)
+    parser.add_option('-C', '--config', dest='config', default=None,
+        help="Specify a paster config file. Defaults to $CWD/etc/openhcd.ini")
+    parser.add_option('-o', '--output', dest='output', default=None,
+        metavar='FILE',
+        help="Write the snapshot to FILE instead of catalog_snapshot_file")
+    parser.add_option('-n', '--index', dest='indexes',
+        action="append",
+        help="Include only the given index (can be repeated)")
+    parser.add_option('-i', '--interval', dest='interval',
+        action="store", default=300, metavar='SECONDS',
+        help="Seconds to wait between checks for changes")
+    parser.add_option('--once', dest='once',
+        action="store_true", default=False,
+        help="Write the snapshot once, then exit")
+
+    options, args = parser.parse_args()
+    if args:
+        parser.error("Too many parameters: %s" % repr(args))
+
+    config = options.config
+    if config is None:
+        config = get_default_config()
+    root, closer = open_root(config)
+
+    path = options.output or get_setting(root, 'catalog_snapshot_file')
+    if not path:
+        parser.error("No --output given and catalog_snapshot_file is not "
+                     "set")
+
+    state = {'written': None}
+    def run():
+        state['written'] = update_snapshot(root, path, options.indexes,
+                                           state['written'])
+
+    if options.once:
+        run()
+    else:
+        run_daemon('catalog_snapshot', run, interval=int(options.interval))
+
+if __name__ == '__main__':
+    main()
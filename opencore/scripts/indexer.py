@@ -0,0 +1,92 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""Apply the catalog operations queued by deferred indexing.
+
+Runs as a daemon unless --once is given.
+"""
+
+from opencore.scripting import get_default_config
+from opencore.scripting import open_root
+from opencore.scripting import run_daemon
+from opencore.models.indexqueue import process_indexing_queue
+from optparse import OptionParser
+
+import transaction
+
+import logging
+logging.basicConfig()
+
+def drain_indexing_queue(root, batch_size=100, transaction=transaction):
+    """ Apply queued operations in batches of ``batch_size``, committing
+    after each batch, until the queue is empty.  Returns the number of
+    operations applied.
+    """
+    # start from the current state of the database
+    transaction.abort()
+    total = 0
+    while True:
+        try:
+            count = process_indexing_queue(root, batch_size)
+            if not count:
+                break
+            transaction.commit()
+        except:
+            transaction.abort()
+            raise
+        total += count
+    transaction.abort()
+    return total
+
+def main():
+    parser = OptionParser(description=__doc__)
+    parser.add_option('-C', '--config', dest='config', default=None,
+        help="Specify a paster config file. Defaults to $CWD/etc/openhcd.ini")
+    parser.add_option('-b', '--batch-size', dest='batch_size',
+        action="store", default=100, metavar='N',
+        help="Commit after every N documents")
+    parser.add_option('-i', '--interval', dest='interval',
+        action="store", default=5, metavar='SECONDS',
+        help="Seconds to wait between checks of the queue")
+    parser.add_option('--once', dest='once',
+        action="store_true", default=False,
+        help="Empty the queue once, then exit")
+
+    options, args = parser.parse_args()
+    if args:
+        parser.error("Too many parameters: %s" % repr(args))
+
+    batch_size = int(options.batch_size)
+    config = options.config
+    if config is None:
+        config = get_default_config()
+    root, closer = open_root(config)
+
+    def run():
+        drain_indexing_queue(root, batch_size)
+
+    if options.once:
+        run()
+    else:
+        # conflicts with the queueing transactions are expected: retry soon
+        run_daemon('indexer', run, interval=int(options.interval),
+                   retry_interval=1)
+
+if __name__ == '__main__':
+    main()
@@ -116,11 +116,13 @@ def move_content(root, src, dst, wf_state):
         name = make_unique_name(dest_folder, context.title)
 
     dest_folder[name] = context
+    docs = []
     for obj in postorder(context):
         if hasattr(obj, 'docid'):
             docid = obj.docid
             catalog.document_map.add(model_path(obj), docid)
-            catalog.index_doc(docid, obj)
+            docs.append((docid, obj))
+    catalog.index_docs(docs)
 
     if wf_state is not None:
         wf = get_workflow(get_content_type(context), 'security', context)
@@ -21,9 +21,15 @@
 
 from opencore.scripting import get_default_config
 from opencore.scripting import open_root
+from opencore.models.catalog import compute_index_values
+from opencore.models.catalog import prepare_reindex
 from opencore.models.catalog import reindex_catalog
+from itertools import islice
 from optparse import OptionParser
+import multiprocessing
 import re
+import sys
+import transaction
 
 def main():
     parser = OptionParser(description=__doc__)
@@ -40,12 +46,25 @@ def main():
         help="Reindex only objects whose path matches a regular expression")
     parser.add_option('-n', '--index', dest='indexes',
         action="append", help="Reindex only the given index (can be repeated)")
+    parser.add_option('-w', '--workers', dest='workers',
+        action="store", default=1, metavar='N',
+        help="Share the work between N processes. With --index, the "
+             "processes compute the index values and this process writes "
+             "them; otherwise each process reindexes its share of the "
+             "documents.")
+    parser.add_option('-r', '--restart', dest='restart',
+        action="store_true", default=False,
+        help="Start from the beginning instead of resuming an interrupted "
+             "run")
 
     options, args = parser.parse_args()
     if args:
         parser.error("Too many parameters: %s" % repr(args))
 
     commit_interval = int(options.commit_interval)
+    workers = int(options.workers)
+    if workers < 1:
+        parser.error("--workers must be at least 1")
     if options.path:
         path_re = re.compile(options.path)
     else:
@@ -54,17 +73,88 @@ def main():
     config = options.config
     if config is None:
         config = get_default_config()
-    root, closer = open_root(config)
-
-    def output(msg):
-        print msg
 
     kw = {}
     if options.indexes:
         kw['indexes'] = options.indexes
 
-    reindex_catalog(root, path_re=path_re, commit_interval=commit_interval,
-                    dry_run=options.dry_run, output=output, **kw)
+    kw.update(path_re=path_re, commit_interval=commit_interval,
+              dry_run=options.dry_run, restart=options.restart)
+
+    if workers == 1:
+        root, closer = open_root(config)
+        reindex_catalog(root, output=output, **kw)
+    elif options.indexes:
+        # Start the pool before opening the database, so that the
+        # processes don't inherit this process' connection.
+        pool = multiprocessing.Pool(workers, _init_pool,
+                                    (config, options.indexes))
+        root, closer = open_root(config)
+        try:
+            reindex_catalog(root, output=output, imap=_imap(pool, workers),
+                            **kw)
+        finally:
+            pool.terminate()
+    else:
+        root, closer = open_root(config)
+        prepare_reindex(root, options.dry_run, output)
+        closer()
+        # Each process opens its own database connection.
+        processes = [multiprocessing.Process(target=_reindex_worker,
+                                             args=(config, i, workers, kw))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        failed = [i for i, process in enumerate(processes)
+                  if process.exitcode]
+        if failed:
+            print "workers %s failed; run again to resume" % failed
+            sys.exit(1)
+
+def output(msg):
+    print msg
+
+def _reindex_worker(config, worker, workers, kw):
+    root, closer = open_root(config)
+    def output(msg):
+        print '[%d] %s' % (worker, msg)
+    try:
+        reindex_catalog(root, worker=worker, workers=workers,
+                        update_indexes=False, output=output, **kw)
+    finally:
+        closer()
+
+_root = None
+_indexes = None
+
+def _init_pool(config, indexes):
+    global _root, _indexes
+    _root, closer = open_root(config)
+    _indexes = indexes
+
+def _compute(batch):
+    try:
+        return compute_index_values(_root, batch, _indexes)
+    finally:
+        # start the next batch from fresh data and an empty cache
+        transaction.abort()
+        _root._p_jar.cacheGC()
+
+def _imap(pool, workers):
+    def imap(batches):
+        # Pool.imap reads its input from another thread, but the batches
+        # come from this process' database connection, which must only be
+        # used by this thread: hand them to the pool a few at a time.
+        batches = iter(batches)
+        while True:
+            chunk = list(islice(batches, workers * 2))
+            if not chunk:
+                break
+            for values in pool.imap(_compute, chunk):
+                yield values
+    return imap
 
 if __name__ == '__main__':
     main()
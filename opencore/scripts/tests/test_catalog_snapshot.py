@@ -0,0 +1,63 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+import unittest
+
+from opencore import testing
+
+class Test_update_snapshot(unittest.TestCase):
+
+    def _callFUT(self, root, written, transaction, write):
+        from opencore.scripts.catalog_snapshot import update_snapshot
+        return update_snapshot(root, 'snapshot', ['path'], written,
+                               transaction, write)
+
+    def _makeRoot(self, generation):
+        from BTrees.Length import Length
+        root = testing.DummyModel()
+        catalog = root.catalog = testing.DummyCatalog()
+        catalog.generation = Length(generation)
+        return root
+
+    def test_changed(self):
+        root = self._makeRoot(5)
+        writes = []
+        def write(catalog, path, names):
+            writes.append((catalog, path, names))
+            return names
+        transaction = DummyTransaction()
+        self.assertEqual(self._callFUT(root, 4, transaction, write), 5)
+        self.assertEqual(writes, [(root.catalog, 'snapshot', ['path'])])
+        self.assertEqual(transaction.aborted, 2)
+
+    def test_unchanged(self):
+        root = self._makeRoot(5)
+        writes = []
+        def write(catalog, path, names):
+            writes.append(path)
+        self.assertEqual(self._callFUT(root, 5, DummyTransaction(), write), 5)
+        self.assertEqual(writes, [])
+
+class DummyTransaction(object):
+    def __init__(self):
+        self.aborted = 0
+
+    def abort(self):
+        self.aborted += 1
@@ -0,0 +1,67 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+import unittest
+
+from opencore import testing
+
+
+class Test_drain_indexing_queue(unittest.TestCase):
+
+    def _callFUT(self, root, batch_size, transaction):
+        from opencore.scripts.indexer import drain_indexing_queue
+        return drain_indexing_queue(root, batch_size, transaction)
+
+    def test_it(self):
+        from opencore.models.indexqueue import IndexingQueue
+        root = testing.DummyModel()
+        catalog = root.catalog = testing.DummyCatalog()
+        queue = catalog.indexing_queue = IndexingQueue()
+        for docid in range(5):
+            queue.unindex(docid)
+        transaction = DummyTransaction()
+        self.assertEqual(self._callFUT(root, 2, transaction), 5)
+        self.assertEqual(catalog.unindexed, range(5))
+        self.assertEqual(transaction.committed, 3)
+
+    def test_error_aborts(self):
+        from opencore.models.indexqueue import IndexingQueue
+        root = testing.DummyModel()
+        catalog = root.catalog = testing.DummyCatalog()
+        def unindex_doc(docid):
+            raise ValueError(docid)
+        catalog.unindex_doc = unindex_doc
+        queue = catalog.indexing_queue = IndexingQueue()
+        queue.unindex(1)
+        transaction = DummyTransaction()
+        self.assertRaises(ValueError, self._callFUT, root, 2, transaction)
+        self.assertEqual(transaction.committed, 0)
+        self.assertEqual(transaction.aborted, 2)
+
+
+class DummyTransaction(object):
+    def __init__(self):
+        self.committed = 0
+        self.aborted = 0
+
+    def commit(self):
+        self.committed += 1
+
+    def abort(self):
+        self.aborted += 1
@@ -17,10 +17,14 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
 
+import heapq
 import random
 
+from BTrees import IFBTree
 from BTrees import IOBTree
+from BTrees import OIBTree
 from BTrees import OOBTree
+from BTrees.Length import Length
 from persistent import Persistent
 from zope.component import queryAdapter
 from zope.event import notify
@@ -108,6 +112,14 @@ class Tags(Persistent):
     implements(ITaggingEngine, ITaggingStatistics)
 
     _v_nextid = None
+    generation = None # b/c
+    _tagid_to_info = None # b/c
+    _name_counts = None # b/c
+    _community_counts = None # b/c
+    _cooccurrence = None # b/c
+    _community_cooccurrence = None # b/c
+    _name_to_items = None # b/c
+    _community_name_to_items = None # b/c
 
     def __init__(self, site):
         self.site = site # need a backref
@@ -146,8 +158,8 @@ class Tags(Persistent):
             # shortcut
             return set(self._name_to_tagids.keys())
 
-        result = self.getTagObjects(items, users, community=community)
-        return set([tag.name for tag in result])
+        ids = self._getTagIds(items, users, community=community)
+        return self.names_for(ids)
 
     def getTagObjects(self, items=None, users=None, tags=None, community=None):
         """ See ITaggingEngine.
@@ -163,113 +175,145 @@ class Tags(Persistent):
         if isinstance(users, basestring):
             users = [users]
 
-        tags = self.getTagObjects(items=items, users=users,
-                                  community=community)
+        if items is None and users is None:
+            return set(self._counts(community).items())
+
+        ids = self._getTagIds(items=items, users=users, community=community)
         d = {}
-        for tag in tags:
-            if d.has_key(tag.name):
-                d[tag.name] += 1
+        for item, user, name in self._tag_info(ids):
+            if not self._shown(name):
+                continue
+            if d.has_key(name):
+                d[name] += 1
             else:
-                d[tag.name] = 1
+                d[name] = 1
         return set(d.items())
 
     def getItems(self, tags=None, users=None, community=None):
         """ See ITaggingEngine.
         """
+        if tags is not None and users is None:
+            return set(IFBTree.multiunion(
+                [self.items_tagged(name, community) for name in tags]))
         uids = self._getTagIds(items=None, users=users, tags=tags,
                                community=community)
-        res = set()
-        for uid in uids:
-            o = self._tagid_to_obj.get(uid)
-            if o is not None:
-                res.add(o.item)
-        return res
+        return set(self.items_for(uids))
 
     def getUsers(self, tags=None, items=None, community=None):
         """ See ITaggingEngine.
         """
         ids = self._getTagIds(items=items, users=None, tags=tags,
                               community=community)
-        return set([self._tagid_to_obj[id].user for id in ids])
+        return self.users_for(ids)
+
+    def items_for(self, tagids):
+        """ Return the items tagged by the tags with ids ``tagids``, as an
+        IFSet of docids.
+        """
+        return IFBTree.IFSet([item for item, user, name
+                              in self._tag_info(tagids)])
+
+    def items_tagged(self, name, community=None):
+        """ Return the items tagged ``name``, in ``community`` if it is not
+        None, as an IF set of docids which must not be modified.
+        """
+        if community is None:
+            postings = self._name_to_items
+        else:
+            postings = self._community_name_to_items.get(community, {})
+        return postings.get(name) or IFBTree.IFSet()
+
+    def names_for(self, tagids):
+        """ Return the set of the names of the tags with ids ``tagids``.
+        """
+        return set([name for item, user, name in self._tag_info(tagids)])
+
+    def users_for(self, tagids):
+        """ Return the set of the users of the tags with ids ``tagids``.
+        """
+        return set([user for item, user, name in self._tag_info(tagids)])
 
     def getRelatedTags(self, tag, degree=1, community=None, user=None):
         """ See ITaggingEngine.
         """
         result = set()
-        degree_counter = 1
         previous_degree_tags = set([tag])
-        degree_tags = set()
-        while degree_counter <= degree:
+        for degree_counter in range(degree):
+            degree_tags = set()
             for cur_name in previous_degree_tags:
-                tagids = self._name_to_tagids.get(cur_name, ())
-                for tagid in tagids:
-                    tag_obj = self._tagid_to_obj[tagid]
-                    if community and tag_obj.community != community:
-                        continue
-                    if user and tag_obj.user != user:
-                        continue
-                    degree_tags.update(self.getTags(
-                                                items=(tag_obj.item,),
-                                                users=(tag_obj.user,),
-                                                community=community,
-                                                ))
-            # After all the related tags of this degree were found, update the
-            # result set and clean up the variables for the next round.
+                degree_tags.update(
+                    [name for name in self._related(cur_name, community, user)
+                     if self._shown(name)])
+            # Only the tags found for the first time need expanding in the
+            # next round.
+            previous_degree_tags = degree_tags - result
             result.update(degree_tags)
-            previous_degree_tags = degree_tags
-            degree_tags = set()
-            degree_counter += 1
         # Make sure the original is not included
-        if tag in result:
-            result.remove(tag)
+        result.discard(tag)
         return result
 
-    def getRelatedItems(self, item, community=None, user=None):
+    def getRelatedTagWeights(self, tag, community=None, user=None,
+                             limit=None):
+        """ See ITaggingEngine.
+        """
+        weights = [(name, weight) for name, weight
+                   in self._related(tag, community, user).items()
+                   if self._shown(name)]
+        if limit is not None:
+            return heapq.nlargest(limit, weights, key=lambda x: x[1])
+        return sorted(weights, key=lambda x: x[1], reverse=True)
+
+    def getRelatedItems(self, item, community=None, user=None, limit=None):
         """ See ITaggingEngine.
         """
         if user is None:
-            tags = self.getTags([item], community=community)
-            items = self.getItems(tags, community=community)
+            users = None
         else:
-            tags = self.getTags([item], community=community, users=(user,))
-            items = self.getItems(tags, community=community, users=(user,))
-        if item in items:
-            items.remove(item)
-        result = []
-        for otherItem in items:
-            otherTags = self.getTags([otherItem], community=community)
-            result.append((otherItem, len(tags.intersection(otherTags))))
-        return sorted(result, key=lambda i: i[1], reverse=True)
-
-    def getRelatedUsers(self, user, community=None):
+            users = [user]
+        tags = self._shownNames(self._getTagIds([item], users,
+                                                community=community))
+        scores = {}
+        for name in tags:
+            ids = self._getTagIds(tags=[name], community=community)
+            for otherItem in self.items_for(ids):
+                scores[otherItem] = scores.get(otherItem, 0) + 1
+        if users is not None:
+            ids = self._getTagIds(users=users, tags=tags, community=community)
+            candidates = self.items_for(ids)
+            scores = dict([(otherItem, scores[otherItem])
+                           for otherItem in candidates])
+        scores.pop(item, None)
+        return _top(scores, limit)
+
+    def getRelatedUsers(self, user, community=None, limit=None):
         """ See ITaggingEngine.
         """
-        tags = self.getTags(users=[user], community=community)
-        users = self.getUsers(tags, community=community)
-        if user in users:
-            users.remove(user)
-        result = []
-        for otherUser in users:
-            otherTags = self.getTags(users=[otherUser], community=community)
-            result.append((otherUser, len(tags.intersection(otherTags))))
-        return sorted(result, key=lambda i: i[1], reverse=True)
+        tags = self._shownNames(self._getTagIds(users=[user],
+                                                community=community))
+        scores = {}
+        for name in tags:
+            ids = self._getTagIds(tags=[name], community=community)
+            for otherUser in self.users_for(ids):
+                scores[otherUser] = scores.get(otherUser, 0) + 1
+        scores.pop(user, None)
+        return _top(scores, limit)
 
     def getFrequency(self, tags=None, community=None, user=None):
         """ See ITaggingEngine.
         """
-        if user is not None:
-            users = [user]
-        else:
-            users = None
+        if user is None:
+            counts = self._counts(community)
+            if tags is not None:
+                counts = dict((x, counts.get(x, 0)) for x in tags)
+            return sorted(counts.items(), key=lambda x: x[1])
         if tags is None:
             result = {}
         else:
             result = dict((x, 0) for x in tags)
-        for tag_id in self._getTagIds(users=users,
-                                      tags=tags,
-                                      community=community):
-            tag_obj = self._tagid_to_obj[tag_id]
-            result[tag_obj.name] = result.setdefault(tag_obj.name, 0) + 1
+        ids = self._getTagIds(users=[user], tags=tags, community=community)
+        for item, user, name in self._tag_info(ids):
+            if self._shown(name):
+                result[name] = result.setdefault(name, 0) + 1
         return sorted(result.items(), key=lambda x: x[1])
 
     def update(self, item, user, tags):
@@ -278,9 +322,7 @@ class Tags(Persistent):
         c_finder = queryAdapter(self, ITagCommunityFinder)
         community = c_finder and c_finder(item) or None
 
-        tags_item = set(self._item_to_tagids.get(item, ()))
-        tags_user = set(self._user_to_tagids.get(user, ()))
-        tags_user_item = tags_item.intersection(tags_user)
+        tags_user_item = self._getTagIds(items=[item], users=[user])
 
         old_tags = set([self._tagid_to_obj[id] for id in tags_user_item])
 
@@ -290,6 +332,9 @@ class Tags(Persistent):
         add_tags = new_tags.difference(old_tags)
         remove_tags = old_tags.difference(new_tags)
 
+        if add_tags:
+            self._changed()
+
         for tagObj in add_tags:
             id = self._add(tagObj)
 
@@ -352,10 +397,20 @@ class Tags(Persistent):
         if not isinstance(new, unicode):
             new = new.decode('utf-8')
         tagIds = set(self._name_to_tagids.get(old, ()))
+        if tagIds:
+            self._changed()
+        info = self._tagid_to_info
         for tagId in tagIds:
             tagObj = self._tagid_to_obj[tagId]
             notify(TagRemovedEvent(tagObj._clone()))
+            self._count(tagObj.name, tagObj.community, -1)
+            self._cooccur(tagId, tagObj, -1)
             tagObj.name = new
+            info[tagId] = (tagObj.item, tagObj.user, new)
+            self._count(new, tagObj.community, 1)
+            self._cooccur(tagId, tagObj, 1)
+            self._post(tagObj.item, new, tagObj.community)
+            self._unpost(tagObj.item, old, tagObj.community)
             notify(TagAddedEvent(tagObj))
         newTagIds = IOBTree.IOSet(self._name_to_tagids.get(new, ()))
         newTagIds.update(tagIds)
@@ -368,16 +423,21 @@ class Tags(Persistent):
         """ See ITaggingEngine.
         """
         old_ids = self._user_to_tagids[olduser]
+        self._changed()
         if newuser in self._user_to_tagids:
             # XXX This potentially leaves dupes in the tree.
             self._user_to_tagids[newuser].update(old_ids)
         else:
             self._user_to_tagids[newuser] = old_ids
         del self._user_to_tagids[olduser]
+        info = self._tagid_to_info
         for tagid in old_ids:
             tagobj = self._tagid_to_obj[tagid]
             notify(TagRemovedEvent(tagobj._clone()))
+            self._cooccur(tagid, tagobj, -1)
             tagobj.user = unicode(newuser)
+            info[tagid] = (tagobj.item, tagobj.user, tagobj.name)
+            self._cooccur(tagid, tagobj, 1)
             # XXX Ideally, we would filter events for already-existing
             #     identical tags by the new user.
             notify(TagAddedEvent(tagobj))
@@ -395,7 +455,45 @@ class Tags(Persistent):
                 count += self.rename(name, newName)
         return count
 
+    def update_indexes(self):
+        """ Build the maps an engine created before they were kept lacks.
+
+        Run by the evolve steps which add them, rather than in whichever
+        request first changes a tag.
+        """
+        if self.generation is None:
+            self.generation = Length(0)
+        if self._tagid_to_info is None:
+            info = self._tagid_to_info = IOBTree.IOBTree()
+            for uid, tagObj in self._tagid_to_obj.items():
+                info[uid] = (tagObj.item, tagObj.user, tagObj.name)
+        if self._name_counts is None:
+            self._name_counts = OIBTree.OIBTree()
+            self._community_counts = OOBTree.OOBTree()
+            for tagObj in self._tagid_to_obj.values():
+                self._count(tagObj.name, tagObj.community, 1)
+        if self._cooccurrence is None:
+            self._cooccurrence = OOBTree.OOBTree()
+            self._community_cooccurrence = OOBTree.OOBTree()
+            for tagids in self._item_to_tagids.values():
+                tagObjs = [self._tagid_to_obj[uid] for uid in tagids]
+                for tagObj in tagObjs:
+                    for other in tagObjs:
+                        if (other.user == tagObj.user and
+                            other.name != tagObj.name):
+                            self._pair(tagObj.name, other.name,
+                                       tagObj.community, 1)
+        if self._name_to_items is None:
+            self._name_to_items = OOBTree.OOBTree()
+            self._community_name_to_items = OOBTree.OOBTree()
+            for tagObj in self._tagid_to_obj.values():
+                self._post(tagObj.item, tagObj.name, tagObj.community)
+
     def _reset(self):
+        # Bumped by every change, so cached tag queries can tell they are
+        # stale
+        self.generation = Length(0)
+
         # Map tagid to tag object
         self._tagid_to_obj = IOBTree.IOBTree()
 
@@ -405,6 +503,28 @@ class Tags(Persistent):
         self._name_to_tagids = OOBTree.OOBTree()
         self._community_to_tagids = OOBTree.OOBTree()
 
+        # Map tagid to (item, user, name), so those can be read without
+        # loading the tag objects
+        self._tagid_to_info = IOBTree.IOBTree()
+
+        # Map name to the number of tags with that name, overall and by
+        # community, so clouds and frequencies don't have to count tags
+        self._name_counts = OIBTree.OIBTree()
+        self._community_counts = OOBTree.OOBTree()
+
+        # Map name to the names it was used with by the same user on the
+        # same item, and how often, overall and by community
+        self._cooccurrence = OOBTree.OOBTree()
+        self._community_cooccurrence = OOBTree.OOBTree()
+
+        # Map name to the distinct items tagged with it, overall and by
+        # community, so tag queries don't have to look at every tag
+        self._name_to_items = OOBTree.OOBTree()
+        self._community_name_to_items = OOBTree.OOBTree()
+
+    def _changed(self):
+        self.generation.change(1)
+
     def _generateId(self):
         """Generate an id which is not yet taken.
 
@@ -424,40 +544,153 @@ class Tags(Persistent):
     def _add(self, tagObj):
         uid = self._generateId()
         self._tagid_to_obj[uid] = tagObj
+        self._tagid_to_info[uid] = (tagObj.item, tagObj.user, tagObj.name)
+        self._count(tagObj.name, tagObj.community, 1)
+        self._cooccur(uid, tagObj, 1)
+        self._post(tagObj.item, tagObj.name, tagObj.community)
         tagObj._id = uid
         return uid
 
+    def _count(self, name, community, delta):
+        _change_count(self._name_counts, name, delta)
+        if community is not None:
+            counts = self._community_counts.get(community)
+            if counts is None:
+                counts = self._community_counts[community] = OIBTree.OIBTree()
+            _change_count(counts, name, delta)
+
+    def _counts(self, community=None):
+        """ Return a dict mapping the name of each tag shown to the
+        number of tags with that name.
+        """
+        if community is None:
+            counts = self._name_counts
+        else:
+            counts = self._community_counts.get(community, {})
+        return dict([(name, count) for name, count in counts.items()
+                     if self._shown(name)])
+
+    def _cooccur(self, uid, tagObj, delta):
+        """ Count the tag with id ``uid`` ``delta`` times more as used with
+        the other tags of its user on its item.
+        """
+        tagids = [x for x in self._item_to_tagids.get(tagObj.item, ())
+                  if x != uid]
+        for item, user, name in self._tag_info(tagids):
+            if user == tagObj.user and name != tagObj.name:
+                self._pair(tagObj.name, name, tagObj.community, delta)
+                self._pair(name, tagObj.name, tagObj.community, delta)
+
+    def _pair(self, name, other, community, delta):
+        _change_weight(self._cooccurrence, name, other, delta)
+        if community is not None:
+            bt = self._community_cooccurrence.get(community)
+            if bt is None:
+                bt = self._community_cooccurrence[community] = \
+                    OOBTree.OOBTree()
+            _change_weight(bt, name, other, delta)
+
+    def _post(self, item, name, community):
+        _insert_item(self._name_to_items, name, item)
+        if community is not None:
+            postings = self._community_name_to_items.get(community)
+            if postings is None:
+                postings = self._community_name_to_items[community] = \
+                    OOBTree.OOBTree()
+            _insert_item(postings, name, item)
+
+    def _unpost(self, item, name, community):
+        """ Remove ``item`` from the postings of ``name`` unless another of
+        its tags still carries that name.
+        """
+        info = self._tagid_to_info
+        tagids = [uid for uid in self._item_to_tagids.get(item, ())
+                  if info[uid][2] == name]
+        if not tagids:
+            _remove_item(self._name_to_items, name, item)
+        if community is None:
+            return
+        in_community = self._community_to_tagids.get(community, ())
+        for uid in tagids:
+            if uid in in_community:
+                return
+        postings = self._community_name_to_items.get(community)
+        if postings is not None:
+            _remove_item(postings, name, item)
+
+    def _related(self, name, community=None, user=None):
+        """ Return a mapping of the names used with ``name`` by the same
+        user on the same item to how often they were.
+        """
+        if user is None:
+            if community is None:
+                return self._cooccurrence.get(name, {})
+            return self._community_cooccurrence.get(
+                community, {}).get(name, {})
+        result = {}
+        ids = self._getTagIds(users=[user], tags=[name], community=community)
+        for item, tagger, ignored in self._tag_info(ids):
+            others = self._getTagIds(items=[item], users=[tagger],
+                                     community=community)
+            for ignored, ignored, other in self._tag_info(others):
+                if other != name:
+                    result[other] = result.get(other, 0) + 1
+        return result
+
+    def _shownNames(self, tagids):
+        return [name for name in self.names_for(tagids) if self._shown(name)]
+
+    def _shown(self, name):
+        """ Return whether tags named ``name`` are included in clouds and
+        frequencies.
+        """
+        return True
+
+    def _tag_info(self, tagids):
+        """ Yield the (item, user, name) of the tags with ids ``tagids``.
+        """
+        info = self._tagid_to_info
+        for uid in tagids:
+            value = info.get(uid)
+            if value is not None:
+                yield value
+
     def _getTagIds(self, items=None, users=None, tags=None, community=None):
+        """ Return the ids of the tags matching any of the values of each
+        criterion given, as an IOSet.
+        """
         if (items is None and users is None and
             tags is None and community is None):
             # get them all
-            result = set()
-            for v in self._item_to_tagids.values():
-                result.update(v)
+            return IOBTree.IOSet(self._tagid_to_obj.keys())
+        if community is not None:
+            communities = [community]
         else:
-            if community is not None:
-                communities = [community]
+            communities = None
+        result = None
+        for seq, bt in ((items, self._item_to_tagids),
+                        (users, self._user_to_tagids),
+                        (tags, self._name_to_tagids),
+                        (communities, self._community_to_tagids)):
+            if seq is None:
+                continue
+            sets = [bt.get(key) for key in seq]
+            res = IOBTree.multiunion([ids for ids in sets if ids])
+            if result is None:
+                result = res
             else:
-                communities = None
-            result = None
-            for seq, bt in ((items, self._item_to_tagids),
-                            (users, self._user_to_tagids),
-                            (tags, self._name_to_tagids),
-                            (communities, self._community_to_tagids)):
-                res = set()
-                if seq is not None:
-                    for item in seq:
-                        res.update(bt.get(item, set()))
-                    if result is not None:
-                        result = result.intersection(res)
-                    else:
-                        result = res
+                result = IOBTree.intersection(result, res)
+            if not result:
+                break
         return result
 
     def _delTags(self, del_tag_ids):
         """deletes tags in iterable"""
+        if del_tag_ids:
+            self._changed()
         for id in del_tag_ids:
             tagObj = self._tagid_to_obj[id]
+            self._cooccur(id, tagObj, -1)
             self._user_to_tagids[tagObj.user].remove(id)
             if not len(self._user_to_tagids[tagObj.user]):
                 del self._user_to_tagids[tagObj.user]
@@ -475,8 +708,49 @@ class Tags(Persistent):
                 del self._community_to_tagids[tagObj.community]
 
             del self._tagid_to_obj[id]
+            info = self._tagid_to_info
+            if id in info:
+                del info[id]
+            self._count(tagObj.name, tagObj.community, -1)
+            self._unpost(tagObj.item, tagObj.name, tagObj.community)
             notify(TagRemovedEvent(tagObj))
 
+def _top(scores, limit=None):
+    """ Return the (key, score) pairs of the ``limit`` highest scores, or
+    all of them, highest first.  Ties are broken by key, so the order is
+    stable.
+    """
+    key = lambda x: (x[1], x[0])
+    if limit is None:
+        return sorted(scores.items(), key=key, reverse=True)
+    return heapq.nlargest(limit, scores.iteritems(), key=key)
+
+def _change_count(counts, name, delta):
+    count = counts.get(name, 0) + delta
+    if count > 0:
+        counts[name] = count
+    elif name in counts:
+        del counts[name]
+
+def _insert_item(postings, name, item):
+    items = postings.get(name)
+    if items is None:
+        items = postings[name] = IFBTree.IFTreeSet()
+    items.insert(item)
+
+def _remove_item(postings, name, item):
+    items = postings.get(name)
+    if items is not None and item in items:
+        items.remove(item)
+        if not items:
+            del postings[name]
+
+def _change_weight(bt, name, other, delta):
+    weights = bt.get(name)
+    if weights is None:
+        weights = bt[name] = OIBTree.OIBTree()
+    _change_count(weights, other, delta)
+
 class TopicFilteredTags(Tags):
      
     def getTags(self, items=None, users=None, community=None):
@@ -487,8 +761,9 @@ class TopicFilteredTags(Tags):
             return set([x for x in self._name_to_tagids.keys() 
                        if not x.startswith('topic.')]) 
     
-        result = self.getTagObjects(items, users, community=community)
-        return set([tag.name for tag in result])  # self.getTagObjects() deals with filtering
+        ids = self._getTagIds(items, users, community=community)
+        return set([name for name in self.names_for(ids)
+                    if not name.startswith('topic.')])
     
     def getTagObjects(self, items=None, users=None, tags=None, community=None):
         """ See ITaggingEngine.
@@ -497,24 +772,8 @@ class TopicFilteredTags(Tags):
         objs = [self._tagid_to_obj[id] for id in ids]
         return set([obj for obj in objs if not obj.name.startswith('topic.')])
     
-    def getFrequency(self, tags=None, community=None, user=None):
-        """ See ITaggingEngine.
-        """
-        if user is not None:
-            users = [user]
-        else:
-            users = None
-        if tags is None:
-            result = {}
-        else:
-            result = dict((x, 0) for x in tags)
-        for tag_id in self._getTagIds(users=users,
-                                      tags=tags,
-                                      community=community):
-            tag_obj = self._tagid_to_obj[tag_id]
-            if not tag_obj.name.startswith('topic.'):
-                result[tag_obj.name] = result.setdefault(tag_obj.name, 0) + 1
-        return sorted(result.items(), key=lambda x: x[1])
+    def _shown(self, name):
+        return not name.startswith('topic.')
     
     def getTopics(self, items=None, users=None, community=None, strip_prefix=False):
         """ See ITaggingEngine.
@@ -524,11 +783,13 @@ class TopicFilteredTags(Tags):
             return set([x for x in self._name_to_tagids.keys() 
                        if x.startswith('topic.')]) 
     
-        result = self.getTopicObjects(items, users, community=community)
+        ids = self._getTagIds(items, users, community=community)
+        names = [name for name in self.names_for(ids)
+                 if name.startswith('topic.')]
         if strip_prefix:
-            return set([tag.name.replace('topic.', '', 1) for tag in result]) # self.getTopicObjects() deals with filtering
+            return set([name.replace('topic.', '', 1) for name in names])
         else:
-            return set([tag.name for tag in result]) # self.getTopicObjects() deals with filtering
+            return set(names)
     
     def getTopicObjects(self, items=None, users=None, tags=None, community=None):
         """ See ITaggingEngine.
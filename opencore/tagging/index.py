@@ -41,6 +41,14 @@ class TagIndex(object):
         self.site = site
         self.tagsearch = tagsearch or filter_topic 
 
+    @property
+    def generation(self):
+        """ The tagging engine's generation counter (a ``Length``), which
+            changes whenever any tag does; None for engines which don't
+            keep one.
+        """
+        return getattr(self.site.tags, 'generation', None)
+
     def index_doc(self, docid, value):
         # the tagging engine handles this
         pass
@@ -77,22 +85,54 @@ class TagIndex(object):
             query = [query]
 
         query = self.tagsearch(query)
+        tags = self.site.tags
                
         if operator == 'or':
-            res = self.site.tags.getItems(
-                tags=query, users=users, community=community)
+            if users is None:
+                return self.family.IF.multiunion(
+                    [tags.items_tagged(tag, community) for tag in query])
+            ids = tags._getTagIds(tags=query, users=users,
+                                  community=community)
+            return tags.items_for(ids)
         elif operator == 'and':
-            sets = []
+            res = None
             for tag in query:
-                sets.append(self.site.tags.getItems(
-                    tags=[tag], users=users, community=community))
-            if sets:
-                res = reduce(set.intersection, sets)
-            else:
-                res = set()
+                if users is None:
+                    items = tags.items_tagged(tag, community)
+                else:
+                    ids = tags._getTagIds(tags=[tag], users=users,
+                                          community=community)
+                    items = tags.items_for(ids)
+                if res is None:
+                    # don't hand out the engine's own set
+                    res = self.family.IF.Set(items)
+                else:
+                    res = self.family.IF.intersection(res, items)
+                if not res:
+                    break
+            if res is None:
+                res = self.family.IF.Set()
+            return res
         else:
             raise TypeError('Tag index only supports `and` and `or` '
                 'operators, not `%s`.' % operator)
 
-        return self.family.IF.Set(res)
-    
+    def facet_counts(self, docids):
+        """ Count the documents in ``docids`` carrying each tag (or each
+            topic, for a topics index).
+        """
+        tags = self.site.tags
+        topics = self.tagsearch is add_topic
+        counts = {}
+        for docid in docids:
+            tagids = tags._item_to_tagids.get(docid)
+            if not tagids:
+                continue
+            names = tags.names_for(tagids)
+            for name in names:
+                if name.startswith('topic.') != topics:
+                    continue
+                if topics:
+                    name = name[len('topic.'):]
+                counts[name] = counts.get(name, 0) + 1
+        return counts
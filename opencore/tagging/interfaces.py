@@ -167,7 +167,23 @@ class ITaggingEngine(Interface):
         o 'degree' specifies the search depth.
         """
 
-    def getRelatedItems(item, community=None, user=None):
+    def getRelatedTagWeights(tag, community=None, user=None, limit=None):
+        """ Look up the tags used together with a given tag.
+
+        o 'tag' is the source tag.
+
+        o If 'community' is not None, restrict matches to tags on items
+          within the given community.
+
+        o If 'user' is not None, restrict matches to tags on items
+          tagged by the given user.
+
+        o Return a list of (tag, weight) tuples, heaviest first, where
+          'weight' is the number of times a user tagged an item with both
+          tags.  If 'limit' is not None, return only the 'limit' heaviest.
+        """
+
+    def getRelatedItems(item, community=None, user=None, limit=None):
         """ Look up a list of items related to a given item
 
         o Items are related if they have a least one tag in common with
@@ -183,18 +199,25 @@ class ITaggingEngine(Interface):
           'numTags' is the number of tags in common.
 
         o Sort the result in descending order by the numTags.
+
+        o If 'limit' is not None, return only the first 'limit' tuples.
         """
 
-    def getRelatedUsers(user, community=None):
+    def getRelatedUsers(user, community=None, limit=None):
         """ Look up a list of users related a given user.
 
         o Users are related if they have a least one tag in common with
           `user`.
 
+        o If 'community' is not None, restrict matches to tags on items
+          within the given community.
+
         o Returna list of tuples in the form (user, numTags), where
           numTags is the number of tags in common.
 
         o Sort the result in descending order by the numTags.
+
+        o If 'limit' is not None, return only the first 'limit' tuples.
         """
 
     def getFrequency(tags=None, community=None, user=None):
@@ -417,6 +417,100 @@ class TagsTests(unittest.TestCase):
         users = engine.getUsers(community='nonesuch')
         self.assertEqual(len(users), 0)
 
+    def test_getTagIds_returns_IOSet(self):
+        from BTrees.IOBTree import IOSet
+        engine = self._makeOne()
+        self._populate(engine)
+        for ids in (engine._getTagIds(),
+                    engine._getTagIds(tags=['bedrock'], users=['phred']),
+                    engine._getTagIds(items=[13, 99])):
+            self.failUnless(isinstance(ids, IOSet))
+        ids = engine._getTagIds(tags=['bedrock', 'neighbor'],
+                                users=['bharney'])
+        self.assertEqual(engine.names_for(ids), set(['bedrock', 'neighbor']))
+        self.assertEqual(len(engine._getTagIds(tags=['nonesuch'],
+                                               users=['phred'])), 0)
+        self.assertEqual(len(engine._getTagIds(tags=[])), 0)
+
+    def test_projections_dont_load_tags(self):
+        from BTrees.IFBTree import IFSet
+        engine = self._makeOne()
+        self._populate(engine)
+        ids = engine._getTagIds(tags=['bedrock'])
+        engine._tagid_to_obj = None
+        items = engine.items_for(ids)
+        self.failUnless(isinstance(items, IFSet))
+        self.assertEqual(list(items), [13, 42])
+        self.assertEqual(engine.names_for(ids), set(['bedrock']))
+        self.assertEqual(engine.users_for(ids), set(['phred', 'bharney']))
+
+    def test_update_indexes_builds_info(self):
+        # engines created before the projections were kept
+        engine = self._makeOne()
+        self._populate(engine)
+        expected = dict(engine._tagid_to_info)
+        del engine._tagid_to_info
+        engine.update_indexes()
+        self.assertEqual(dict(engine._tagid_to_info), expected)
+        ids = engine._getTagIds(users=['bharney'])
+        self.assertEqual(engine.names_for(ids), set(['bedrock', 'neighbor']))
+
+    def test_items_tagged_follows_changes(self):
+        self._registerCommunityFinder()
+        engine = self._makeOne()
+        self._populate(engine)
+        self.assertEqual(list(engine.items_tagged('bedrock')), [13, 42])
+        self.assertEqual(list(engine.items_tagged('bedrock', 'community')),
+                         [13, 42])
+        engine.update(13, 'phred', ('dinosaur',))
+        self.assertEqual(list(engine.items_tagged('bedrock')), [13, 42])
+        engine.delete(item=42)
+        engine.rename('bedrock', 'neighbor')
+        self.assertEqual(list(engine.items_tagged('neighbor')), [13])
+        self.assertEqual(list(engine.items_tagged('bedrock')), [])
+        self.assertEqual(list(engine.items_tagged('neighbor', 'community')),
+                         [13])
+        self.assertEqual(list(engine.items_tagged('neighbor', 'nonesuch')),
+                         [])
+        self.assertEqual(list(engine._name_to_items.keys()),
+                         ['dinosaur', 'neighbor'])
+
+    def test_update_indexes_builds_postings(self):
+        # engines created before the postings were kept
+        engine = self._makeOne()
+        self._populate(engine)
+        del engine._name_to_items
+        del engine._community_name_to_items
+        engine.update_indexes()
+        self.assertEqual(list(engine.items_tagged('bedrock')), [13, 42])
+        engine.delete(item=42, user='bharney')
+        self.assertEqual(list(engine._name_to_items['bedrock']), [13])
+        self.assertEqual(engine.getItems(['bedrock', 'dinosaur']),
+                         set([13]))
+
+    def test_generation(self):
+        engine = self._makeOne()
+        self.assertEqual(engine.generation.value, 0)
+        self._populate(engine)
+        self.assertEqual(engine.generation.value, 3)
+        engine.update(13, 'bharney', ('bedrock',))
+        self.assertEqual(engine.generation.value, 3)
+        engine.delete(item=42)
+        engine.rename('bedrock', 'b-e-d-r-o-c-k')
+        engine.reassign('phred', 'wylma')
+        self.assertEqual(engine.generation.value, 6)
+
+    def test_update_indexes_adds_generation(self):
+        # engines created before the generation was kept
+        engine = self._makeOne()
+        self._populate(engine)
+        del engine.generation
+        self.assertEqual(engine.generation, None)
+        engine.update_indexes()
+        self.assertEqual(engine.generation.value, 0)
+        engine.delete(item=13)
+        self.assertEqual(engine.generation.value, 1)
+
     def test_getRelatedTags_defaults(self):
         engine = self._makeOne()
         engine.update(13, 'phred', ('foo', 'bar'))
@@ -427,7 +521,65 @@ class TagsTests(unittest.TestCase):
         self.failUnless('foo' in related)
         self.failUnless('baz' in related)
 
-    #def test_getRelatedTags_w_degree_gt_1(self): #TODO
+    def test_getRelatedTags_w_degree_gt_1(self):
+        engine = self._makeOne()
+        engine.update(13, 'phred', ('foo', 'bar'))
+        engine.update(14, 'bharney', ('foo', 'qux'))
+        engine.update(15, 'phred', ('qux', 'baz'))
+        self.assertEqual(engine.getRelatedTags('bar'), set(['foo']))
+        self.assertEqual(engine.getRelatedTags('bar', degree=2),
+                         set(['foo', 'qux']))
+        self.assertEqual(engine.getRelatedTags('bar', degree=3),
+                         set(['foo', 'qux', 'baz']))
+
+    def test_update_indexes_builds_cooccurrence(self):
+        # engines created before co-occurrences were kept
+        engine = self._makeOne()
+        engine.update(13, 'phred', ('foo', 'bar'))
+        engine.update(15, 'phred', ('bar', 'baz'))
+        engine.update(14, 'bharney', ('foo', 'bar'))
+        del engine._cooccurrence
+        del engine._community_cooccurrence
+        engine.update_indexes()
+        self.assertEqual(dict(engine._cooccurrence['bar']),
+                         {'foo': 2, 'baz': 1})
+        self.assertEqual(engine.getRelatedTags('bar'), set(['foo', 'baz']))
+
+    def test_cooccurrence_follows_changes(self):
+        self._registerCommunityFinder()
+        engine = self._makeOne()
+        engine.update(13, 'phred', ('foo', 'bar', 'baz'))
+        engine.update(14, 'bharney', ('foo', 'bar'))
+        engine.update(14, 'wylma', ('bar', 'qux'))
+        engine.update(13, 'phred', ('foo', 'bar'))
+        engine.rename('foo', 'phoo')
+        engine.reassign('wylma', 'fred')
+        engine.delete(item=13)
+        expected = {'phoo': {'bar': 1}, 'bar': {'phoo': 1, 'qux': 1},
+                    'qux': {'bar': 1}}
+        cooccurrence = dict([(name, dict(weights)) for name, weights
+                             in engine._cooccurrence.items() if weights])
+        self.assertEqual(cooccurrence, expected)
+        weights = engine._community_cooccurrence['community']
+        self.assertEqual(dict(weights['bar']), {'phoo': 1, 'qux': 1})
+
+    def test_getRelatedTagWeights(self):
+        self._registerCommunityFinder()
+        engine = self._makeOne()
+        engine.update(13, 'phred', ('foo', 'bar', 'baz'))
+        engine.update(14, 'bharney', ('foo', 'bar'))
+        engine.update(15, 'phred', ('bar', 'qux'))
+        engine.update(16, 'phred', ('bar', 'qux'))
+        self.assertEqual(engine.getRelatedTagWeights('bar', limit=2),
+                         [('foo', 2), ('qux', 2)])
+        self.assertEqual(engine.getRelatedTagWeights('bar', user='bharney'),
+                         [('foo', 1)])
+        self.assertEqual(engine.getRelatedTagWeights('foo',
+                                                     community='community'),
+                         [('bar', 2), ('baz', 1)])
+        self.assertEqual(engine.getRelatedTagWeights('bar',
+                                                     community='nonesuch'),
+                         [])
 
     def test_getRelatedTags_w_matching_community(self):
         self._registerCommunityFinder()
@@ -546,6 +698,20 @@ class TagsTests(unittest.TestCase):
         related = engine.getRelatedUsers(user='phred', community='nonesuch')
         self.assertEqual(len(related), 0)
 
+    def test_getRelatedItems_and_getRelatedUsers_w_limit(self):
+        engine = self._makeOne()
+        engine.update(13, 'phred', ('foo', 'bar', 'baz'))
+        engine.update(14, 'wylma', ('foo', 'bar'))
+        engine.update(15, 'bharney', ('foo', 'qux'))
+        engine.update(16, 'phred', ('foo', 'bar', 'baz'))
+        self.assertEqual(engine.getRelatedItems(13, limit=2),
+                         [(16, 3), (14, 2)])
+        self.assertEqual(engine.getRelatedItems(13, user='phred', limit=1),
+                         [(16, 3)])
+        self.assertEqual(engine.getRelatedUsers('phred', limit=2),
+                         [('wylma', 2), ('bharney', 1)])
+        self.assertEqual(engine.getRelatedUsers('phred', limit=0), [])
+
     def test_getFrequency_defaults(self):
         engine = self._makeOne()
         engine.update(13, 'phred', ('foo', 'bar'))
@@ -607,6 +773,37 @@ class TagsTests(unittest.TestCase):
         freq = engine.getFrequency(community='nonesuch')
         self.assertEqual(len(freq), 0)
 
+    def test_counts_follow_changes(self):
+        self._registerCommunityFinder()
+        engine = self._makeOne()
+        self._populate(engine)
+        self.assertEqual(dict(engine._name_counts),
+                         {'bedrock': 3, 'dinosaur': 1, 'neighbor': 1})
+        self.assertEqual(dict(engine._community_counts['community']),
+                         {'bedrock': 3, 'dinosaur': 1, 'neighbor': 1})
+        engine.delete(item=42)
+        engine.rename('bedrock', 'b-e-d-r-o-c-k')
+        expected = {'b-e-d-r-o-c-k': 2, 'dinosaur': 1}
+        self.assertEqual(dict(engine._name_counts), expected)
+        self.assertEqual(dict(engine._community_counts['community']),
+                         expected)
+        self.assertEqual(dict(engine.getCloud()), expected)
+        self.assertEqual(engine.getFrequency(),
+                         [('dinosaur', 1), ('b-e-d-r-o-c-k', 2)])
+
+    def test_update_indexes_builds_counters(self):
+        # engines created before the counters were kept
+        self._registerCommunityFinder()
+        engine = self._makeOne()
+        self._populate(engine)
+        del engine._name_counts
+        del engine._community_counts
+        engine.update_indexes()
+        self.assertEqual(dict(engine._name_counts),
+                         {'bedrock': 3, 'dinosaur': 1, 'neighbor': 1})
+        self.assertEqual(dict(engine.getCloud(community='community')),
+                         {'bedrock': 3, 'dinosaur': 1, 'neighbor': 1})
+
     def test_update_one(self):
         from opencore.tagging import Tag
         from opencore.tagging import TagAddedEvent
@@ -1135,6 +1332,32 @@ class TagsTests(unittest.TestCase):
         self.assertEqual(found[0], 'bambam')
         self.assertEqual(found[1], 'bedrock')
 
+class TopicFilteredTagsTests(unittest.TestCase):
+
+    def setUp(self):
+        testing.setUp()
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _getTargetClass(self):
+        from opencore.tagging import TopicFilteredTags
+        return TopicFilteredTags
+
+    def _makeOne(self):
+        return self._getTargetClass()(testing.DummyModel())
+
+    def test_getCloud_and_getFrequency_skip_topics(self):
+        engine = self._makeOne()
+        engine.update(13, 'phred', ('foo', 'topic.bar'))
+        engine.update(14, 'bharney', ('foo', 'topic.bar'))
+        self.assertEqual(engine.getCloud(), set([('foo', 2)]))
+        self.assertEqual(engine.getCloud(items=13), set([('foo', 1)]))
+        self.assertEqual(engine.getFrequency(), [('foo', 2)])
+        self.assertEqual(engine.getFrequency(tags=['foo', 'topic.bar']),
+                         [('topic.bar', 0), ('foo', 2)])
+        self.assertEqual(engine.getTopics(), set(['topic.bar']))
+
 class TagCommunityFinderTests(unittest.TestCase):
 
     def setUp(self):
@@ -1309,16 +1532,77 @@ class TagIndexTests(unittest.TestCase):
         self.assertRaises(TypeError, index.apply,
             dict(query=[], operator='foo'))
 
+    def _makeTagged(self, tagsearch=None):
+        from opencore.tagging import Tags
+        site = testing.DummyModel()
+        site.tags = Tags(site)
+        site.tags.update(1, 'phred', ['a', 'b', 'topic.x'])
+        site.tags.update(1, 'bharney', ['a'])
+        site.tags.update(2, 'phred', ['a', 'topic.x', 'topic.y'])
+        site.tags.update(3, 'phred', ['b'])
+        return self._getTargetClass()(site, tagsearch)
+
+    def test_apply_w_engine(self):
+        testing.setUp()
+        try:
+            index = self._makeTagged()
+            and_ = index.apply(['a', 'b'])
+            or_ = index.apply({'query': ['a', 'b'], 'operator': 'or'})
+            by_user = index.apply({'query': 'a', 'users': ['bharney']})
+            one = index.apply('a')
+            one.insert(5)
+            again = index.apply('a')
+        finally:
+            testing.tearDown()
+        self.assertEqual(list(and_), [1])
+        self.assertEqual(list(or_), [1, 2, 3])
+        self.assertEqual(list(by_user), [1])
+        self.assertEqual(list(again), [1, 2])
+
+    def test_generation(self):
+        index = self._makeOne()
+        self.assertEqual(index.generation, None)
+        index.site.tags.generation = generation = object()
+        self.failUnless(index.generation is generation)
+
+    def test_facet_counts(self):
+        testing.setUp()
+        try:
+            index = self._makeTagged()
+            counts = index.facet_counts(index.family.IF.Set([1, 2]))
+        finally:
+            testing.tearDown()
+        self.assertEqual(counts, {'a': 2, 'b': 1})
+
+    def test_facet_counts_topics(self):
+        from opencore.tagging.index import add_topic
+        testing.setUp()
+        try:
+            index = self._makeTagged(add_topic)
+            counts = index.facet_counts(index.family.IF.Set([1, 2, 3]))
+        finally:
+            testing.tearDown()
+        self.assertEqual(counts, {'x': 2, 'y': 1})
+
 
 class DummyTaggingEngine:
     def getItems(self, tags, users=None, community=None):
-        res = set()
-        if 'a' in tags:
-            res.add(1)
-            res.add(2)
-        if 'b' in tags:
-            res.add(2)
-            res.add(3)
+        return set(self.items_for(tags))
+
+    def _getTagIds(self, items=None, users=None, tags=None, community=None):
+        # the tag names stand in for tag ids
+        return tags
+
+    def items_tagged(self, name, community=None):
+        return self.items_for([name])
+
+    def items_for(self, tagids):
+        from BTrees.IFBTree import IFSet
+        res = IFSet()
+        if 'a' in tagids:
+            res.update([1, 2])
+        if 'b' in tagids:
+            res.update([2, 3])
         return res
 
 
@@ -50,6 +50,10 @@ class DummyCatalog(dict):
     def index_doc(self, docid, object):
         self.indexed.append(object)
 
+    def index_docs(self, docs):
+        for docid, object in docs:
+            self.index_doc(docid, object)
+
     def unindex_doc(self, docid):
         self.unindexed.append(docid)
 
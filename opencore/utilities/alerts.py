@@ -72,9 +72,7 @@ def alert_user(profile, event):
 
 def is_first_entry(context, user):
     first_entry_query = dict(creator=user,
-                             interfaces={'query': [ICommunityContent, IComment], 'operator': 'or'},
-                             sort_index='modified_date',
-                             limit=1)    
+                             interfaces={'query': [ICommunityContent, IComment], 'operator': 'or'})
     return query_count(context, **first_entry_query) == 0  
 
 class Alerts(object):
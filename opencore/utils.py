@@ -163,7 +163,7 @@ def debugsearch(context, **kw):
 
 def query_count(context, **kw):
     searcher = ICatalogSearch(context)
-    total, docids, resolver = searcher(**kw)  
+    total, docids, resolver = searcher(count_only=True, **kw)
     return total 
 
 def list_indexes(context):
@@ -48,6 +48,7 @@ from opencore.models.interfaces import ICatalogSearch
 from opencore.models.interfaces import ICommunity
 from opencore.models.interfaces import ICommunityContent
 from opencore.models.interfaces import IProfile
+from opencore.models.profiler import profile_query
 from opencore.utilities.rename_user import rename_user
 
 from opencore.utils import find_community
@@ -71,6 +72,7 @@ class AdminTemplateAPI(TemplateAPI):
         self.error_monitoring = not not get_setting(
             context, 'error_monitor_subsystems', None
         )
+        self.query_profile_enabled = profile_query.is_enabled()
         statistics_folder = get_setting(context, 'statistics_folder', None)
         if statistics_folder is not None:
             csv_files = [fn for fn in os.listdir(statistics_folder)
@@ -355,6 +357,41 @@ def statistics_csv_view(request):
 
     return request.get_response(FileApp(path).get)
 
+def query_profile_view(context, request, profiler=profile_query):
+    if request.method == 'POST' and 'reset' in request.POST:
+        profiler.reset()
+        return HTTPFound(location=model_url(context, request,
+                                            'query_profile.html'))
+    shapes = []
+    for shape, profile in profiler.snapshot()['shapes'].items():
+        duration = profile['duration_us']
+        indexes = sorted(profile['indexes'].items(),
+                         key=lambda item: -(item[1]['apply_us']['p95']))
+        shapes.append(dict(
+            shape=shape,
+            count=duration['count'],
+            hits=profile['hits'],
+            misses=profile['misses'],
+            p50=duration['p50'] / 1000.0,
+            p95=duration['p95'] / 1000.0,
+            p99=duration['p99'] / 1000.0,
+            sort_p95=(profile['sort_us'].get('p95') or 0) / 1000.0,
+            indexes=[dict(name=name,
+                          p95=index['apply_us']['p95'] / 1000.0,
+                          size=index['size']['p50'])
+                     for name, index in indexes],
+        ))
+    shapes.sort(key=lambda shape: -shape['p95'])
+    return dict(
+        api=AdminTemplateAPI(context, request),
+        menu=_menu_macro(),
+        enabled=profiler.is_enabled(),
+        shapes=shapes,
+    )
+
+def query_profile_json(context, request, profiler=profile_query):
+    return profiler.snapshot()
+
 def _decode(s):
     """
     Convert to unicode, by hook or crook.
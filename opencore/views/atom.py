@@ -265,6 +265,7 @@ def atom_trim(items):
     return items[:N_ENTRIES]
 
 def atom_search(q, context):
+    q['offset'] = 0
     q['limit']  = N_ENTRIES
     q['sort_index']  = 'modified_date'
     q['reverse'] = True
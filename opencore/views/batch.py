@@ -53,33 +53,46 @@ def get_catalog_batch(context, request, filter_func=None, **kw):
     kw['sort_index'] = sort_index
     # the reverse parameter is only useful when there's a sort index
     kw['reverse'] = reverse
+    # only ask the catalog for (and sort) the docids of this batch
+    kw['offset'] = batch_start
+    kw['limit'] = batch_size
 
     log.debug('get_catalog_batch query=%s' % str(kw))
     searcher = ICatalogSearch(context)
-    total, docids, resolver = searcher(**kw)
-    log.debug('search returned %d' % total)
+    num, docids, resolver = searcher(**kw)
+    log.debug('search returned %d' % num)
+    resolve_many = getattr(searcher, 'resolve_many', None)
 
+    total = num
     batch = []
-    i = -1
 
     if batch_start < total: # there will always be at least this many docs
-        for docid in docids:
-            i +=1
-            if i < batch_start:
-                continue
-            if i >= batch_start + batch_size:
+        while True:
+            read = 0
+            if resolve_many is not None:
+                models = resolve_many(docids, prefetch=True)
+            else:
+                models = map(resolver, docids)
+            for model in models:
+                read += 1
+                if model is None:
+                    total -= 1
+                    continue
+                if filter_func and not filter_func(model):
+                    total -= 1
+                    continue
+                batch.append(model)
+                if len(batch) >= batch_size:
+                    break
+            if len(batch) >= batch_size or read != kw['limit']:
                 break
-            model = resolver(docid)
-            if model is None:
-                i -= 1
-                total -= 1
-                continue
-            if filter_func and not filter_func(model):
-                i -= 1
-                total -= 1
-                continue
-
-            batch.append(model)
+            # Some models were missing or filtered out: read on past the
+            # page to fill the batch.
+            kw['offset'] += read
+            if kw['offset'] >= num:
+                break
+            kw['limit'] = batch_size - len(batch)
+            _, docids, resolver = searcher(**kw)
     else:
         batch_start = total
 
@@ -86,7 +86,7 @@ def json_communities_helper(context, request):
     communities_path = model_path(context)
     query = dict(
         interfaces=[ICommunity],
-        path={'query': communities_path, 'depth': 1}
+        parent=communities_path,
     )
     try:
         batch_info = get_catalog_batch_grid(context, request, None, **query)
@@ -108,7 +108,7 @@ def show_communities_view_helper(context,
     query = dict(
         sort_index='title',
         interfaces=[ICommunity],
-        path={'query': communities_path, 'depth': 1},
+        parent=communities_path,
         #allowed={'query': effective_principals(request), 'operator': 'or'},
         **kw
         )
@@ -116,7 +116,8 @@ def show_communities_view_helper(context,
     qualifiers = []
     titlestartswith = request.params.get('titlestartswith')
     if titlestartswith:
-        query['titlestartswith'] = (titlestartswith, titlestartswith)
+        query['titlestartswith'] = titlestartswith
+        query['sort_index'] = 'titlestartswith'
         qualifiers.append("Communities that begin with '%s'" % titlestartswith)
 
     body = request.params.get('body')
@@ -272,6 +272,7 @@ def number_of_comments(forum, request):
         interfaces=[IComment],
         path={'query': model_path(forum)},
         allowed={'query': effective_principals(request), 'operator': 'or'},
+        count_only=True,
         )
     return total
 
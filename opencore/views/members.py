@@ -119,7 +119,7 @@ def _member_profile_batch(context, request):
         context, request,
         batch_size = 12,
         interfaces = [IProfile],
-        path={'query': profiles_path, 'depth': 1},
+        parent=profiles_path,
         allowed={'query': effective_principals(request), 'operator': 'or'},
         name = list(member_names),
         sort_index='lastfirst',
@@ -975,8 +975,8 @@ def jquery_member_search_view(context, request):
     moderator_names = community.moderator_names
     community_member_names = member_names.union(moderator_names)
     query = dict(
-        member_name='%s*' % prefix,
-        sort_index='title',
+        member_name=prefix,
+        sort_index='member_name',
         limit=20,
         )
     searcher = ICatalogSearch(context)
@@ -17,6 +17,7 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
 
+import heapq
 import uuid
 import logging
 import random
@@ -126,7 +127,8 @@ def show_profiles_view(context, request):
 
     titlestartswith = request.params.get('titlestartswith')
     if titlestartswith:
-        query['titlestartswith'] = (titlestartswith, titlestartswith)
+        query['titlestartswith'] = titlestartswith
+        query['sort_index'] = 'titlestartswith'
 
     num, docids, resolver = search(**query)
 
@@ -159,13 +161,13 @@ def profile_json_list(context, request):
     records = []
     query = dict(
         interfaces=[IProfile],
-        sort_index='title',
+        sort_index='member_name',
         limit=20,
         )
 
     prefix = request.params.get('search')
     if prefix:
-        query['member_name'] = '%s*' % prefix.lower()
+        query['member_name'] = prefix
 
     searcher = ICatalogSearch(context)
     try:
@@ -269,11 +271,9 @@ class ShowProfileView(object):
         else:
             tags = []
             names = tagger.getTags(users=[context.__name__])
-            for name, count in sorted(tagger.getFrequency(names,
-                                                          user=context.__name__),
-                                      key=lambda x: x[1],
-                                      reverse=True,
-                                     )[:10]:
+            for name, count in heapq.nlargest(
+                    10, tagger.getFrequency(names, user=context.__name__),
+                    key=lambda x: x[1]):
                 tags.append({'name': name, 'count': count})
 
 
@@ -330,6 +330,42 @@ class SearchResultsView(object):
         return return_data
 
 
+def _livesearch_counts(context, request, searchterm, groups):
+    """ Count the matches in each livesearch group with a single faceted
+    search over the groups' interfaces.
+
+    Returns a ``{groupname: count}`` dict, or None if the groups can't be
+    counted this way.
+    """
+    interfaces = []
+    for groupname, factory in groups:
+        group_interfaces = getattr(factory, 'interfaces', None)
+        if not group_interfaces:
+            return None
+        interfaces.extend(group_interfaces)
+    if not interfaces:
+        return None
+    searcher = ICatalogSearch(context)
+    if not hasattr(searcher, 'facets'):
+        return None
+    principals = effective_principals(request)
+    try:
+        num, facets = searcher.facets(
+            ['interfaces'],
+            texts=searchterm,
+            interfaces={'query': interfaces, 'operator': 'or'},
+            allowed={'query': principals, 'operator': 'or'},
+            )
+    except ParseError:
+        return None
+    found = facets['interfaces']
+    counts = {}
+    for groupname, factory in groups:
+        counts[groupname] = sum(
+            [found.get(iface, 0) for iface in factory.interfaces])
+    return counts
+
+
 class LivesearchResults(list):
 
     def __init__(self):
@@ -385,20 +421,26 @@ def jquery_livesearch_view(context, request):
                     ),
             )
 
+    groups = []
     for listitem in get_listitems(IGroupSearchFactory):
         utility = listitem['component']
 
         factory = utility(context, request, searchterm)
 
-        if factory is None:
-            continue
+        if factory is not None:
+            groups.append((listitem['title'], factory))
 
-        try:
-            num, docids, resolver = factory()
-        except ParseError:
-            continue
+    counts = _livesearch_counts(context, request, searchterm, groups)
 
-        groupname = listitem['title']
+    for groupname, factory in groups:
+        if counts is not None and not counts[groupname]:
+            # nothing to show, so don't run the group's search
+            num, docids, resolver = 0, (), None
+        else:
+            try:
+                num, docids, resolver = factory()
+            except ParseError:
+                continue
 
         records.set_header(groupname,
             pre = '<div class="header">%s</div>' % (groupname, ),
@@ -17,6 +17,7 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
 
+import heapq
 import math
 import re
 from simplejson import JSONEncoder
@@ -294,8 +295,7 @@ def tag_cloud_view(context, request):
     tags = find_tags(context)
     if tags is not None:
         cloud = [{'name': x[0], 'count': x[1]} for x in tags.getCloud()]
-        limited = list(reversed(sorted(cloud, key=lambda x: x['count']))
-                      )[:100]
+        limited = heapq.nlargest(100, cloud, key=lambda x: x['count'])
         entries = sorted(_calculateTagWeights(limited),
                          key=lambda x: x['name'])
     else:
@@ -314,8 +314,7 @@ def community_tag_cloud_view(context, request):
     if tags is not None:
         cloud = [{'name': x[0], 'count': x[1]}
                     for x in tags.getCloud(community=context.__name__)]
-        limited = list(reversed(sorted(cloud, key=lambda x: x['count']))
-                      )[:100]
+        limited = heapq.nlargest(100, cloud, key=lambda x: x['count'])
         entries = sorted(_calculateTagWeights(limited),
                          key=lambda x: x['name'])
     else:
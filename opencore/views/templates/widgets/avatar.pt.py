@@ -0,0 +1,211 @@
+registry = dict(version=0)
+def bind():
+    from cPickle import loads as _loads
+    _lookup_attr = _loads('cchameleon.core.codegen\nlookup_attr\np1\n.')
+    _init_scope = _loads('cchameleon.core.utils\necontext\np1\n.')
+    _re_amp = _loads("cre\n_compile\np1\n(S'&(?!([A-Za-z]+|#[0-9]+);)'\np2\nI0\ntRp3\n.")
+    _attrs_139908673716560 = _loads('(dp1\nVname\np2\nV__start__\np3\nsVtype\np4\nVhidden\np5\nsVvalue\np6\nV${field.name}:mapping\np7\ns.')
+    _attrs_139908673718608 = _loads('(dp1\nVclass\np2\nVavatar\np3\ns.')
+    _attrs_139908673718096 = _loads('(dp1\nVsrc\np2\nV${api.find_image_url(context)}\np3\nsValt\np4\nV${context.firstname} ${context.lastname}\np5\ns.')
+    _init_stream = _loads('cchameleon.core.generation\ninitialize_stream\np1\n.')
+    _init_default = _loads('cchameleon.core.generation\ninitialize_default\np1\n.')
+    _attrs_139908673717136 = _loads('(dp1\nVname\np2\nVupload\np3\nsVtype\np4\nVfile\np5\nsVid\np6\nV${field.oid}\np7\ns.')
+    _attrs_139908673717584 = _loads('(dp1\nVclass\np2\nVfile-upload\np3\ns.')
+    _attrs_139908673716624 = _loads('(dp1\nVclass\np2\nVbutton highlight\np3\ns.')
+    _attrs_139908673718992 = _loads('(dp1\nVclass\np2\nVdeformFileupload\np3\ns.')
+    _init_tal = _loads('cchameleon.core.generation\ninitialize_tal\np1\n.')
+    _attrs_139908673720208 = _loads('(dp1\nVname\np2\nV__end__\np3\nsVtype\np4\nVhidden\np5\nsVvalue\np6\nV${field.name}:mapping\np7\ns.')
+    def render(econtext, rcontext=None):
+        macros = econtext.get('macros')
+        _translate = econtext.get('_translate')
+        _slots = econtext.get('_slots')
+        target_language = econtext.get('target_language')
+        u'_init_stream()'
+        (_out, _write, ) = _init_stream()
+        u'_init_tal()'
+        (_attributes, repeat, ) = _init_tal()
+        u'_init_default()'
+        _default = _init_default()
+        u'None'
+        default = None
+        u'None'
+        _domain = None
+        attrs = _attrs_139908673718992
+        _write(u'<div class="deformFileupload">\n\n     ')
+        attrs = _attrs_139908673718608
+        _write(u'<span class="avatar">\n       ')
+        attrs = _attrs_139908673718096
+        "join(value('api.find_image_url(context)'),)"
+        _write(u'<img')
+        _tmp1 = _lookup_attr(econtext['api'], 'find_image_url')(econtext['context'])
+        if (_tmp1 is _default):
+            _tmp1 = u'${api.find_image_url(context)}'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' src="' + _tmp1) + '"'))
+        "join(value('context.firstname'), u' ', value('context.lastname'))"
+        _tmp1 = ('%s%s%s' % (_lookup_attr(econtext['context'], 'firstname'), ' ', _lookup_attr(econtext['context'], 'lastname'), ))
+        if (_tmp1 is _default):
+            _tmp1 = u'${context.firstname} ${context.lastname}'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' alt="' + _tmp1) + '"'))
+        _write(u' />\n     </span>\n\n    ')
+        attrs = _attrs_139908673716560
+        "join(value('field.name'), u':mapping')"
+        _write(u'<input type="hidden" name="__start__"')
+        _tmp1 = ('%s%s' % (_lookup_attr(econtext['field'], 'name'), ':mapping', ))
+        if (_tmp1 is _default):
+            _tmp1 = u'${field.name}:mapping'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' value="' + _tmp1) + '"'))
+        _write(u' />\n\n    ')
+        attrs = _attrs_139908673717584
+        _write(u'<div class="file-upload">\n      ')
+        attrs = _attrs_139908673717136
+        "join(value('field.oid'),)"
+        _write(u'<input type="file" name="upload"')
+        _tmp1 = _lookup_attr(econtext['field'], 'oid')
+        if (_tmp1 is _default):
+            _tmp1 = u'${field.oid}'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' id="' + _tmp1) + '"'))
+        'field.widget.size'
+        _tmp1 = _lookup_attr(_lookup_attr(econtext['field'], 'widget'), 'size')
+        if (_tmp1 is _default):
+            _tmp1 = None
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' size="' + _tmp1) + '"'))
+        'field.widget.css_class'
+        _tmp1 = _lookup_attr(_lookup_attr(econtext['field'], 'widget'), 'css_class')
+        if (_tmp1 is _default):
+            _tmp1 = None
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' class="' + _tmp1) + '"'))
+        _write(u' />\n      ')
+        attrs = _attrs_139908673716624
+        _write(u'<div class="button highlight">Upload an image</div>\n    </div>\n\n    ')
+        attrs = _attrs_139908673720208
+        "join(value('field.name'), u':mapping')"
+        _write(u'<input type="hidden" name="__end__"')
+        _tmp1 = ('%s%s' % (_lookup_attr(econtext['field'], 'name'), ':mapping', ))
+        if (_tmp1 is _default):
+            _tmp1 = u'${field.name}:mapping'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' value="' + _tmp1) + '"'))
+        _write(u' />\n\n</div>')
+        return _out.getvalue()
+    return render
+
+__filename__ = '/root/package/opencore/views/templates/widgets/avatar.pt'
+registry[(None, True, '72cfe6c8335eaf0ea088745bbecd77841ea68acf')] = bind()
@@ -0,0 +1,146 @@
+registry = dict(version=0)
+def bind():
+    from cPickle import loads as _loads
+    _lookup_attr = _loads('cchameleon.core.codegen\nlookup_attr\np1\n.')
+    _init_scope = _loads('cchameleon.core.utils\necontext\np1\n.')
+    _re_amp = _loads("cre\n_compile\np1\n(S'&(?!([A-Za-z]+|#[0-9]+);)'\np2\nI0\ntRp3\n.")
+    _attrs_139908674149008 = _loads('(dp1\nVhref\np2\nV/terms/ajax.html\np3\nsVclass\np4\nVterms-conditions-link\np5\ns.')
+    _init_stream = _loads('cchameleon.core.generation\ninitialize_stream\np1\n.')
+    _init_tal = _loads('cchameleon.core.generation\ninitialize_tal\np1\n.')
+    _init_default = _loads('cchameleon.core.generation\ninitialize_default\np1\n.')
+    _attrs_139908674148112 = _loads('(dp1\nVname\np2\nV${field.name}\np3\nsVvalue\np4\nV${field.widget.true_val}\np5\nsVtype\np6\nVcheckbox\np7\nsVid\np8\nV${field.oid}\np9\ns.')
+    def render(econtext, rcontext=None):
+        macros = econtext.get('macros')
+        _translate = econtext.get('_translate')
+        _slots = econtext.get('_slots')
+        target_language = econtext.get('target_language')
+        u'_init_stream()'
+        (_out, _write, ) = _init_stream()
+        u'_init_tal()'
+        (_attributes, repeat, ) = _init_tal()
+        u'_init_default()'
+        _default = _init_default()
+        u'None'
+        default = None
+        u'None'
+        _domain = None
+        attrs = _attrs_139908674148112
+        "join(value('field.name'),)"
+        _write(u'<input type="checkbox"')
+        _tmp1 = _lookup_attr(econtext['field'], 'name')
+        if (_tmp1 is _default):
+            _tmp1 = u'${field.name}'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' name="' + _tmp1) + '"'))
+        "join(value('field.widget.true_val'),)"
+        _tmp1 = _lookup_attr(_lookup_attr(econtext['field'], 'widget'), 'true_val')
+        if (_tmp1 is _default):
+            _tmp1 = u'${field.widget.true_val}'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' value="' + _tmp1) + '"'))
+        "join(value('field.oid'),)"
+        _tmp1 = _lookup_attr(econtext['field'], 'oid')
+        if (_tmp1 is _default):
+            _tmp1 = u'${field.oid}'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' id="' + _tmp1) + '"'))
+        'cstruct == field.widget.true_val'
+        _tmp1 = (econtext['cstruct'] == _lookup_attr(_lookup_attr(econtext['field'], 'widget'), 'true_val'))
+        if (_tmp1 is _default):
+            _tmp1 = None
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' checked="' + _tmp1) + '"'))
+        'field.widget.css_class'
+        _tmp1 = _lookup_attr(_lookup_attr(econtext['field'], 'widget'), 'css_class')
+        if (_tmp1 is _default):
+            _tmp1 = None
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' class="' + _tmp1) + '"'))
+        _write(' />I accept the ')
+        attrs = _attrs_139908674149008
+        _write(u'<a href="/terms/ajax.html" class="terms-conditions-link">Terms of Use</a>.')
+        return _out.getvalue()
+    return render
+
+__filename__ = '/root/package/opencore/views/templates/widgets/terms_of_use.pt'
+registry[(None, True, '72cfe6c8335eaf0ea088745bbecd77841ea68acf')] = bind()
@@ -0,0 +1,85 @@
+registry = dict(version=0)
+def bind():
+    from cPickle import loads as _loads
+    _lookup_attr = _loads('cchameleon.core.codegen\nlookup_attr\np1\n.')
+    _init_scope = _loads('cchameleon.core.utils\necontext\np1\n.')
+    _re_amp = _loads("cre\n_compile\np1\n(S'&(?!([A-Za-z]+|#[0-9]+);)'\np2\nI0\ntRp3\n.")
+    _attrs_139908673560720 = _loads('(dp1\nVname\np2\nV__start__\np3\nsVtype\np4\nVhidden\np5\nsVvalue\np6\nV${field.name}:sequence\np7\ns.')
+    _attrs_139908673562448 = _loads('(dp1\nVname\np2\nV__end__\np3\nsVtype\np4\nVhidden\np5\nsVvalue\np6\nV${field.name}:sequence\np7\ns.')
+    _init_stream = _loads('cchameleon.core.generation\ninitialize_stream\np1\n.')
+    _init_default = _loads('cchameleon.core.generation\ninitialize_default\np1\n.')
+    _attrs_139908673562000 = _loads('(dp1\nVname\np2\nVa_user\np3\nsVclass\np4\nVtext add-user\np5\ns.')
+    _init_tal = _loads('cchameleon.core.generation\ninitialize_tal\np1\n.')
+    def render(econtext, rcontext=None):
+        macros = econtext.get('macros')
+        _translate = econtext.get('_translate')
+        _slots = econtext.get('_slots')
+        target_language = econtext.get('target_language')
+        u'_init_stream()'
+        (_out, _write, ) = _init_stream()
+        u'_init_tal()'
+        (_attributes, repeat, ) = _init_tal()
+        u'_init_default()'
+        _default = _init_default()
+        u'None'
+        default = None
+        u'None'
+        _domain = None
+        _write(u'\n    ')
+        attrs = _attrs_139908673560720
+        "join(value('field.name'), u':sequence')"
+        _write(u'<input type="hidden" name="__start__"')
+        _tmp1 = ('%s%s' % (_lookup_attr(econtext['field'], 'name'), ':sequence', ))
+        if (_tmp1 is _default):
+            _tmp1 = u'${field.name}:sequence'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' value="' + _tmp1) + '"'))
+        _write(u' />\n    ')
+        attrs = _attrs_139908673562000
+        _write(u'<select name="a_user" class="text add-user"></select>\n    ')
+        attrs = _attrs_139908673562448
+        "join(value('field.name'), u':sequence')"
+        _write(u'<input type="hidden" name="__end__"')
+        _tmp1 = ('%s%s' % (_lookup_attr(econtext['field'], 'name'), ':sequence', ))
+        if (_tmp1 is _default):
+            _tmp1 = u'${field.name}:sequence'
+        if ((_tmp1 is not None) and (_tmp1 is not False)):
+            if (_tmp1.__class__ not in (str, unicode, int, float, )):
+                _tmp1 = unicode(_translate(_tmp1, domain=_domain, mapping=None, target_language=target_language, default=None))
+            else:
+                if not isinstance(_tmp1, unicode):
+                    _tmp1 = unicode(str(_tmp1), 'utf-8')
+            if ('&' in _tmp1):
+                if (';' in _tmp1):
+                    _tmp1 = _re_amp.sub('&amp;', _tmp1)
+                else:
+                    _tmp1 = _tmp1.replace('&', '&amp;')
+            if ('<' in _tmp1):
+                _tmp1 = _tmp1.replace('<', '&lt;')
+            if ('>' in _tmp1):
+                _tmp1 = _tmp1.replace('>', '&gt;')
+            if ('"' in _tmp1):
+                _tmp1 = _tmp1.replace('"', '&quot;')
+            _write(((' value="' + _tmp1) + '"'))
+        _write(u' />\n')
+        return _out.getvalue()
+    return render
+
+__filename__ = '/root/package/opencore/views/templates/widgets/userwidget.pt'
+registry[(None, True, '72cfe6c8335eaf0ea088745bbecd77841ea68acf')] = bind()
@@ -0,0 +1,117 @@
+# Copyright (C) 2008-2009 Open Society Institute
+#               Thomas Moroz: tmoroz.org
+#               2010-2011 Large Blue
+#               Fergus Doyle: fergus.doyle@largeblue.com
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License Version 2 as published
+# by the Free Software Foundation.  You may not use, modify or distribute
+# this program under any other version of the GNU General Public License.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+import unittest
+
+from repoze.bfg import testing
+
+class TestQueryProfileView(unittest.TestCase):
+    def setUp(self):
+        testing.cleanUp()
+
+    def tearDown(self):
+        testing.cleanUp()
+
+    def _callFUT(self, context, request, profiler):
+        from opencore.views.admin import query_profile_view
+        renderer = testing.registerDummyRenderer('templates/admin/menu.pt')
+        renderer.macros = {'menu': None}
+        return query_profile_view(context, request, profiler)
+
+    def test_reset(self):
+        from webob.exc import HTTPFound
+        profiler = DummyProfiler({})
+        context = testing.DummyModel()
+        request = testing.DummyRequest(post={'reset': 'Reset'})
+        response = self._callFUT(context, request, profiler)
+        self.failUnless(isinstance(response, HTTPFound))
+        self.assertEqual(response.location,
+                         'http://example.com/query_profile.html')
+        self.failUnless(profiler.was_reset)
+
+    def test_reset_by_get_ignored(self):
+        profiler = DummyProfiler({})
+        context = testing.DummyModel()
+        request = testing.DummyRequest(params={'reset': 'Reset'})
+        info = self._callFUT(context, request, profiler)
+        self.assertEqual(info['shapes'], [])
+        self.failIf(profiler.was_reset)
+
+    def test_shapes_slowest_first(self):
+        profiler = DummyProfiler({
+            'fast': _profile(p95=1000, indexes={'path': 500}),
+            'slow': _profile(p95=9000, indexes={'path': 1000,
+                                                'texts': 7000}),
+            })
+        context = testing.DummyModel()
+        request = testing.DummyRequest()
+        info = self._callFUT(context, request, profiler)
+        self.assertEqual(info['enabled'], True)
+        shapes = info['shapes']
+        self.assertEqual([shape['shape'] for shape in shapes],
+                         ['slow', 'fast'])
+        slow = shapes[0]
+        self.assertEqual(slow['count'], 10)
+        self.assertEqual((slow['hits'], slow['misses']), (2, 8))
+        self.assertEqual((slow['p50'], slow['p95'], slow['p99']),
+                         (4.5, 9.0, 18.0))
+        self.assertEqual(slow['sort_p95'], 0)
+        self.assertEqual(slow['indexes'],
+                         [{'name': 'texts', 'p95': 7.0, 'size': 3},
+                          {'name': 'path', 'p95': 1.0, 'size': 3}])
+
+class TestQueryProfileJson(unittest.TestCase):
+    def _callFUT(self, context, request, profiler):
+        from opencore.views.admin import query_profile_json
+        return query_profile_json(context, request, profiler)
+
+    def test_it(self):
+        profiler = DummyProfiler({'shape': _profile(p95=1000)})
+        context = testing.DummyModel()
+        request = testing.DummyRequest()
+        self.assertEqual(self._callFUT(context, request, profiler),
+                         profiler.snapshot())
+
+def _profile(p95, indexes={}):
+    return {
+        'hits': 2,
+        'misses': 8,
+        'duration_us': {'count': 10, 'p50': p95 / 2, 'p95': p95,
+                        'p99': p95 * 2},
+        'sort_us': {'count': 0},
+        'indexes': dict((name, {'apply_us': {'p95': apply_p95},
+                                'size': {'p50': 3}})
+                        for name, apply_p95 in indexes.items()),
+        }
+
+class DummyProfiler:
+    was_reset = False
+
+    def __init__(self, shapes):
+        self.shapes = shapes
+
+    def is_enabled(self):
+        return True
+
+    def snapshot(self):
+        return {'pid': 1, 'since': 0, 'shapes': self.shapes}
+
+    def reset(self):
+        self.was_reset = True
@@ -41,7 +41,9 @@ class TestGetCatalogBatch(unittest.TestCase):
                 return x
             def search(**kw):
                 searchkw.update(kw)
-                return len(batch), batch, resolver
+                start = kw.get('offset', 0)
+                end = start + kw.get('limit', len(batch))
+                return len(batch), batch[start:end], resolver
             return search
         testing.registerAdapter(dummy_catalog_search, (Interface),
                                 ICatalogSearch)
@@ -60,7 +62,7 @@ class TestGetCatalogBatch(unittest.TestCase):
         self.assertEqual(info['total'], 3)
         self.assertEqual(info['sort_index'], 'modified_date')
         self.assertEqual(info['reverse'], False)
-        self.assertEqual(len(searchkw), 2)
+        self.assertEqual(len(searchkw), 4)
         self.assertEqual(searchkw['reverse'], False)
         self.assertEqual(searchkw['sort_index'], 'modified_date')
 
@@ -72,7 +74,7 @@ class TestGetCatalogBatch(unittest.TestCase):
         info = self._callFUT(context, request, texts='abc', other2='hello',
                              other1='yo',
                              index_query_order=order)
-        self.assertEqual(len(searchkw), 6)
+        self.assertEqual(len(searchkw), 8)
         self.assertEqual(searchkw['texts'], 'abc')
         self.assertEqual(searchkw['other1'], 'yo')
         self.assertEqual(searchkw['other2'], 'hello')
@@ -87,7 +89,7 @@ class TestGetCatalogBatch(unittest.TestCase):
         order = ['texts', 'other2', 'other1']
         info = self._callFUT(context, request, texts='abc', other2='hello',
                              other1='yo', sort_index='hello', reverse=True)
-        self.assertEqual(len(searchkw), 5)
+        self.assertEqual(len(searchkw), 7)
         self.assertEqual(searchkw['texts'], 'abc')
         self.assertEqual(searchkw['other1'], 'yo')
         self.assertEqual(searchkw['other2'], 'hello')
@@ -109,7 +111,7 @@ class TestGetCatalogBatch(unittest.TestCase):
         self.assertEqual(info['total'], 3)
         self.assertEqual(info['sort_index'], 'other')
         self.assertEqual(info['reverse'], True)
-        self.assertEqual(len(searchkw), 2)
+        self.assertEqual(len(searchkw), 4)
         self.assertEqual(searchkw['reverse'], True)
         self.assertEqual(searchkw['sort_index'], 'other')
 
@@ -128,7 +130,7 @@ class TestGetCatalogBatch(unittest.TestCase):
         self.assertEqual(info['total'], 3)
         self.assertEqual(info['sort_index'], 'other')
         self.assertEqual(info['reverse'], True)
-        self.assertEqual(len(searchkw), 2)
+        self.assertEqual(len(searchkw), 4)
         self.assertEqual(searchkw['reverse'], True)
         self.assertEqual(searchkw['sort_index'], 'other')
 
@@ -147,10 +149,33 @@ class TestGetCatalogBatch(unittest.TestCase):
         self.assertEqual(info['total'], 7)
         self.assertEqual(info['sort_index'], 'other')
         self.assertEqual(info['reverse'], True)
-        self.assertEqual(len(searchkw), 2)
+        self.assertEqual(len(searchkw), 4)
         self.assertEqual(searchkw['reverse'], True)
         self.assertEqual(searchkw['sort_index'], 'other')
 
+    def test_queries_only_the_batch(self):
+        searchkw = self._register(range(10))
+        context = testing.DummyModel()
+        request = testing.DummyRequest(
+            params=dict(batch_start='4', batch_size='3'))
+        info = self._callFUT(context, request)
+        self.assertEqual(info['entries'], [4, 5, 6])
+        self.assertEqual(info['total'], 10)
+        self.assertEqual(searchkw['offset'], 4)
+        self.assertEqual(searchkw['limit'], 3)
+
+    def test_filtered_models_refill_batch(self):
+        searchkw = self._register([1, None, None, 4, 5, 6])
+        context = testing.DummyModel()
+        request = testing.DummyRequest(
+            params=dict(batch_start='0', batch_size='3'))
+        info = self._callFUT(context, request)
+        self.assertEqual(info['entries'], [1, 4, 5])
+        self.assertEqual(info['batch_end'], 3)
+        self.assertEqual(info['total'], 4)
+        self.assertEqual(searchkw['offset'], 3)
+        self.assertEqual(searchkw['limit'], 2)
+
     def test_batching_urls_next_and_prev(self):
         import urlparse
         from cgi import parse_qs
@@ -243,7 +268,9 @@ class TestGetCatalogBatchGrid(unittest.TestCase):
                 return x
             def search(**kw):
                 searchkw.update(kw)
-                return len(batch), batch, resolver
+                start = kw.get('offset', 0)
+                end = start + kw.get('limit', len(batch))
+                return len(batch), batch[start:end], resolver
             return search
         testing.registerAdapter(dummy_catalog_search, (Interface),
                                 ICatalogSearch)
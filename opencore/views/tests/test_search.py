@@ -105,6 +105,40 @@ class JQueryLivesearchViewTests(unittest.TestCase):
         self.assertEqual(results[1]['title'], 'yo')
         self.assertEqual(response.content_type, 'application/x-json')
 
+    def test_with_parameter_counts_groups_in_one_search(self):
+        from zope.interface import Interface
+        from opencore.models.interfaces import ICatalogSearch
+        from opencore.models.interfaces import IGroupSearchFactory
+        from opencore.models.interfaces import IPeople
+        from opencore.models.interfaces import IPages
+        from repoze.lemonade.testing import registerListItem
+        people = DummyGroupSearch([IPeople], 1, [1])
+        pages = DummyGroupSearch([IPages], 0, [])
+        registerListItem(IGroupSearchFactory, lambda *arg: people,
+                         'people', title='People', sort_key=1)
+        registerListItem(IGroupSearchFactory, lambda *arg: pages,
+                         'pages', title='Pages', sort_key=2)
+        testing.registerAdapter(DummyFacetSearch, (Interface),
+                                ICatalogSearch)
+        context = testing.DummyModel()
+        request = testing.DummyRequest()
+        request.params = {
+            'val': 'somesearch',
+            }
+        response = self._callFUT(context, request)
+        from simplejson import loads
+        results = loads(response.body)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[1]['header'], 'People')
+        self.assertEqual(results[1]['title'], 'yo')
+        self.assertEqual(results[3]['header'], 'Pages')
+        self.assertEqual(results[3]['title'], 'No Result')
+        self.assertEqual(people.called, True)
+        self.assertEqual(pages.called, False)
+        query = DummyFacetSearch.query
+        self.assertEqual(query['texts'], 'somesearch*')
+        self.assertEqual(query['interfaces']['query'], [IPeople, IPages])
+
 
 class SearchResultsViewTests(unittest.TestCase):
     def setUp(self):
@@ -406,6 +440,26 @@ class DummySearch:
     def __call__(self, **kw):
         return 1, [1], lambda x: dummycontent
 
+class DummyFacetSearch:
+    query = None
+    def __init__(self, context):
+        pass
+    def facets(self, facets, **kw):
+        from opencore.models.interfaces import IPeople
+        DummyFacetSearch.query = kw
+        return 1, {'interfaces': {IPeople: 1}}
+
+class DummyGroupSearch:
+    called = False
+    def __init__(self, interfaces, num, docids):
+        self.interfaces = interfaces
+        self.num = num
+        self.docids = docids
+    def __call__(self):
+        self.called = True
+        return (self.num, self.docids,
+                lambda x: testing.DummyModel(title='yo'))
+
 class DummyEmptySearch:
     def __init__(self, context):
         pass
@@ -73,11 +73,14 @@ setup(name='opencore',
         [console_scripts]
         debug = opencore.scripts.debug:main
         reindex_catalog = opencore.scripts.reindex_catalog:main
+        indexer = opencore.scripts.indexer:main
         rename_user = opencore.scripts.rename_user:main
         site_announce = opencore.scripts.site_announce:main
         mvcontent = opencore.scripts.mvcontent:main
         evolve = opencore.scripts.evolve:main
         make_admin = opencore.scripts.make_admin:main
+        catalog_benchmark = opencore.scripts.catalog_benchmark:main
+        catalog_snapshot = opencore.scripts.catalog_snapshot:main
        
        """
 )